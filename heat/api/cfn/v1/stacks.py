@@ -17,6 +17,7 @@ Stack endpoint for Heat CloudFormation v1 API.
 
 import socket
 
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 
@@ -33,6 +34,8 @@ from heat.common import wsgi
 from heat.rpc import api as rpc_api
 from heat.rpc import client as rpc_client
 
+cfg.CONF.import_opt('heat_stack_user_role', 'heat.common.config')
+
 LOG = logging.getLogger(__name__)
 
 
@@ -561,19 +564,44 @@ class StackController(object):
 
             return self._id_format(result)
 
+        def format_resource_metadata(identity, resource_name, metadata):
+            # Only the metadata is read by the in-instance tools polling this
+            # action (cfn-hup, cfn-init), so they get it without the stack
+            # being loaded
+            result = {
+                'LogicalResourceId': resource_name,
+                'Metadata': metadata[rpc_api.RES_METADATA],
+                'StackId': identity,
+                'StackName': identity['stack_name'],
+            }
+
+            return self._id_format(result)
+
         con = req.context
+        resource_name = req.params.get('LogicalResourceId')
+        stack_user = cfg.CONF.heat_stack_user_role in con.roles
 
         try:
             identity = self._get_identity(con, req.params['StackName'])
-            resource_details = self.rpc_client.describe_stack_resource(
-                con,
-                stack_identity=identity,
-                resource_name=req.params.get('LogicalResourceId'))
+            if stack_user:
+                metadata = self.rpc_client.describe_resource_metadata(
+                    con,
+                    stack_identity=identity,
+                    resource_name=resource_name)
+            else:
+                resource_details = self.rpc_client.describe_stack_resource(
+                    con,
+                    stack_identity=identity,
+                    resource_name=resource_name)
 
         except Exception as ex:
             return exception.map_remote_error(ex)
 
-        result = format_resource_detail(resource_details)
+        if stack_user:
+            result = format_resource_metadata(identity, resource_name,
+                                              metadata)
+        else:
+            result = format_resource_detail(resource_details)
 
         return api_utils.format_response('DescribeStackResource',
                                          {'StackResourceDetail': result})
@@ -74,6 +74,7 @@ class FaultWrapper(wsgi.Middleware):
         'RevertFailed': webob.exc.HTTPInternalServerError,
         'StopActionFailed': webob.exc.HTTPInternalServerError,
         'EventSendFailed': webob.exc.HTTPInternalServerError,
+        'EngineOverloaded': webob.exc.HTTPServiceUnavailable,
         'ServerBuildFailed': webob.exc.HTTPInternalServerError,
         'NotSupported': webob.exc.HTTPBadRequest,
         'MissingCredentialError': webob.exc.HTTPBadRequest,
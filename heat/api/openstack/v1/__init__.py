@@ -377,6 +377,12 @@ class API(wsgi.Router):
                         'action': 'create',
                         'method': 'POST'
                     },
+                    {
+                        'name': 'software_deployment_create_bulk',
+                        'url': '/bulk',
+                        'action': 'create_bulk',
+                        'method': 'POST'
+                    },
                     {
                         'name': 'software_deployment_show',
                         'url': '/{deployment_id}',
@@ -91,7 +91,8 @@ class EventController(object):
                                              limit=limit,
                                              marker=marker,
                                              sort_keys=sort_keys,
-                                             sort_dir=sort_dir)
+                                             sort_dir=sort_dir,
+                                             include_properties=detail)
         keys = None if detail else summary_keys
 
         return [format_event(req, e, keys) for e in events if filter_func(e)]
@@ -13,6 +13,8 @@
 
 import itertools
 
+from webob import exc
+
 from heat.api.openstack.v1 import util
 from heat.common import identifier
 from heat.common import param_utils
@@ -112,13 +114,21 @@ class ResourceController(object):
     def metadata(self, req, identity, resource_name):
         """
         Gets metadata information for a resource
+
+        The response carries an ETag, and requests with a matching
+        If-None-Match header get a 304 Not Modified response.
         """
 
-        res = self.rpc_client.describe_stack_resource(req.context,
-                                                      identity,
-                                                      resource_name)
+        etags = getattr(req.if_none_match, 'etags', [])
+        res = self.rpc_client.describe_resource_metadata(
+            req.context, identity, resource_name,
+            etag=etags[0] if len(etags) == 1 else None)
 
-        return {rpc_api.RES_METADATA: res[rpc_api.RES_METADATA]}
+        etag = res[rpc_api.RES_METADATA_ETAG]
+        if rpc_api.RES_METADATA not in res or etag in req.if_none_match:
+            raise exc.HTTPNotModified(headers={'ETag': '"%s"' % etag})
+
+        return res
 
     @util.identified_stack
     def signal(self, req, identity, resource_name, body=None):
@@ -128,10 +138,20 @@ class ResourceController(object):
                                         details=body)
 
 
+class ResourceSerializer(serializers.JSONResponseSerializer):
+    """Handles serialization of specific controller method responses."""
+
+    def metadata(self, response, result):
+        response.etag = result[rpc_api.RES_METADATA_ETAG]
+        self.default(response,
+                     {rpc_api.RES_METADATA: result[rpc_api.RES_METADATA]})
+        return response
+
+
 def create_resource(options):
     """
     Resources resource factory method.
     """
     deserializer = wsgi.JSONRequestDeserializer()
-    serializer = serializers.JSONResponseSerializer()
+    serializer = ResourceSerializer()
     return wsgi.Resource(ResourceController(options), deserializer, serializer)
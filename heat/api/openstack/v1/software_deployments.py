@@ -14,8 +14,10 @@
 from webob import exc
 
 from heat.api.openstack.v1 import util
+from heat.common import param_utils
 from heat.common import serializers
 from heat.common import wsgi
+from heat.rpc import api as rpc_api
 from heat.rpc import client as rpc_client
 
 
@@ -51,10 +53,25 @@ class SoftwareDeploymentController(object):
         """
         List software deployments grouped by the group name for the requested
         server.
+
+        The response carries an ETag. A request with a matching If-None-Match
+        header waits for up to the number of seconds given by the timeout
+        parameter for the metadata to change, and gets a 304 Not Modified
+        response if it does not.
         """
-        sds = self.rpc_client.metadata_software_deployments(
-            req.context, server_id=server_id)
-        return {'metadata': sds}
+        timeout = param_utils.extract_int('timeout',
+                                          req.params.get('timeout'))
+        etags = getattr(req.if_none_match, 'etags', [])
+        res = self.rpc_client.poll_metadata_software_deployments(
+            req.context, server_id=server_id,
+            etag=etags[0] if len(etags) == 1 else None,
+            timeout=timeout or 0)
+
+        etag = res[rpc_api.RES_METADATA_ETAG]
+        if rpc_api.RES_METADATA not in res or etag in req.if_none_match:
+            raise exc.HTTPNotModified(headers={'ETag': '"%s"' % etag})
+
+        return res
 
     @util.policy_enforce
     def show(self, req, deployment_id):
@@ -78,6 +95,22 @@ class SoftwareDeploymentController(object):
                                                         **create_data)
         return {'software_deployment': sd}
 
+    @util.policy_enforce
+    def create_bulk(self, req, body):
+        """
+        Create a deployment of a config for each of a list of servers
+        """
+        create_data = dict((k, body.get(k)) for k in (
+            'config_id', 'action', 'status', 'status_reason',
+            'stack_user_project_id'))
+        deployments = [dict((k, d.get(k))
+                            for k in ('server_id', 'input_values'))
+                       for d in body.get('deployments') or []]
+
+        sds = self.rpc_client.create_software_deployments(
+            req.context, deployments=deployments, **create_data)
+        return {'software_deployments': sds}
+
     @util.policy_enforce
     def update(self, req, deployment_id, body):
         """
@@ -106,11 +139,21 @@ class SoftwareDeploymentController(object):
         raise exc.HTTPNoContent()
 
 
+class SoftwareDeploymentSerializer(serializers.JSONResponseSerializer):
+    """Handles serialization of specific controller method responses."""
+
+    def metadata(self, response, result):
+        response.etag = result[rpc_api.RES_METADATA_ETAG]
+        self.default(response,
+                     {rpc_api.RES_METADATA: result[rpc_api.RES_METADATA]})
+        return response
+
+
 def create_resource(options):
     """
     Software deployments resource factory method.
     """
     deserializer = wsgi.JSONRequestDeserializer()
-    serializer = serializers.JSONResponseSerializer()
+    serializer = SoftwareDeploymentSerializer()
     return wsgi.Resource(
         SoftwareDeploymentController(options), deserializer, serializer)
@@ -81,6 +81,16 @@ service_opts = [
     cfg.IntOpt('max_template_size',
                default=524288,
                help=_('Maximum raw byte size of any template.')),
+    cfg.IntOpt('template_fetch_cache_size',
+               default=10485760,
+               help=_('Maximum total size in bytes of the remote templates '
+                      'and files kept in the fetch cache. Cached documents '
+                      'are revalidated with conditional requests. Set to 0 '
+                      'to disable caching.')),
+    cfg.StrOpt('template_fetch_cache_dir',
+               help=_('Directory in which to also store the fetch cache, so '
+                      'that it survives restarts. If not set, the cache is '
+                      'only kept in memory.')),
     cfg.IntOpt('max_nested_stack_depth',
                default=5,
                help=_('Maximum depth allowed when using nested stacks.')),
@@ -136,6 +146,65 @@ engine_opts = [
                help=_('Maximum events that will be available per stack. Older'
                       ' events will be deleted when this is reached. Set to 0'
                       ' for unlimited events per stack.')),
+    cfg.IntOpt('event_property_max_length',
+               default=4096,
+               help=_('Maximum length of the JSON encoded value of a '
+                      'resource property stored in an event. Longer values '
+                      'are truncated. Set to 0 for no limit.')),
+    cfg.IntOpt('event_properties_max_size',
+               default=32768,
+               help=_('Maximum size of the JSON encoded resource properties '
+                      'stored in an event. The largest property values are '
+                      'truncated until the rest fits. Set to 0 for no '
+                      'limit.')),
+    cfg.FloatOpt('signal_batch_window',
+                 default=0.2,
+                 help=_('Time in seconds for which asynchronous resource '
+                        'signals are queued, so that the signals received '
+                        'for a stack within this window are delivered '
+                        'together to a single load of the stack. A signal '
+                        'received while none is queued is delivered '
+                        'immediately.')),
+    cfg.IntOpt('software_deployment_poll_timeout',
+               default=30,
+               help=_('Maximum time in seconds for which a request for '
+                      'software deployment metadata waits for the metadata '
+                      'to change. This must be less than '
+                      'rpc_response_timeout.')),
+    cfg.IntOpt('max_software_deployment_pollers',
+               default=32,
+               help=_('Maximum number of requests for software deployment '
+                      'metadata which may wait for a change at the same time '
+                      'on each engine. Further requests return immediately. '
+                      'Each waiting request holds one of the engine\'s '
+                      'rpc_thread_pool_size threads.')),
+    cfg.IntOpt('software_deployment_push_workers',
+               default=10,
+               help=_('Maximum number of threads on each engine pushing '
+                      'software deployment metadata to the servers\' '
+                      'metadata URLs.')),
+    cfg.IntOpt('software_deployment_push_retries',
+               default=3,
+               help=_('Number of times a failed push of software deployment '
+                      'metadata is retried. Set to 0 to disable retries.')),
+    cfg.BoolOpt('db_query_stats',
+                default=False,
+                help=_('Count the database statements issued and the time '
+                       'spent in the database by each RPC call to the '
+                       'engine. The totals are reported in the service '
+                       'load statistics.')),
+    cfg.IntOpt('db_query_log_threshold',
+               default=100,
+               help=_('When db_query_stats is enabled, log the RPC calls '
+                      'issuing more than this number of database statements, '
+                      'along with their slowest statements. Set to 0 to '
+                      'disable.')),
+    cfg.FloatOpt('db_time_log_threshold',
+                 default=1.0,
+                 help=_('When db_query_stats is enabled, log the RPC calls '
+                        'spending more than this number of seconds in the '
+                        'database, along with their slowest statements. Set '
+                        'to 0 to disable.')),
     cfg.IntOpt('stack_action_timeout',
                default=3600,
                help=_('Timeout in seconds for stack action (ie. create or'
@@ -148,9 +217,55 @@ engine_opts = [
                default=2,
                help=_('RPC timeout for the engine liveness check that is used'
                       ' for stack locking.')),
+    cfg.IntOpt('engine_heartbeat_missed_limit',
+               default=2,
+               help=_('Number of service reports an engine may miss before '
+                      'the stack locks it holds are considered stale. Engines '
+                      'with a service record are checked against their '
+                      'heartbeat in the database instead of over RPC.')),
+    cfg.IntOpt('max_active_stacks_per_engine',
+               default=0,
+               help=_('Maximum number of stacks an engine process runs '
+                      'actions on at the same time. Create and update '
+                      'requests for top-level stacks beyond this limit are '
+                      'rejected, naming the host of the least loaded engine '
+                      'in the service table, and the API retries them once '
+                      'on that host. Set to 0 for no limit.')),
+    cfg.IntOpt('max_engine_stack_threads',
+               default=0,
+               help=_('Maximum number of stack operations an engine '
+                      'process runs at the same time. Further operations are '
+                      'queued until a slot is free. Operations on nested '
+                      'stacks are not limited, since their parent already '
+                      'holds a slot, and neither are signal and alarm '
+                      'deliveries. Set to 0 for no limit.')),
+    cfg.IntOpt('stale_lock_recovery_batch_size',
+               default=200,
+               help=_('Number of stacks recovered per batch when an engine '
+                      'starts and takes over the locks of dead engines.')),
+    cfg.IntOpt('stale_lock_recovery_pool_size',
+               default=4,
+               help=_('Maximum number of stale lock recovery batches '
+                      'processed concurrently on engine startup.')),
     cfg.BoolOpt('enable_cloud_watch_lite',
                 default=True,
                 help=_('Enable the legacy OS::Heat::CWLiteAlarm resource.')),
+    cfg.IntOpt('watch_data_flush_interval',
+               default=5,
+               help=_('Seconds between the batched writes of the metric '
+                      'samples pushed to watch rules. Set to 0 to write '
+                      'each sample as it is received.')),
+    cfg.IntOpt('watch_data_buffer_size',
+               default=100,
+               help=_('Maximum number of samples buffered per watch rule '
+                      'between two batched writes; the oldest samples are '
+                      'dropped when the buffer is full.')),
+    cfg.IntOpt('watch_data_max_age',
+               default=1209600,
+               help=_('Age in seconds after which metric samples pushed to '
+                      'watch rules are deleted. Samples are always kept for '
+                      'at least the period of their rule. Set to 0 to keep '
+                      'samples forever.')),
     cfg.BoolOpt('enable_stack_abandon',
                 default=False,
                 help=_('Enable the preview Stack Abandon feature.')),
@@ -26,6 +26,7 @@ import six
 from heat.common import exception
 from heat.common.i18n import _LE
 from heat.common import policy
+from heat.common import query_stats
 from heat.common import wsgi
 from heat.db import api as db_api
 from heat.engine import clients
@@ -264,7 +265,8 @@ def request_context(func):
         if ctx is not None and not isinstance(ctx, context.RequestContext):
             ctx = context.RequestContext.from_dict(ctx.to_dict())
         try:
-            return func(self, ctx, *args, **kwargs)
+            with query_stats.rpc_call(func.__name__):
+                return func(self, ctx, *args, **kwargs)
         except exception.HeatException:
             raise oslo_messaging.rpc.dispatcher.ExpectedException()
     return wrapped
@@ -12,11 +12,15 @@
 #    under the License.
 
 import base64
+import hashlib
 
 from Crypto.Cipher import AES
 from oslo_config import cfg
+import six
 
+from heat.common import exception
 from heat.common.i18n import _
+from heat.common import lru
 from heat.openstack.common.crypto import utils
 
 
@@ -26,27 +30,102 @@ auth_opts = [
                default='notgood but just long enough i t',
                help=_('Key used to encrypt authentication info in the '
                       'database. Length of this key must be 16, 24 or 32 '
-                      'characters.'))
+                      'characters.')),
+    cfg.IntOpt('decrypted_cache_size',
+               default=1000,
+               help=_('Maximum number of decrypted values (e.g. redacted '
+                      'resource data and user credentials) to keep in '
+                      'memory, so that they are not decrypted again every '
+                      'time they are loaded. Set to 0 to disable caching.')),
+    cfg.IntOpt('decrypted_cache_ttl',
+               default=300,
+               help=_('Number of seconds a decrypted value is kept in memory '
+                      'after it was decrypted. Set to 0 to disable caching.'))
 ]
 
 cfg.CONF.register_opts(auth_opts)
 
+_symmetric_crypto = None
+
+
+def _crypto():
+    global _symmetric_crypto
+    if _symmetric_crypto is None:
+        _symmetric_crypto = utils.SymmetricCrypto()
+    return _symmetric_crypto
+
+
+def _cache_size():
+    if cfg.CONF.decrypted_cache_ttl <= 0:
+        return 0
+    return cfg.CONF.decrypted_cache_size
+
+
+def _cache_key(method, cache_id, data):
+    """Return the key of a decrypted value in the cache.
+
+    Values are keyed by the decrypt method, an identifier for the database
+    row they were read from and a digest of the ciphertext, so that a row
+    which is re-encrypted never returns a stale value.
+    """
+    if isinstance(data, six.text_type):
+        data = data.encode('utf-8')
+    return method, cache_id, hashlib.sha1(data).hexdigest()
+
+
+decrypted_cache = lru.LRUCache(_cache_size,
+                               ttl=lambda: cfg.CONF.decrypted_cache_ttl)
+
 
 def encrypt(auth_info):
     if auth_info is None:
         return None, None
-    sym = utils.SymmetricCrypto()
-    res = sym.encrypt(cfg.CONF.auth_encryption_key[:32],
-                      auth_info, b64encode=True)
+    res = _crypto().encrypt(cfg.CONF.auth_encryption_key[:32],
+                            auth_info, b64encode=True)
     return 'oslo_decrypt_v1', res
 
 
+def decrypt(method, data, cache_id=None):
+    """Decrypt data with the named decrypt method.
+
+    If a cache_id identifying where the data was stored is given, the
+    result is cached.
+    """
+    return decrypt_all([(method, data, cache_id)])[0]
+
+
+def decrypt_all(items):
+    """Decrypt a batch of (method, data, cache_id) tuples.
+
+    Returns the list of decrypted values, in the same order. Entries with no
+    method or no data decrypt to None.
+    """
+    results = []
+    for method, data, cache_id in items:
+        if method is None or data is None:
+            results.append(None)
+            continue
+        key = None
+        if cache_id is not None:
+            key = _cache_key(method, cache_id, data)
+            value = decrypted_cache.get(key)
+            if value is not None:
+                results.append(value)
+                continue
+        if method not in DECRYPT_METHODS:
+            raise exception.Error(_('Unknown decrypt method %s') % method)
+        value = DECRYPT_METHODS[method](data)
+        if key is not None and value is not None:
+            decrypted_cache.set(key, value)
+        results.append(value)
+    return results
+
+
 def oslo_decrypt_v1(auth_info):
     if auth_info is None:
         return None
-    sym = utils.SymmetricCrypto()
-    return sym.decrypt(cfg.CONF.auth_encryption_key[:32],
-                       auth_info, b64decode=True)
+    return _crypto().decrypt(cfg.CONF.auth_encryption_key[:32],
+                             auth_info, b64decode=True)
 
 
 def heat_decrypt(auth_info):
@@ -67,5 +146,13 @@ def heat_decrypt(auth_info):
     return res
 
 
+# The decrypt methods which may be named in the database, as returned by
+# encrypt() now or by older versions of Heat
+DECRYPT_METHODS = {
+    'oslo_decrypt_v1': oslo_decrypt_v1,
+    'heat_decrypt': heat_decrypt,
+}
+
+
 def list_opts():
     yield None, auth_opts
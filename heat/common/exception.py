@@ -446,6 +446,13 @@ class StopActionFailed(HeatException):
                 "(%(engine_id)s)")
 
 
+class EngineOverloaded(HeatException):
+    # preferred_host, when not None, names the host of a less loaded engine
+    # the request may be retried on
+    msg_fmt = _("Engine %(engine_id)s is already processing %(active)s "
+                "stacks, try again later")
+
+
 class EventSendFailed(HeatException):
     msg_fmt = _("Failed to send message to stack (%(stack_name)s) "
                 "on other engine (%(engine_id)s)")
@@ -0,0 +1,61 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+
+class LRUCache(object):
+    """A bounded cache whose entries expire after a time to live.
+
+    Once the cache is full, the least recently used entry is evicted to make
+    room for a new one. The size and the time to live (in seconds) may be
+    given as callables, e.g. to follow config options; a size of 0 disables
+    the cache and a time to live of None keeps the entries until evicted.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._values = collections.OrderedDict()
+
+    @staticmethod
+    def _setting(value):
+        return value() if callable(value) else value
+
+    def get(self, key, default=None):
+        try:
+            expires, value = self._values.pop(key)
+        except KeyError:
+            return default
+        if expires is not None and expires <= time.time():
+            return default
+        self._values[key] = (expires, value)
+        return value
+
+    def set(self, key, value):
+        max_size = self._setting(self._max_size)
+        self._values.pop(key, None)
+        if max_size <= 0:
+            return
+        ttl = self._setting(self._ttl)
+        expires = time.time() + ttl if ttl is not None else None
+        self._values[key] = (expires, value)
+        while len(self._values) > max_size:
+            self._values.popitem(last=False)
+
+    def clear(self):
+        self._values.clear()
+
+    def __len__(self):
+        return len(self._values)
@@ -0,0 +1,137 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Accounting of the database statements issued by each RPC call."""
+
+import collections
+import contextlib
+import heapq
+import threading
+
+from oslo_config import cfg
+from oslo_log import log as logging
+import six
+
+from heat.common.i18n import _LW
+
+LOG = logging.getLogger(__name__)
+
+cfg.CONF.import_opt('db_query_stats', 'heat.common.config')
+cfg.CONF.import_opt('db_query_log_threshold', 'heat.common.config')
+cfg.CONF.import_opt('db_time_log_threshold', 'heat.common.config')
+
+# The number of slowest statements kept for each call
+SLOWEST_STATEMENTS = 5
+
+# Green thread local once eventlet has monkey patched threading
+_local = threading.local()
+
+_counters = collections.defaultdict(lambda: {'calls': 0,
+                                             'statements': 0,
+                                             'db_time': 0.0,
+                                             'over_threshold': 0})
+
+
+class QueryStats(object):
+    """The database statements issued within one call."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.db_time = 0.0
+        self._slowest = []
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.db_time += duration
+        entry = (duration, self.count, statement)
+        if len(self._slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        """The slowest statements as (duration, statement), slowest first."""
+        return [(duration, statement) for duration, _n, statement
+                in sorted(self._slowest, reverse=True)]
+
+    def over_threshold(self):
+        count_limit = cfg.CONF.db_query_log_threshold
+        time_limit = cfg.CONF.db_time_log_threshold
+        return ((count_limit > 0 and self.count > count_limit) or
+                (time_limit > 0 and self.db_time > time_limit))
+
+
+def record(statement, duration):
+    """Record a statement issued by the current green thread."""
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.record(statement, duration)
+
+
+def active():
+    return getattr(_local, 'stats', None) is not None
+
+
+@contextlib.contextmanager
+def collect(name):
+    """
+    Collect the statements issued by the current green thread within the
+    block. Nested blocks are accounted to the outermost one.
+    """
+    if active():
+        yield _local.stats
+        return
+
+    stats = _local.stats = QueryStats(name)
+    try:
+        yield stats
+    finally:
+        _local.stats = None
+
+
+@contextlib.contextmanager
+def rpc_call(name):
+    """Account the statements of an RPC call, if enabled."""
+    if not cfg.CONF.db_query_stats or active():
+        yield
+        return
+
+    with collect(name) as stats:
+        try:
+            yield
+        finally:
+            _report(stats)
+
+
+def _report(stats):
+    counter = _counters[stats.name]
+    counter['calls'] += 1
+    counter['statements'] += stats.count
+    counter['db_time'] += stats.db_time
+
+    if stats.over_threshold():
+        counter['over_threshold'] += 1
+        LOG.warn(_LW('RPC call %(name)s issued %(count)d database statements '
+                     'taking %(time).3fs, the slowest were: %(slowest)s'),
+                 {'name': stats.name, 'count': stats.count,
+                  'time': stats.db_time,
+                  'slowest': '; '.join('%.3fs: %s' % s
+                                       for s in stats.slowest)})
+
+
+def counters():
+    """Return the totals for each RPC call since the engine started."""
+    return dict((name, dict(counter))
+                for name, counter in six.iteritems(_counters))
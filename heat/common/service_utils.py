@@ -23,6 +23,7 @@ SERVICE_KEYS = (
     SERVICE_TOPIC,
     SERVICE_ENGINE_ID,
     SERVICE_REPORT_INTERVAL,
+    SERVICE_LOAD_STATS,
     SERVICE_CREATED_AT,
     SERVICE_UPDATED_AT,
     SERVICE_DELETED_AT,
@@ -35,6 +36,7 @@ SERVICE_KEYS = (
     'topic',
     'engine_id',
     'report_interval',
+    'load_stats',
     'created_at',
     'updated_at',
     'deleted_at',
@@ -64,6 +66,7 @@ def format_service(service):
         SERVICE_HOSTNAME: service.hostname,
         SERVICE_TOPIC: service.topic,
         SERVICE_REPORT_INTERVAL: service.report_interval,
+        SERVICE_LOAD_STATS: service.load_stats,
         SERVICE_CREATED_AT: service.created_at,
         SERVICE_UPDATED_AT: service.updated_at,
         SERVICE_DELETED_AT: service.deleted_at,
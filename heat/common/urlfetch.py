@@ -13,17 +13,28 @@
 
 """Utility for fetching a resource (e.g. a template) from a URL."""
 
+import collections
+import hashlib
+import os
+import time
+
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 import requests
 from requests import exceptions
+import six
+from six.moves import http_cookiejar
 from six.moves import urllib
 
 from heat.common import exception
 from heat.common.i18n import _
 from heat.common.i18n import _LI
+from heat.common.i18n import _LW
 
 cfg.CONF.import_opt('max_template_size', 'heat.common.config')
+cfg.CONF.import_opt('template_fetch_cache_size', 'heat.common.config')
+cfg.CONF.import_opt('template_fetch_cache_dir', 'heat.common.config')
 
 LOG = logging.getLogger(__name__)
 
@@ -32,6 +43,175 @@ class URLFetchError(exception.Error, IOError):
     pass
 
 
+CachedDocument = collections.namedtuple('CachedDocument',
+                                        ['data', 'etag', 'last_modified',
+                                         'expires'])
+
+
+class FetchCache(object):
+    """A size-bounded LRU cache of fetched documents.
+
+    Documents are kept in memory and, if template_fetch_cache_dir is set,
+    also on disk so that they survive restarts. A document evicted from
+    memory is removed from the disk as well, so both stay within
+    template_fetch_cache_size.
+    """
+
+    def __init__(self):
+        self._entries = collections.OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def _paths(url):
+        cache_dir = cfg.CONF.template_fetch_cache_dir
+        if not cache_dir:
+            return None
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(cache_dir, name)
+        return base + '.json', base + '.data'
+
+    def _load(self, url):
+        paths = self._paths(url)
+        if paths is None or not os.path.exists(paths[0]):
+            return None
+        try:
+            with open(paths[0]) as f:
+                meta = jsonutils.loads(f.read())
+            with open(paths[1], 'rb') as f:
+                data = f.read()
+        except (IOError, OSError, ValueError) as ex:
+            LOG.warn(_LW('Could not read cached copy of %(url)s: %(ex)s'),
+                     {'url': url, 'ex': ex})
+            return None
+        if meta.get('url') != url:
+            return None
+        # the freshness of a document read from disk is unknown, so it is
+        # always revalidated
+        return CachedDocument(data, meta.get('etag'),
+                              meta.get('last_modified'), 0)
+
+    def _save(self, url, entry):
+        paths = self._paths(url)
+        if paths is None:
+            return
+        data = entry.data
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        meta = {'url': url, 'etag': entry.etag,
+                'last_modified': entry.last_modified}
+        try:
+            for path, content in ((paths[1], data),
+                                  (paths[0], jsonutils.dumps(meta))):
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(content if isinstance(content, bytes)
+                            else content.encode('utf-8'))
+                os.rename(tmp_path, path)
+        except (IOError, OSError) as ex:
+            LOG.warn(_LW('Could not cache %(url)s on disk: %(ex)s'),
+                     {'url': url, 'ex': ex})
+
+    def _remove(self, url):
+        paths = self._paths(url)
+        if paths is None:
+            return
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._size > cfg.CONF.template_fetch_cache_size:
+            url, entry = self._entries.popitem(last=False)
+            self._size -= len(entry.data)
+            self._remove(url)
+
+    def get(self, url):
+        if cfg.CONF.template_fetch_cache_size <= 0:
+            return None
+        entry = self._entries.pop(url, None)
+        if entry is None:
+            entry = self._load(url)
+            if entry is None:
+                return None
+            self._size += len(entry.data)
+        self._entries[url] = entry
+        self._evict()
+        return entry
+
+    def set(self, url, entry):
+        self.discard(url, from_disk=False)
+        max_size = cfg.CONF.template_fetch_cache_size
+        if max_size <= 0 or len(entry.data) > max_size:
+            self._remove(url)
+            return
+        self._entries[url] = entry
+        self._size += len(entry.data)
+        self._save(url, entry)
+        self._evict()
+
+    def discard(self, url, from_disk=True):
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._size -= len(entry.data)
+        if from_disk:
+            self._remove(url)
+
+    def clear(self):
+        """Empty the in-memory cache."""
+        self._entries.clear()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+fetch_cache = FetchCache()
+
+_http_session = None
+
+
+def _session():
+    """Return the shared HTTP session, which pools connections per host.
+
+    The session is shared by the requests of all tenants, so it does not
+    keep any cookies.
+    """
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        _http_session.cookies.set_policy(
+            http_cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return _http_session
+
+
+def _cache_control(headers):
+    directives = {}
+    for directive in headers.get('Cache-Control', '').split(','):
+        name, _sep, value = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = value
+    return directives
+
+
+def _expires(headers):
+    directives = _cache_control(headers)
+    if 'no-cache' in directives or 'max-age' not in directives:
+        return 0
+    try:
+        return time.time() + max(int(directives['max-age']), 0)
+    except ValueError:
+        return 0
+
+
+def _cacheable(headers):
+    if 'no-store' in _cache_control(headers):
+        return False
+    return bool(headers.get('ETag') or headers.get('Last-Modified') or
+                _expires(headers))
+
+
 def get(url, allowed_schemes=('http', 'https')):
     """Get the data at the specified URL.
 
@@ -53,25 +233,54 @@ def get(url, allowed_schemes=('http', 'https')):
         except urllib.error.URLError as uex:
             raise URLFetchError(_('Failed to retrieve template: %s') % uex)
 
+    cached = fetch_cache.get(url)
+    if cached is not None and cached.expires > time.time():
+        return cached.data
+
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
     try:
-        resp = requests.get(url, stream=True)
-        resp.raise_for_status()
-
-        # We cannot use resp.text here because it would download the
-        # entire file, and a large enough file would bring down the
-        # engine.  The 'Content-Length' header could be faked, so it's
-        # necessary to download the content in chunks to until
-        # max_template_size is reached.  The chunk_size we use needs
-        # to balance CPU-intensive string concatenation with accuracy
-        # (eg. it's possible to fetch 1000 bytes greater than
-        # max_template_size with a chunk_size of 1000).
-        reader = resp.iter_content(chunk_size=1000)
-        result = ""
-        for chunk in reader:
-            result += chunk
-            if len(result) > cfg.CONF.max_template_size:
-                raise URLFetchError("Template exceeds maximum allowed size (%s"
-                                    " bytes)" % cfg.CONF.max_template_size)
+        resp = _session().get(url, stream=True, headers=headers)
+        try:
+            if (cached is not None and
+                    resp.status_code == requests.codes.not_modified):
+                LOG.debug('%s not modified, using cached copy', url)
+                fetch_cache.set(url, cached._replace(
+                    expires=_expires(resp.headers)))
+                return cached.data
+
+            resp.raise_for_status()
+
+            # We cannot use resp.text here because it would download the
+            # entire file, and a large enough file would bring down the
+            # engine.  The 'Content-Length' header could be faked, so it's
+            # necessary to download the content in chunks to until
+            # max_template_size is reached.  The chunk_size we use needs
+            # to balance CPU-intensive string concatenation with accuracy
+            # (eg. it's possible to fetch 1000 bytes greater than
+            # max_template_size with a chunk_size of 1000).
+            reader = resp.iter_content(chunk_size=1000)
+            result = ""
+            for chunk in reader:
+                result += chunk
+                if len(result) > cfg.CONF.max_template_size:
+                    raise URLFetchError("Template exceeds maximum allowed "
+                                        "size (%s bytes)" %
+                                        cfg.CONF.max_template_size)
+        finally:
+            resp.close()
+
+        if _cacheable(resp.headers):
+            fetch_cache.set(url, CachedDocument(
+                result, resp.headers.get('ETag'),
+                resp.headers.get('Last-Modified'), _expires(resp.headers)))
+        else:
+            fetch_cache.discard(url)
         return result
 
     except exceptions.RequestException as ex:
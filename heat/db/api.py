@@ -110,6 +110,19 @@ def resource_exchange_stacks(context, resource_id1, resource_id2):
     return IMPL.resource_exchange_stacks(context, resource_id1, resource_id2)
 
 
+def resource_create_all(context, values_list):
+    return IMPL.resource_create_all(context, values_list)
+
+
+def resource_update_by_id(context, resource_id, values, atomic_key=None):
+    return IMPL.resource_update_by_id(context, resource_id, values,
+                                      atomic_key=atomic_key)
+
+
+def resource_update_all_by_id(context, stack_id, values_by_id):
+    return IMPL.resource_update_all_by_id(context, stack_id, values_by_id)
+
+
 def resource_get_all_by_stack(context, stack_id):
     return IMPL.resource_get_all_by_stack(context, stack_id)
 
@@ -119,11 +132,24 @@ def resource_get_by_name_and_stack(context, resource_name, stack_id):
                                                resource_name, stack_id)
 
 
+def resource_metadata_get_by_name_and_stack(context, resource_name,
+                                            stack_id):
+    return IMPL.resource_metadata_get_by_name_and_stack(context,
+                                                        resource_name,
+                                                        stack_id)
+
+
 def resource_get_by_physical_resource_id(context, physical_resource_id):
     return IMPL.resource_get_by_physical_resource_id(context,
                                                      physical_resource_id)
 
 
+def resource_get_all_by_physical_resource_ids(context,
+                                              physical_resource_ids):
+    return IMPL.resource_get_all_by_physical_resource_ids(
+        context, physical_resource_ids)
+
+
 def stack_get(context, stack_id, show_deleted=False, tenant_safe=True,
               eager_load=False):
     return IMPL.stack_get(context, stack_id, show_deleted=show_deleted,
@@ -178,6 +204,12 @@ def stack_update(context, stack_id, values):
     return IMPL.stack_update(context, stack_id, values)
 
 
+def stack_status_set_all(context, stack_ids, old_status, new_status,
+                         reasons):
+    return IMPL.stack_status_set_all(context, stack_ids, old_status,
+                                     new_status, reasons)
+
+
 def stack_delete(context, stack_id):
     return IMPL.stack_delete(context, stack_id)
 
@@ -194,6 +226,18 @@ def stack_lock_steal(stack_id, old_engine_id, new_engine_id):
     return IMPL.stack_lock_steal(stack_id, old_engine_id, new_engine_id)
 
 
+def stack_lock_get_engine_ids():
+    return IMPL.stack_lock_get_engine_ids()
+
+
+def stack_lock_steal_all(old_engine_ids, new_engine_id):
+    return IMPL.stack_lock_steal_all(old_engine_ids, new_engine_id)
+
+
+def stack_lock_release_all(stack_ids, engine_id):
+    return IMPL.stack_lock_release_all(stack_ids, engine_id)
+
+
 def stack_lock_release(stack_id, engine_id):
     return IMPL.stack_lock_release(stack_id, engine_id)
 
@@ -227,23 +271,27 @@ def event_get_all(context):
 
 
 def event_get_all_by_tenant(context, limit=None, marker=None,
-                            sort_keys=None, sort_dir=None, filters=None):
+                            sort_keys=None, sort_dir=None, filters=None,
+                            include_properties=True):
     return IMPL.event_get_all_by_tenant(context,
                                         limit=limit,
                                         marker=marker,
                                         sort_keys=sort_keys,
                                         sort_dir=sort_dir,
-                                        filters=filters)
+                                        filters=filters,
+                                        include_properties=include_properties)
 
 
 def event_get_all_by_stack(context, stack_id, limit=None, marker=None,
-                           sort_keys=None, sort_dir=None, filters=None):
+                           sort_keys=None, sort_dir=None, filters=None,
+                           include_properties=True):
     return IMPL.event_get_all_by_stack(context, stack_id,
                                        limit=limit,
                                        marker=marker,
                                        sort_keys=sort_keys,
                                        sort_dir=sort_dir,
-                                       filters=filters)
+                                       filters=filters,
+                                       include_properties=include_properties)
 
 
 def event_count_all_by_stack(context, stack_id):
@@ -270,6 +318,21 @@ def watch_rule_get_all_by_stack(context, stack_id):
     return IMPL.watch_rule_get_all_by_stack(context, stack_id)
 
 
+def watch_rule_get_all_evaluable(context, shard_count=1, shard_index=0,
+                                 due_only=True):
+    return IMPL.watch_rule_get_all_evaluable(context, shard_count=shard_count,
+                                             shard_index=shard_index,
+                                             due_only=due_only)
+
+
+def watch_rule_get_version(context):
+    return IMPL.watch_rule_get_version(context)
+
+
+def watch_rule_update_all_by_id(context, values_by_id):
+    return IMPL.watch_rule_update_all_by_id(context, values_by_id)
+
+
 def watch_rule_create(context, values):
     return IMPL.watch_rule_create(context, values)
 
@@ -286,12 +349,22 @@ def watch_data_create(context, values):
     return IMPL.watch_data_create(context, values)
 
 
+def watch_data_create_all(context, values_list):
+    return IMPL.watch_data_create_all(context, values_list)
+
+
 def watch_data_get_all(context):
     return IMPL.watch_data_get_all(context)
 
 
-def watch_data_get_all_by_watch_rule_id(context, watch_rule_id):
-    return IMPL.watch_data_get_all_by_watch_rule_id(context, watch_rule_id)
+def watch_data_get_all_by_watch_rule_id(context, watch_rule_id, since=None):
+    return IMPL.watch_data_get_all_by_watch_rule_id(context, watch_rule_id,
+                                                    since=since)
+
+
+def watch_data_delete_by_watch_rule_id(context, watch_rule_id, before):
+    return IMPL.watch_data_delete_by_watch_rule_id(context, watch_rule_id,
+                                                   before)
 
 
 def software_config_create(context, values):
@@ -310,6 +383,10 @@ def software_deployment_create(context, values):
     return IMPL.software_deployment_create(context, values)
 
 
+def software_deployment_create_all(context, values_list):
+    return IMPL.software_deployment_create_all(context, values_list)
+
+
 def software_deployment_get(context, deployment_id):
     return IMPL.software_deployment_get(context, deployment_id)
 
@@ -318,6 +395,10 @@ def software_deployment_get_all(context, server_id=None):
     return IMPL.software_deployment_get_all(context, server_id)
 
 
+def software_deployment_get_all_by_servers(context, server_ids):
+    return IMPL.software_deployment_get_all_by_servers(context, server_ids)
+
+
 def software_deployment_update(context, deployment_id, values):
     return IMPL.software_deployment_update(context, deployment_id, values)
 
@@ -374,6 +455,10 @@ def service_get_all_by_args(context, host, binary, hostname):
     return IMPL.service_get_all_by_args(context, host, binary, hostname)
 
 
+def service_get_by_engine_id(context, engine_id):
+    return IMPL.service_get_by_engine_id(context, engine_id)
+
+
 def sync_point_delete_all_by_stack_and_traversal(context, stack_id,
                                                  traversal_id):
     return IMPL.sync_point_delete_all_by_stack_and_traversal(context,
@@ -385,6 +470,10 @@ def sync_point_create(context, values):
     return IMPL.sync_point_create(context, values)
 
 
+def sync_point_create_all(context, values_list):
+    return IMPL.sync_point_create_all(context, values_list)
+
+
 def sync_point_get(context, entity_id, traversal_id, is_update):
     return IMPL.sync_point_get(context, entity_id, traversal_id, is_update)
 
@@ -397,6 +486,11 @@ def sync_point_update_input_data(context, entity_id,
                                              atomic_key, input_data)
 
 
+def db_pool_checkedout():
+    """Return the number of connections checked out of the DB pool."""
+    return IMPL.db_pool_checkedout()
+
+
 def db_sync(engine, version=None):
     """Migrate the database to `version` or the most recent version."""
     return IMPL.db_sync(engine, version=version)
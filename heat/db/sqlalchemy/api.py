@@ -12,8 +12,10 @@
 #    under the License.
 
 '''Implementation of SQLAlchemy backend.'''
+import collections
 import datetime
 import sys
+import time
 
 from oslo_config import cfg
 from oslo_db.sqlalchemy import session as db_session
@@ -29,6 +31,7 @@ from sqlalchemy.orm import session as orm_session
 from heat.common import crypt
 from heat.common import exception
 from heat.common.i18n import _
+from heat.common import query_stats
 from heat.db.sqlalchemy import filters as db_filters
 from heat.db.sqlalchemy import migration
 from heat.db.sqlalchemy import models
@@ -42,11 +45,31 @@ CONF.import_group('profiler', 'heat.common.config')
 _facade = None
 
 
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    # Timed on the execution context rather than on the connection, so a
+    # statement that raises leaves nothing behind
+    if query_stats.active() and context is not None:
+        context.heat_query_start = time.time()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start = getattr(context, 'heat_query_start', None)
+    if start is not None:
+        context.heat_query_start = None
+        query_stats.record(statement, time.time() - start)
+
+
 def get_facade():
     global _facade
 
     if not _facade:
         _facade = db_session.EngineFacade.from_config(CONF)
+        sqlalchemy.event.listen(_facade.get_engine(), 'before_cursor_execute',
+                                _before_cursor_execute)
+        sqlalchemy.event.listen(_facade.get_engine(), 'after_cursor_execute',
+                                _after_cursor_execute)
         if CONF.profiler.profiler_enabled:
             if CONF.profiler.trace_sqlalchemy:
                 osprofiler.sqlalchemy.add_tracing(sqlalchemy,
@@ -136,6 +159,20 @@ def resource_get_by_name_and_stack(context, resource_name, stack_id):
     return result
 
 
+def resource_metadata_get_by_name_and_stack(context, resource_name,
+                                            stack_id):
+    """Return the metadata of a resource without loading the rest of its row.
+
+    :returns: an (id, rsrc_metadata) row, or None if there is no such resource
+    """
+    return model_query(
+        context, models.Resource.id, models.Resource.rsrc_metadata
+    ).filter(
+        models.Resource.name == resource_name,
+        models.Resource.stack_id == stack_id
+    ).first()
+
+
 def resource_get_by_physical_resource_id(context, physical_resource_id):
     results = (model_query(context, models.Resource)
                .filter_by(nova_instance=physical_resource_id)
@@ -148,6 +185,28 @@ def resource_get_by_physical_resource_id(context, physical_resource_id):
     return None
 
 
+def resource_get_all_by_physical_resource_ids(context,
+                                              physical_resource_ids):
+    """Look up the resources of many physical resource IDs in one query.
+
+    :returns: dict mapping each physical resource ID found to its resource
+    """
+    results = (model_query(context, models.Resource)
+               .filter(models.Resource.nova_instance.in_(
+                   physical_resource_ids))
+               .options(orm.joinedload('stack'), orm.joinedload('data'))
+               .all())
+
+    resources = {}
+    for result in results:
+        if result.nova_instance in resources:
+            continue
+        if context is None or context.tenant_id in (
+                result.stack.tenant, result.stack.stack_user_project_id):
+            resources[result.nova_instance] = result
+    return resources
+
+
 def resource_get_all(context):
     results = model_query(context, models.Resource).all()
 
@@ -168,6 +227,26 @@ def resource_update(context, resource_id, values, atomic_key,
         return bool(rows_updated)
 
 
+def resource_update_by_id(context, resource_id, values, atomic_key=None):
+    """Update a resource with a single UPDATE statement, without loading it.
+
+    If atomic_key is given, the row is only updated if its atomic_key still
+    matches, and the key is then incremented.
+
+    :returns: whether the row was updated
+    """
+    session = _session(context)
+    with session.begin(subtransactions=True):
+        query = session.query(models.Resource).filter_by(id=resource_id)
+        if atomic_key is not None:
+            values = dict(values, atomic_key=atomic_key + 1)
+            query = query.filter_by(atomic_key=atomic_key)
+        rows_updated = query.update(values, synchronize_session=False)
+    _expire_resources(session, [resource_id])
+
+    return bool(rows_updated)
+
+
 def resource_data_get_all(resource, data=None):
     """
     Looks up resource_data by resource.id.  If data is encrypted,
@@ -181,12 +260,18 @@ def resource_data_get_all(resource, data=None):
         raise exception.NotFound(_('no resource data found'))
 
     ret = {}
+    redacted = []
 
     for res in data:
         if res.redact:
-            ret[res.key] = _decrypt(res.value, res.decrypt_method)
+            redacted.append(res)
         else:
             ret[res.key] = res.value
+
+    values = _decrypt_all((res.value, res.decrypt_method,
+                           ('resource_data', res.id))
+                          for res in redacted)
+    ret.update(zip((res.key for res in redacted), values))
     return ret
 
 
@@ -198,7 +283,8 @@ def resource_data_get(resource, key):
                                       resource.id,
                                       key)
     if result.redact:
-        return _decrypt(result.value, result.decrypt_method)
+        return _decrypt(result.value, result.decrypt_method,
+                        ('resource_data', result.id))
     return result.value
 
 
@@ -239,13 +325,16 @@ def _encrypt(value):
         return None, None
 
 
-def _decrypt(enc_value, method):
-    if method is None:
-        return None
-    decryptor = getattr(crypt, method)
-    value = decryptor(enc_value)
-    if value is not None:
-        return six.text_type(value, 'utf-8')
+def _decrypt(enc_value, method, cache_id=None):
+    return _decrypt_all([(enc_value, method, cache_id)])[0]
+
+
+def _decrypt_all(items):
+    """Decrypt a batch of (enc_value, method, cache_id) tuples."""
+    values = crypt.decrypt_all((method, enc_value, cache_id)
+                               for enc_value, method, cache_id in items)
+    return [six.text_type(value, 'utf-8') if value is not None else None
+            for value in values]
 
 
 def resource_data_get_by_key(context, resource_id, key):
@@ -305,6 +394,76 @@ def resource_create(context, values):
     return resource_ref
 
 
+def resource_create_all(context, values_list):
+    """Create many resources in a single transaction.
+
+    :returns: the new resources, in the same order as values_list
+    """
+    session = _session(context)
+    resource_refs = []
+    with session.begin(subtransactions=True):
+        for values in values_list:
+            resource_ref = models.Resource()
+            resource_ref.update(values)
+            resource_refs.append(resource_ref)
+        session.add_all(resource_refs)
+    return resource_refs
+
+
+def _expire_resources(session, resource_ids):
+    """Expire the given resources, if loaded, after a bulk UPDATE.
+
+    Statements issued without loading the rows bypass the identity map of the
+    session, so any resources it holds are refreshed on their next access.
+    """
+    for resource_id in resource_ids:
+        key = orm.util.identity_key(models.Resource, resource_id)
+        resource = session.identity_map.get(key)
+        if resource is not None:
+            session.expire(resource)
+
+
+def resource_update_all_by_id(context, stack_id, values_by_id):
+    """Update many resources with one executemany UPDATE per set of columns.
+
+    Nothing is updated unless all of the resources belong to the stack.
+
+    :param stack_id: the ID of the stack the resources belong to
+    :param values_by_id: dict mapping resource IDs to the values to update
+    :returns: the number of rows updated
+    """
+    groups = collections.defaultdict(list)
+    for resource_id, values in six.iteritems(values_by_id):
+        params = dict(values)
+        params['_id'] = resource_id
+        groups[frozenset(values)].append(params)
+
+    table = models.Resource.__table__
+    session = _session(context)
+    rows_updated = 0
+    with session.begin(subtransactions=True):
+        for columns, params in six.iteritems(groups):
+            stmt = table.update().where(sqlalchemy.and_(
+                table.c.id == sqlalchemy.bindparam('_id'),
+                table.c.stack_id == stack_id)
+            ).values(dict((c, sqlalchemy.bindparam(c)) for c in columns))
+            rows_updated += session.execute(stmt, params).rowcount
+        if not session.get_bind().dialect.supports_sane_multi_rowcount:
+            # The driver does not count the rows of an executemany
+            rows_updated = (session.query(models.Resource)
+                            .filter(models.Resource.id.in_(values_by_id))
+                            .filter_by(stack_id=stack_id).count())
+        if rows_updated != len(values_by_id):
+            raise exception.NotFound(_('Attempt to update %(count)d '
+                                       'resources of stack %(stack)s, of '
+                                       'which only %(found)d exist') % {
+                                           'count': len(values_by_id),
+                                           'stack': stack_id,
+                                           'found': rows_updated})
+    _expire_resources(session, values_by_id)
+    return rows_updated
+
+
 def resource_get_all_by_stack(context, stack_id):
     results = model_query(
         context, models.Resource
@@ -521,6 +680,46 @@ def stack_update(context, stack_id, values):
     return (rows_updated is not None and rows_updated > 0)
 
 
+def stack_status_set_all(context, stack_ids, old_status, new_status,
+                         reasons):
+    """Change the status of many stacks with one UPDATE per stack action.
+
+    Only the stacks in stack_ids that are currently in old_status are
+    changed. reasons maps each stack action to the status reason to store.
+    The rows are locked while they are updated, so exactly the stacks whose
+    status was changed are returned.
+
+    :returns: list of (id, name, action, tenant, username, created_at) rows
+              of the updated stacks
+    """
+    session = _session(context)
+    with session.begin(subtransactions=True):
+        rows = (session.query(models.Stack.id,
+                              models.Stack.name,
+                              models.Stack.action,
+                              models.Stack.tenant,
+                              models.Stack.username,
+                              models.Stack.created_at)
+                .filter(models.Stack.id.in_(stack_ids))
+                .filter_by(status=old_status)
+                .with_for_update().all())
+
+        ids_by_action = collections.defaultdict(list)
+        for row in rows:
+            ids_by_action[row.action].append(row.id)
+
+        for action, ids in six.iteritems(ids_by_action):
+            (session.query(models.Stack)
+             .filter(models.Stack.id.in_(ids))
+             .filter_by(status=old_status)
+             .update({'status': new_status,
+                      'status_reason': reasons.get(action)},
+                     synchronize_session=False))
+    session.expire_all()
+
+    return rows
+
+
 def stack_delete(context, stack_id):
     s = stack_get(context, stack_id)
     if not s:
@@ -566,6 +765,41 @@ def stack_lock_steal(stack_id, old_engine_id, new_engine_id):
         return lock.engine_id if lock is not None else True
 
 
+def stack_lock_get_engine_ids():
+    session = get_session()
+    with session.begin():
+        return [engine_id for (engine_id,) in
+                session.query(models.StackLock.engine_id).distinct()]
+
+
+def stack_lock_steal_all(old_engine_ids, new_engine_id):
+    """Take over all locks held by any of the old engines.
+
+    :returns: list of the IDs of the stacks whose locks were taken over
+    """
+    session = get_session()
+    with session.begin():
+        query = session.query(models.StackLock).filter(
+            models.StackLock.engine_id.in_(old_engine_ids))
+        stack_ids = [lock.stack_id for lock in query.with_for_update()]
+        if stack_ids:
+            query.filter(
+                models.StackLock.stack_id.in_(stack_ids)
+            ).update({"engine_id": new_engine_id},
+                     synchronize_session=False)
+    return stack_ids
+
+
+def stack_lock_release_all(stack_ids, engine_id):
+    session = get_session()
+    with session.begin():
+        return session.query(
+            models.StackLock
+        ).filter(models.StackLock.stack_id.in_(stack_ids)
+                 ).filter_by(engine_id=engine_id
+                             ).delete(synchronize_session=False)
+
+
 def stack_lock_release(stack_id, engine_id):
     session = get_session()
     with session.begin():
@@ -641,8 +875,10 @@ def user_creds_get(user_creds_id):
     # or it can be committed back to the DB in decrypted form
     result = dict(db_result)
     del result['decrypt_method']
-    result['password'] = _decrypt(result['password'], db_result.decrypt_method)
-    result['trust_id'] = _decrypt(result['trust_id'], db_result.decrypt_method)
+    result['password'], result['trust_id'] = _decrypt_all(
+        (result[field], db_result.decrypt_method,
+         ('user_creds', db_result.id, field))
+        for field in ('password', 'trust_id'))
     return result
 
 
@@ -671,9 +907,17 @@ def event_get_all(context):
     return results
 
 
-def event_get_all_by_tenant(context, limit=None, marker=None,
-                            sort_keys=None, sort_dir=None, filters=None):
+def _events_query(context, include_properties=True):
     query = model_query(context, models.Event)
+    if not include_properties:
+        query = query.options(orm.defer('resource_properties'))
+    return query
+
+
+def event_get_all_by_tenant(context, limit=None, marker=None,
+                            sort_keys=None, sort_dir=None, filters=None,
+                            include_properties=True):
+    query = _events_query(context, include_properties)
     query = db_filters.exact_filter(query, models.Event, filters)
     query = query.join(
         models.Event.stack
@@ -683,14 +927,16 @@ def event_get_all_by_tenant(context, limit=None, marker=None,
                                          sort_keys, sort_dir, filters).all()
 
 
-def _query_all_by_stack(context, stack_id):
-    query = model_query(context, models.Event).filter_by(stack_id=stack_id)
+def _query_all_by_stack(context, stack_id, include_properties=True):
+    query = _events_query(context, include_properties).filter_by(
+        stack_id=stack_id)
     return query
 
 
 def event_get_all_by_stack(context, stack_id, limit=None, marker=None,
-                           sort_keys=None, sort_dir=None, filters=None):
-    query = _query_all_by_stack(context, stack_id)
+                           sort_keys=None, sort_dir=None, filters=None,
+                           include_properties=True):
+    query = _query_all_by_stack(context, stack_id, include_properties)
     return _events_filter_and_page_query(context, query, limit, marker,
                                          sort_keys, sort_dir, filters).all()
 
@@ -783,7 +1029,8 @@ def watch_rule_get_by_name(context, watch_rule_name):
 
 
 def watch_rule_get_all(context):
-    results = model_query(context, models.WatchRule).all()
+    results = model_query(context, models.WatchRule).options(
+        orm.joinedload('stack')).all()
     return results
 
 
@@ -793,6 +1040,64 @@ def watch_rule_get_all_by_stack(context, stack_id):
     return results
 
 
+def watch_rule_get_all_evaluable(context, shard_count=1, shard_index=0,
+                                 due_only=True):
+    """
+    Return the watch rules evaluated by heat, i.e. neither suspended nor
+    handed over to Ceilometer, restricted to a shard of the rule ids.
+
+    Unless due_only is False, only the rules whose period has elapsed since
+    they were last evaluated are returned.
+    """
+    query = model_query(context, models.WatchRule).options(
+        orm.joinedload('stack')).filter(
+            ~models.WatchRule.state.in_(
+                [rpc_api.WATCH_STATE_SUSPENDED,
+                 rpc_api.WATCH_STATE_CEILOMETER_CONTROLLED]))
+    if shard_count > 1:
+        query = query.filter(models.WatchRule.id % shard_count == shard_index)
+    if due_only:
+        query = query.filter(sqlalchemy.or_(
+            models.WatchRule.next_evaluation.is_(None),
+            models.WatchRule.next_evaluation <= timeutils.utcnow()))
+    return query.all()
+
+
+def watch_rule_get_version(context):
+    """
+    Return the number of watch rules and the highest rule id, which change
+    whenever a watch rule is created or deleted.
+    """
+    return tuple(model_query(context,
+                             sqlalchemy.func.count(models.WatchRule.id),
+                             sqlalchemy.func.max(models.WatchRule.id)).one())
+
+
+def watch_rule_update_all_by_id(context, values_by_id):
+    """Update many watch rules with one executemany UPDATE per set of columns.
+
+    :param values_by_id: dict mapping watch rule IDs to the values to update
+    :returns: the number of rows updated
+    """
+    groups = collections.defaultdict(list)
+    for watch_id, values in six.iteritems(values_by_id):
+        params = dict(values)
+        params['_id'] = watch_id
+        groups[frozenset(values)].append(params)
+
+    table = models.WatchRule.__table__
+    session = _session(context)
+    rows_updated = 0
+    with session.begin(subtransactions=True):
+        for columns, params in six.iteritems(groups):
+            stmt = table.update().where(
+                table.c.id == sqlalchemy.bindparam('_id')
+            ).values(dict((c, sqlalchemy.bindparam(c)) for c in columns))
+            rows_updated += session.execute(stmt, params).rowcount
+    session.expire_all()
+    return rows_updated
+
+
 def watch_rule_create(context, values):
     obj_ref = models.WatchRule()
     obj_ref.update(values)
@@ -835,15 +1140,33 @@ def watch_data_create(context, values):
     return obj_ref
 
 
+def watch_data_create_all(context, values_list):
+    """Create many watch data samples with a single executemany INSERT."""
+    if not values_list:
+        return
+    session = _session(context)
+    with session.begin(subtransactions=True):
+        session.execute(models.WatchData.__table__.insert(), values_list)
+
+
 def watch_data_get_all(context):
     results = model_query(context, models.WatchData).all()
     return results
 
 
-def watch_data_get_all_by_watch_rule_id(context, watch_rule_id):
-    results = model_query(context, models.WatchData).filter_by(
-        watch_rule_id=watch_rule_id).all()
-    return results
+def watch_data_get_all_by_watch_rule_id(context, watch_rule_id, since=None):
+    query = model_query(context, models.WatchData).filter_by(
+        watch_rule_id=watch_rule_id)
+    if since is not None:
+        query = query.filter(models.WatchData.created_at >= since)
+    return query.all()
+
+
+def watch_data_delete_by_watch_rule_id(context, watch_rule_id, before):
+    return model_query(context, models.WatchData).filter_by(
+        watch_rule_id=watch_rule_id).filter(
+            models.WatchData.created_at < before).delete(
+                synchronize_session=False)
 
 
 def software_config_create(context, values):
@@ -879,6 +1202,19 @@ def software_deployment_create(context, values):
     return obj_ref
 
 
+def software_deployment_create_all(context, values_list):
+    """Create many software deployments in a single transaction."""
+    session = _session(context)
+    obj_refs = []
+    with session.begin(subtransactions=True):
+        for values in values_list:
+            obj_ref = models.SoftwareDeployment()
+            obj_ref.update(values)
+            session.add(obj_ref)
+            obj_refs.append(obj_ref)
+    return obj_refs
+
+
 def software_deployment_get(context, deployment_id):
     result = model_query(context, models.SoftwareDeployment).get(deployment_id)
     if (result is not None and context is not None and
@@ -905,6 +1241,17 @@ def software_deployment_get_all(context, server_id=None):
     return query.all()
 
 
+def software_deployment_get_all_by_servers(context, server_ids):
+    """Get the deployments of many servers, along with their configs."""
+    sd = models.SoftwareDeployment
+    query = model_query(context, sd).filter(sqlalchemy.or_(
+        sd.tenant == context.tenant_id,
+        sd.stack_user_project_id == context.tenant_id))
+    query = query.filter(sd.server_id.in_(server_ids))
+    return query.options(orm.joinedload('config')).order_by(
+        sd.created_at).all()
+
+
 def software_deployment_update(context, deployment_id, values):
     deployment = software_deployment_get(context, deployment_id)
     deployment.update(values)
@@ -1010,6 +1357,12 @@ def service_get_all_by_args(context, host, binary, hostname):
             filter_by(hostname=hostname).all())
 
 
+def service_get_by_engine_id(context, engine_id):
+    """Return the (possibly soft-deleted) service record of an engine."""
+    return (model_query(context, models.Service).
+            filter_by(engine_id=engine_id).first())
+
+
 def purge_deleted(age, granularity='days'):
     try:
         age = int(age)
@@ -1083,6 +1436,15 @@ def sync_point_create(context, values):
     return sync_point_ref
 
 
+def sync_point_create_all(context, values_list):
+    """Create many sync points with a single executemany INSERT."""
+    if not values_list:
+        return
+    session = _session(context)
+    with session.begin(subtransactions=True):
+        session.execute(models.SyncPoint.__table__.insert(), values_list)
+
+
 def sync_point_get(context, entity_id, traversal_id, is_update):
     return model_query(context, models.SyncPoint).get(
         (entity_id, traversal_id, is_update)
@@ -1101,6 +1463,14 @@ def sync_point_update_input_data(context, entity_id,
     return rows_updated
 
 
+def db_pool_checkedout():
+    """Return the number of connections checked out of the DB pool."""
+    pool = get_engine().pool
+    if not hasattr(pool, 'checkedout'):
+        return None
+    return pool.checkedout()
+
+
 def db_sync(engine, version=None):
     """Migrate the database to `version` or the most recent version."""
     if version is not None and int(version) < db_version(engine):
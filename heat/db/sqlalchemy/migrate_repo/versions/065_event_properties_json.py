@@ -0,0 +1,61 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from six.moves import cPickle as pickle
+import sqlalchemy
+
+from heat.db.sqlalchemy import types
+
+BATCH_SIZE = 500
+
+
+def _unpickle(value):
+    try:
+        return pickle.loads(bytes(value))
+    except Exception as ex:
+        return {'Error': 'Resource properties could not be converted: '
+                         '%s' % ex}
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData(bind=migrate_engine)
+    event = sqlalchemy.Table('event', meta, autoload=True)
+
+    new_props = sqlalchemy.Column('new_resource_properties', types.Json)
+    event.create_column(new_props)
+
+    update = event.update().where(
+        event.c.id == sqlalchemy.bindparam('_id')).values(
+            new_resource_properties=sqlalchemy.bindparam(
+                '_props', type_=types.Json()))
+
+    # convert the pickled properties in batches, so that large event tables
+    # are never loaded in memory at once
+    last_id = 0
+    while True:
+        rows = sqlalchemy.select(
+            [event.c.id, event.c.resource_properties]).where(
+                event.c.id > last_id).order_by(event.c.id).limit(
+                    BATCH_SIZE).execute().fetchall()
+        if not rows:
+            break
+        # Json would store None as 'null', so rows without properties are
+        # left alone and keep the NULL of the new column
+        params = [{'_id': row.id, '_props': _unpickle(row.resource_properties)}
+                  for row in rows if row.resource_properties is not None]
+        if params:
+            migrate_engine.execute(update, params)
+        last_id = rows[-1].id
+
+    event.c.resource_properties.drop()
+    event.c.new_resource_properties.alter(name='resource_properties')
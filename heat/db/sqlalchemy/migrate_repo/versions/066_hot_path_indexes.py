@@ -0,0 +1,44 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData(bind=migrate_engine)
+
+    resource = sqlalchemy.Table('resource', meta, autoload=True)
+    sqlalchemy.Index('ix_resource_stack_id_name',
+                     resource.c.stack_id, resource.c.name,
+                     mysql_length={'name': 200}).create(migrate_engine)
+    sqlalchemy.Index('ix_resource_nova_instance', resource.c.nova_instance,
+                     mysql_length=255).create(migrate_engine)
+
+    resource_data = sqlalchemy.Table('resource_data', meta, autoload=True)
+    sqlalchemy.Index('ix_resource_data_resource_id',
+                     resource_data.c.resource_id).create(migrate_engine)
+
+    stack = sqlalchemy.Table('stack', meta, autoload=True)
+    sqlalchemy.Index('ix_stack_owner_id',
+                     stack.c.owner_id).create(migrate_engine)
+
+    # The deployments of a server are always read in creation order, so
+    # replace the index on server_id with one which also gives the order
+    software_deployment = sqlalchemy.Table('software_deployment', meta,
+                                           autoload=True)
+    sqlalchemy.Index('ix_software_deployment_server_id_created_at',
+                     software_deployment.c.server_id,
+                     software_deployment.c.created_at).create(migrate_engine)
+    for index in list(software_deployment.indexes):
+        if [c.name for c in index.columns] == ['server_id']:
+            index.drop(migrate_engine)
@@ -0,0 +1,26 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData(bind=migrate_engine)
+    watch_rule = sqlalchemy.Table('watch_rule', meta, autoload=True)
+
+    # The existing rules are left NULL, i.e. due for evaluation
+    next_evaluation = sqlalchemy.Column('next_evaluation',
+                                        sqlalchemy.DateTime)
+    watch_rule.create_column(next_evaluation)
+    sqlalchemy.Index('ix_watch_rule_next_evaluation',
+                     watch_rule.c.next_evaluation).create(migrate_engine)
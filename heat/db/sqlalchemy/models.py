@@ -146,6 +146,7 @@ class Stack(BASE, HeatBase, SoftDelete, StateAware):
     __table_args__ = (
         sqlalchemy.Index('ix_stack_name', 'name', mysql_length=255),
         sqlalchemy.Index('ix_stack_tenant', 'tenant', mysql_length=255),
+        sqlalchemy.Index('ix_stack_owner_id', 'owner_id'),
     )
 
     id = sqlalchemy.Column(sqlalchemy.String(36), primary_key=True,
@@ -241,7 +242,7 @@ class Event(BASE, HeatBase):
     _resource_status_reason = sqlalchemy.Column(
         'resource_status_reason', sqlalchemy.String(255))
     resource_type = sqlalchemy.Column(sqlalchemy.String(255))
-    resource_properties = sqlalchemy.Column(sqlalchemy.PickleType)
+    resource_properties = sqlalchemy.Column(types.Json)
 
     @property
     def resource_status_reason(self):
@@ -256,6 +257,8 @@ class ResourceData(BASE, HeatBase):
     """Key/value store of arbitrary, resource-specific data."""
 
     __tablename__ = 'resource_data'
+    __table_args__ = (
+        sqlalchemy.Index('ix_resource_data_resource_id', 'resource_id'),)
 
     id = sqlalchemy.Column('id',
                            sqlalchemy.Integer,
@@ -275,6 +278,12 @@ class Resource(BASE, HeatBase, StateAware):
     """Represents a resource created by the heat engine."""
 
     __tablename__ = 'resource'
+    __table_args__ = (
+        sqlalchemy.Index('ix_resource_stack_id_name', 'stack_id', 'name',
+                         mysql_length={'name': 200}),
+        sqlalchemy.Index('ix_resource_nova_instance', 'nova_instance',
+                         mysql_length=255),
+    )
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     uuid = sqlalchemy.Column(sqlalchemy.String(36),
@@ -317,6 +326,8 @@ class WatchRule(BASE, HeatBase):
     """Represents a watch_rule created by the heat engine."""
 
     __tablename__ = 'watch_rule'
+    __table_args__ = (
+        sqlalchemy.Index('ix_watch_rule_next_evaluation', 'next_evaluation'),)
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     name = sqlalchemy.Column('name', sqlalchemy.String(255))
@@ -324,6 +335,8 @@ class WatchRule(BASE, HeatBase):
     state = sqlalchemy.Column('state', sqlalchemy.String(255))
     last_evaluated = sqlalchemy.Column(sqlalchemy.DateTime,
                                        default=timeutils.utcnow)
+    # last_evaluated plus the period of the rule, NULL if due
+    next_evaluation = sqlalchemy.Column(sqlalchemy.DateTime)
 
     stack_id = sqlalchemy.Column(sqlalchemy.String(36),
                                  sqlalchemy.ForeignKey('stack.id'),
@@ -335,6 +348,9 @@ class WatchData(BASE, HeatBase):
     """Represents a watch_data created by the heat engine."""
 
     __tablename__ = 'watch_data'
+    __table_args__ = (
+        sqlalchemy.Index('ix_watch_data_watch_rule_id_created_at',
+                         'watch_rule_id', 'created_at'),)
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     data = sqlalchemy.Column('data', types.Json)
@@ -371,7 +387,10 @@ class SoftwareDeployment(BASE, HeatBase, StateAware):
 
     __tablename__ = 'software_deployment'
     __table_args__ = (
-        sqlalchemy.Index('ix_software_deployment_created_at', 'created_at'),)
+        sqlalchemy.Index('ix_software_deployment_created_at', 'created_at'),
+        sqlalchemy.Index('ix_software_deployment_server_id_created_at',
+                         'server_id', 'created_at'),
+    )
 
     id = sqlalchemy.Column('id', sqlalchemy.String(36), primary_key=True,
                            default=lambda: str(uuid.uuid4()))
@@ -382,7 +401,7 @@ class SoftwareDeployment(BASE, HeatBase, StateAware):
         nullable=False)
     config = relationship(SoftwareConfig, backref=backref('deployments'))
     server_id = sqlalchemy.Column('server_id', sqlalchemy.String(36),
-                                  nullable=False, index=True)
+                                  nullable=False)
     input_values = sqlalchemy.Column('input_values', types.Json)
     output_values = sqlalchemy.Column('output_values', types.Json)
     tenant = sqlalchemy.Column(
@@ -435,3 +454,4 @@ class Service(BASE, HeatBase, SoftDelete):
     report_interval = sqlalchemy.Column('report_interval',
                                         sqlalchemy.Integer,
                                         nullable=False)
+    load_stats = sqlalchemy.Column('load_stats', types.Json)
@@ -16,9 +16,40 @@ from sqlalchemy.dialects import mysql
 from sqlalchemy.ext import mutable
 from sqlalchemy import types
 
+try:
+    import ujson as fast_json
+except ImportError:
+    fast_json = None
+
+fast_json_kwargs = {}
+if fast_json is not None:
+    # older ujson releases round floats unless asked not to
+    try:
+        fast_json.loads('0.1', precise_float=True)
+        fast_json_kwargs['precise_float'] = True
+    except TypeError:
+        pass
+
 
 dumps = jsonutils.dumps
-loads = jsonutils.loads
+_json_loads = jsonutils.loads
+
+
+def loads(value):
+    """
+    Decode a JSON column value.
+
+    Stored documents such as templates and files can be large and are
+    decoded on every load, so a faster decoder is used when one is
+    installed. Anything it cannot handle, e.g. integers too large for it,
+    is decoded by jsonutils.
+    """
+    if fast_json is not None:
+        try:
+            return fast_json.loads(value, **fast_json_kwargs)
+        except (ValueError, OverflowError):
+            pass
+    return _json_loads(value)
 
 
 class LongText(types.TypeDecorator):
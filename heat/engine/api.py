@@ -12,13 +12,16 @@
 #    under the License.
 
 import collections
+import hashlib
 
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 from oslo_utils import timeutils
 import six
 
 from heat.common.i18n import _
 from heat.common.i18n import _LE
+from heat.common import identifier
 from heat.common import param_utils
 from heat.common import template_format
 from heat.engine import constraints as constr
@@ -219,6 +222,18 @@ def format_stack_resource(resource, detail=True, with_props=False,
     return res
 
 
+def format_resource_metadata(metadata, etag=None):
+    '''
+    Return resource metadata along with an entity tag identifying its
+    content. The metadata is omitted if the tag matches the given etag.
+    '''
+    content = jsonutils.dumps(metadata, sort_keys=True).encode('utf-8')
+    res = {rpc_api.RES_METADATA_ETAG: hashlib.sha1(content).hexdigest()}
+    if res[rpc_api.RES_METADATA_ETAG] != etag:
+        res[rpc_api.RES_METADATA] = metadata
+    return res
+
+
 def format_stack_preview(stack):
     def format_resource(res):
         if isinstance(res, list):
@@ -232,7 +247,7 @@ def format_stack_preview(stack):
     return fmt_stack
 
 
-def format_event(event):
+def format_event(event, include_properties=True):
     stack_identifier = event.stack.identifier()
 
     result = {
@@ -246,8 +261,9 @@ def format_event(event):
         rpc_api.EVENT_RES_STATUS: event.status,
         rpc_api.EVENT_RES_STATUS_DATA: event.reason,
         rpc_api.EVENT_RES_TYPE: event.resource_type,
-        rpc_api.EVENT_RES_PROPERTIES: event.resource_properties,
     }
+    if include_properties:
+        result[rpc_api.EVENT_RES_PROPERTIES] = event.resource_properties
 
     return result
 
@@ -273,6 +289,26 @@ def format_notification_body(stack):
     return result
 
 
+def format_db_notification_body(db_stack, state, reason):
+    """
+    Return a notification body for a stack from its database record, without
+    loading the stack.
+    """
+    stack_identity = identifier.HeatIdentifier(db_stack.tenant,
+                                               db_stack.name,
+                                               db_stack.id)
+    result = {
+        rpc_api.NOTIFY_TENANT_ID: db_stack.tenant,
+        rpc_api.NOTIFY_USER_ID: db_stack.username,
+        rpc_api.NOTIFY_STACK_ID: stack_identity.arn(),
+        rpc_api.NOTIFY_STACK_NAME: db_stack.name,
+        rpc_api.NOTIFY_STATE: state,
+        rpc_api.NOTIFY_STATE_REASON: reason,
+        rpc_api.NOTIFY_CREATE_AT: timeutils.isotime(db_stack.created_at),
+    }
+    return result
+
+
 def format_watch(watch):
 
     result = {
@@ -114,6 +114,10 @@ class ResourceRef(function.Function):
         return itertools.chain(super(ResourceRef, self).dependencies(path),
                                [self._resource(path)])
 
+    def dependency_names(self):
+        return itertools.chain(super(ResourceRef, self).dependency_names(),
+                               [function.resolve(self.args)])
+
     def result(self):
         return self._resource().FnGetRefId()
 
@@ -182,6 +186,10 @@ class GetAtt(function.Function):
         return itertools.chain(super(GetAtt, self).dependencies(path),
                                [self._resource(path)])
 
+    def dependency_names(self):
+        return itertools.chain(super(GetAtt, self).dependency_names(),
+                               [function.resolve(self._resource_name)])
+
     def validate(self):
         super(GetAtt, self).validate()
         res = self._resource()
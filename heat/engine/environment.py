@@ -17,6 +17,7 @@ import fnmatch
 import glob
 import itertools
 import os.path
+import re
 import warnings
 
 from oslo_config import cfg
@@ -176,15 +177,162 @@ class GlobResourceInfo(MapResourceInfo):
         return resource_type.startswith(self.name[:-1])
 
 
+class _RegistryIndex(object):
+    """Lookup structures precompiled from the contents of a registry.
+
+    Glob mappings are indexed by prefix, so that finding the ones matching a
+    resource type takes one dict lookup per distinct prefix length rather
+    than a scan of the whole registry. Resource name patterns with hooks are
+    split into exact names and compiled wildcard patterns.
+
+    The index of a child registry is built from the merged view of all its
+    layers and remembers the parent index it was built against, so that it
+    is rebuilt when the parent changes.
+    """
+
+    def __init__(self, registry, parent_index=None):
+        self.parent_index = parent_index
+        self.glob_prefixes = {}
+        self.other_globs = []
+        for key, info in six.iteritems(registry._entries()):
+            if not key.endswith('*'):
+                continue
+            if isinstance(info, GlobResourceInfo):
+                self.glob_prefixes[key[:-1]] = registry._bind(info)
+            elif isinstance(info, ResourceInfo):
+                self.other_globs.append(registry._bind(info))
+        self.prefix_lengths = sorted(set(len(prefix) for prefix in
+                                         self.glob_prefixes))
+
+        self.hook_names = dict((hook, set()) for hook in HOOK_TYPES)
+        self.hook_patterns = dict((hook, []) for hook in HOOK_TYPES)
+        resources = registry._section('resources')
+        for name_pattern, resource in six.iteritems(resources):
+            if not isinstance(resource, dict) or 'hooks' not in resource:
+                continue
+            hooks = resource['hooks']
+            if isinstance(hooks, six.string_types):
+                hooks = [hooks]
+            elif not isinstance(hooks, collections.Sequence):
+                continue
+            wildcard = any(c in name_pattern for c in '*?[')
+            for hook in hooks:
+                if hook not in HOOK_TYPES:
+                    continue
+                if wildcard:
+                    self.hook_patterns[hook].append(
+                        re.compile(fnmatch.translate(name_pattern)).match)
+                else:
+                    self.hook_names[hook].add(name_pattern)
+
+    def globs_matching(self, resource_type):
+        for length in self.prefix_lengths:
+            info = self.glob_prefixes.get(resource_type[:length])
+            if info is not None:
+                yield info
+        for info in self.other_globs:
+            if info.matches(resource_type):
+                yield info
+
+    def matches_hook(self, resource_name, hook):
+        if hook not in self.hook_names:
+            return False
+        return (resource_name in self.hook_names[hook] or
+                any(match(resource_name)
+                    for match in self.hook_patterns[hook]))
+
+
 class ResourceRegistry(object):
-    """By looking at the environment, find the resource implementation."""
+    """By looking at the environment, find the resource implementation.
 
-    def __init__(self, global_registry, env):
-        self._registry = {'resources': {}}
+    A registry may be layered over a parent registry, as for the environment
+    of a nested stack. It then only stores its own changes: lookups fall
+    through to the parent, sections such as "resources" are copied from the
+    parent the first time they are written to, and entries removed from the
+    parent are masked with None.
+    """
+
+    def __init__(self, global_registry, env, parent=None):
+        self.parent = parent
+        self._registry = {'resources': {}} if parent is None else {}
+        self._index = None
         self.global_registry = global_registry
         self.environment = env
 
+    def new_child(self, env):
+        """Return an empty registry for env, layered over this one."""
+        return ResourceRegistry(self.global_registry, env, parent=self)
+
+    def _bind(self, info):
+        """Return info, rebuilt to resolve through this registry if needed."""
+        if not isinstance(info, ResourceInfo) or info.registry is self:
+            return info
+        bound = type(info)(self, info.path, info.value)
+        bound.user_resource = info.user_resource
+        return bound
+
+    def _bind_all(self, level):
+        return dict((k, self._bind_all(v) if isinstance(v, dict)
+                     else self._bind(v))
+                    for k, v in six.iteritems(level))
+
+    def _get(self, name):
+        """Return the top level entry for name, from the nearest layer."""
+        if name in self._registry or self.parent is None:
+            return self._registry.get(name)
+        return self._bind(self.parent._get(name))
+
+    def _entries(self):
+        """Return the merged top level entries of all the layers."""
+        if self.parent is None:
+            return self._registry
+        entries = dict(self.parent._entries())
+        for name, value in six.iteritems(self._registry):
+            if value is None:
+                entries.pop(name, None)
+            else:
+                entries[name] = value
+        return entries
+
+    def _section(self, name):
+        section = self._get(name)
+        return section if isinstance(section, dict) else {}
+
+    def _local_level(self, path):
+        """Return the level at path of this layer, creating it if needed.
+
+        A section inherited from the parent is copied into this layer first.
+        """
+        registry = self._registry
+        if path and path[0] not in registry and self.parent is not None:
+            section = self.parent._get(path[0])
+            if isinstance(section, dict):
+                registry[path[0]] = self._bind_all(section)
+        for key in path:
+            if registry.get(key) is None:
+                registry[key] = {}
+            registry = registry[key]
+        return registry
+
+    def _delete(self, registry, name):
+        if (registry is self._registry and self.parent is not None and
+                self.parent._get(name) is not None):
+            registry[name] = None
+        else:
+            registry.pop(name, None)
+
+    def _get_index(self):
+        parent_index = (self.parent._get_index()
+                        if self.parent is not None else None)
+        if self._index is None or self._index.parent_index is not parent_index:
+            self._index = _RegistryIndex(self, parent_index)
+        return self._index
+
+    def _invalidate_index(self):
+        self._index = None
+
     def load(self, json_snippet):
+        self._invalidate_index()
         self._load_registry([], json_snippet)
 
     def register_class(self, resource_type, resource_class):
@@ -204,51 +352,48 @@ class ResourceRegistry(object):
                                     ResourceInfo(self, path + [k], v))
 
     def _register_hook(self, path, hook):
+        self._invalidate_index()
         name = path[-1]
-        registry = self._registry
-        for key in path[:-1]:
-            if key not in registry:
-                registry[key] = {}
-            registry = registry[key]
+        registry = self._local_level(path[:-1])
         registry[name] = hook
 
     def _register_info(self, path, info):
         """place the new info in the correct location in the registry.
         path: a list of keys ['resources', 'my_server', 'OS::Nova::Server']
         """
+        self._invalidate_index()
         descriptive_path = '/'.join(path)
         name = path[-1]
         # create the structure if needed
-        registry = self._registry
-        for key in path[:-1]:
-            if key not in registry:
-                registry[key] = {}
-            registry = registry[key]
+        registry = self._local_level(path[:-1])
+        # at the top level, entries may also come from the parent layers
+        entries = self._entries() if len(path) == 1 else registry
 
         if info is None:
             if name.endswith('*'):
                 # delete all matching entries.
-                for res_name in list(six.iterkeys(registry)):
-                    if (isinstance(registry[res_name], ResourceInfo) and
+                for res_name in list(six.iterkeys(entries)):
+                    if (isinstance(entries[res_name], ResourceInfo) and
                             res_name.startswith(name[:-1])):
                         LOG.warn(_LW('Removing %(item)s from %(path)s'), {
                             'item': res_name,
                             'path': descriptive_path})
-                        del registry[res_name]
+                        self._delete(registry, res_name)
             else:
                 # delete this entry.
                 LOG.warn(_LW('Removing %(item)s from %(path)s'), {
                     'item': name,
                     'path': descriptive_path})
-                registry.pop(name, None)
+                self._delete(registry, name)
             return
 
-        if name in registry and isinstance(registry[name], ResourceInfo):
-            if registry[name] == info:
+        current = entries.get(name)
+        if isinstance(current, ResourceInfo):
+            if current == info:
                 return
             details = {
                 'path': descriptive_path,
-                'was': str(registry[name].value),
+                'was': str(current.value),
                 'now': str(info.value)}
             LOG.warn(_LW('Changing %(path)s from %(was)s to %(now)s'),
                      details)
@@ -269,11 +414,9 @@ class ResourceRegistry(object):
         if not isinstance(info, TemplateResourceInfo):
             return
 
-        registry = self._registry
-        for key in info.path[:-1]:
-            registry = registry[key]
-        if info.path[-1] in registry:
-            registry.pop(info.path[-1])
+        self._invalidate_index()
+        registry = self._local_level(info.path[:-1])
+        self._delete(registry, info.path[-1])
 
     def matches_hook(self, resource_name, hook):
         '''Return whether a resource have a hook set in the environment.
@@ -299,28 +442,18 @@ class ResourceRegistry(object):
         values. Resources support wildcard matching. The asterisk sign matches
         everything.
         '''
-        ress = self._registry['resources']
-        for name_pattern, resource in six.iteritems(ress):
-            if fnmatch.fnmatchcase(resource_name, name_pattern):
-                if 'hooks' in resource:
-                    hooks = resource['hooks']
-                    if isinstance(hooks, six.string_types):
-                        if hook == hooks:
-                            return True
-                    elif isinstance(hooks, collections.Sequence):
-                        if hook in hooks:
-                            return True
-        return False
+        return self._get_index().matches_hook(resource_name, hook)
 
     def remove_resources_except(self, resource_name):
-        ress = self._registry['resources']
+        self._invalidate_index()
+        ress = self._section('resources')
         new_resources = {}
         for name, res in six.iteritems(ress):
             if fnmatch.fnmatchcase(resource_name, name):
                 new_resources.update(res)
         if resource_name in ress:
             new_resources.update(ress[resource_name])
-        self._registry['resources'] = new_resources
+        self._registry['resources'] = self._bind_all(new_resources)
 
     def iterable_by(self, resource_type, resource_name=None):
         is_templ_type = resource_type.endswith(('.yaml', '.template'))
@@ -329,29 +462,25 @@ class ResourceRegistry(object):
             # not the global environment.
             # resource with a Type == a template
             # we dynamically create an entry as it has not been registered.
-            if resource_type not in self._registry:
+            if self._get(resource_type) is None:
                 res = ResourceInfo(self, [resource_type], None)
                 self._register_info([resource_type], res)
-            yield self._registry[resource_type]
+            yield self._get(resource_type)
 
         # handle a specific resource mapping.
         if resource_name:
-            impl = self._registry['resources'].get(resource_name)
+            impl = self._section('resources').get(resource_name)
             if impl and resource_type in impl:
-                yield impl[resource_type]
+                yield self._bind(impl[resource_type])
 
         # handle: "OS::Nova::Server" -> "Rackspace::Cloud::Server"
-        impl = self._registry.get(resource_type)
+        impl = self._get(resource_type)
         if impl:
             yield impl
 
         # handle: "OS::*" -> "Dreamhost::*"
-        def is_a_glob(resource_type):
-            return resource_type.endswith('*')
-        globs = six.moves.filter(is_a_glob, six.iterkeys(self._registry))
-        for pattern in globs:
-            if self._registry[pattern].matches(resource_type):
-                yield self._registry[pattern]
+        for info in self._get_index().globs_matching(resource_type):
+            yield info
 
     def get_resource_info(self, resource_type, resource_name=None,
                           registry_type=None):
@@ -428,21 +557,23 @@ class ResourceRegistry(object):
                     tmp[k] = v.value
             return tmp
 
-        return _as_dict(self._registry)
+        return _as_dict(self._entries())
 
     def get_types(self, support_status):
         '''Return a list of valid resource types.'''
 
+        entries = self._entries()
+
         def is_resource(key):
-            return isinstance(self._registry[key], (ClassResourceInfo,
-                                                    TemplateResourceInfo))
+            return isinstance(entries[key], (ClassResourceInfo,
+                                             TemplateResourceInfo))
 
         def status_matches(cls):
             return (support_status is None or
                     cls.get_class().support_status.status ==
                     support_status.encode())
 
-        return [name for name, cls in six.iteritems(self._registry)
+        return [name for name, cls in six.iteritems(entries)
                 if is_resource(name) and status_matches(cls)]
 
 
@@ -554,6 +685,9 @@ def get_child_environment(parent_env, child_params, item_to_remove=None,
     If `child_resource_name` is provided, resources in the registry will be
     replaced with the contents of the matching child resource plus anything
     that passes a wildcard match.
+
+    The child registry is layered over the parent's rather than copied from
+    it, so creating many children (e.g. the members of a group) is cheap.
     """
     def is_flat_params(env_or_param):
         if env_or_param is None:
@@ -563,14 +697,13 @@ def get_child_environment(parent_env, child_params, item_to_remove=None,
                 return False
         return True
 
-    child_env = parent_env.user_env_as_dict()
-    child_env[env_fmt.PARAMETERS] = {}
     flat_params = is_flat_params(child_params)
     new_env = Environment()
+    new_env.registry = parent_env.registry.new_child(new_env)
+    new_env.param_defaults.update(parent_env.param_defaults)
     if flat_params and child_params is not None:
-        child_env[env_fmt.PARAMETERS] = child_params
+        new_env.params.update(child_params)
 
-    new_env.load(child_env)
     if not flat_params and child_params is not None:
         new_env.load(child_params)
 
@@ -11,6 +11,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo_config import cfg
+from oslo_serialization import jsonutils
 import six
 
 from heat.common import exception
@@ -38,17 +40,25 @@ class Event(object):
         self.physical_resource_id = physical_resource_id
         self.resource_name = resource_name
         self.resource_type = resource_type
-        try:
-            self.resource_properties = dict(resource_properties)
-        except ValueError as ex:
-            self.resource_properties = {'Error': six.text_type(ex)}
+        if resource_properties is None:
+            # not loaded, or not stored
+            self.resource_properties = None
+        else:
+            try:
+                self.resource_properties = dict(resource_properties)
+            except ValueError as ex:
+                self.resource_properties = {'Error': six.text_type(ex)}
         self.uuid = uuid
         self.timestamp = timestamp
         self.id = id
 
     @classmethod
-    def load(cls, context, event_id, event=None, stack=None):
-        '''Retrieve an Event from the database.'''
+    def load(cls, context, event_id, event=None, stack=None,
+             include_properties=True):
+        '''
+        Retrieve an Event from the database. Pass include_properties=False
+        for an event object that was retrieved without its properties.
+        '''
         from heat.engine import stack as parser
 
         ev = (event if event is not None else
@@ -60,11 +70,46 @@ class Event(object):
         st = (stack if stack is not None else
               parser.Stack.load(context, ev.stack_id))
 
+        props = ev.resource_properties if include_properties else None
         return cls(context, st, ev.resource_action, ev.resource_status,
                    ev.resource_status_reason, ev.physical_resource_id,
-                   ev.resource_properties, ev.resource_name,
+                   props, ev.resource_name,
                    ev.resource_type, ev.uuid, ev.created_at, ev.id)
 
+    TRUNCATED = '...'
+
+    def _truncated_properties(self):
+        '''
+        Return the resource properties as stored in the database, i.e. with
+        the values exceeding the configured size limits truncated.
+        '''
+        if not self.resource_properties:
+            return self.resource_properties
+
+        max_length = cfg.CONF.event_property_max_length
+        props = {}
+        sizes = {}
+        for key, value in six.iteritems(self.resource_properties):
+            encoded = jsonutils.dumps(value)
+            if max_length and len(encoded) > max_length:
+                if isinstance(value, six.string_types):
+                    value = value[:max_length] + self.TRUNCATED
+                else:
+                    value = encoded[:max_length] + self.TRUNCATED
+                encoded = jsonutils.dumps(value)
+            props[key] = value
+            sizes[key] = len(key) + len(encoded)
+
+        max_size = cfg.CONF.event_properties_max_size
+        if max_size:
+            total = sum(six.itervalues(sizes))
+            for key in sorted(sizes, key=sizes.get, reverse=True):
+                if total <= max_size:
+                    break
+                props[key] = self.TRUNCATED
+                total -= sizes[key] - len(key) - len(self.TRUNCATED) - 2
+        return props
+
     def store(self):
         '''Store the Event in the database.'''
         ev = {
@@ -75,7 +120,7 @@ class Event(object):
             'resource_status': self.status,
             'resource_status_reason': self.reason,
             'resource_type': self.resource_type,
-            'resource_properties': self.resource_properties,
+            'resource_properties': self._truncated_properties(),
         }
 
         if self.uuid is not None:
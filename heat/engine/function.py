@@ -73,6 +73,9 @@ class Function(object):
     def dep_attrs(self, resource_name):
         return dep_attrs(self.args, resource_name)
 
+    def dependency_names(self):
+        return dependency_names(self.args)
+
     def __reduce__(self):
         """
         Return a representation of the function suitable for pickling.
@@ -183,6 +186,31 @@ def dependencies(snippet, path=''):
         return []
 
 
+def dependency_names(snippet):
+    """
+    Return an iterator over the names of the resources referenced in a
+    template snippet.
+
+    Unlike dependencies(), the resources are not looked up in the stack, so
+    none of them is instantiated.
+    """
+
+    if isinstance(snippet, Function):
+        return snippet.dependency_names()
+
+    elif isinstance(snippet, collections.Mapping):
+        names = (dependency_names(value) for value in snippet.values())
+        return itertools.chain.from_iterable(names)
+
+    elif (not isinstance(snippet, six.string_types) and
+          isinstance(snippet, collections.Iterable)):
+        names = (dependency_names(value) for value in snippet)
+        return itertools.chain.from_iterable(names)
+
+    else:
+        return []
+
+
 def dep_attrs(snippet, resource_name):
     """
     Return an iterator over dependent attributes for specified resource_name
@@ -37,3 +37,17 @@ def send(stack):
 
     notification.notify(stack.context, event_type, level,
                         engine_api.format_notification_body(stack))
+
+
+def send_failed(context, db_stack, reason):
+    """
+    Send the usage notification for a stack that was marked FAILED directly
+    in the database, from its database record.
+    """
+    event_type = '%s.%s.%s' % ('stack',
+                               db_stack.action.lower(),
+                               'error')
+
+    notification.notify(context, event_type, notification.ERROR,
+                        engine_api.format_db_notification_body(
+                            db_stack, '%s_FAILED' % db_stack.action, reason))
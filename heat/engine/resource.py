@@ -123,6 +123,9 @@ class Resource(object):
     # Default name to use for calls to self.client()
     default_client_name = None
 
+    # Number of resource actions in progress in this process
+    _actions_in_progress = 0
+
     def __new__(cls, name, definition, stack):
         '''Create a new Resource of the appropriate class for its type.'''
 
@@ -176,6 +179,7 @@ class Resource(object):
         self._data = {}
         self._rsrc_metadata = None
         self._stored_properties_data = None
+        self._pending_state = None
         self.created_time = None
         self.updated_time = None
         self._rpc_client = None
@@ -298,6 +302,22 @@ class Resource(object):
                 {'requires': requires}
             )
 
+    @classmethod
+    def set_needed_by_all(cls, context, stack_id, needed_by):
+        '''Set needed_by of many resources of a stack, keyed by ID.'''
+        resource_objects.Resource.update_all_by_id(
+            context, stack_id,
+            dict((rsrc_id, {'needed_by': value})
+                 for rsrc_id, value in six.iteritems(needed_by)))
+
+    @classmethod
+    def set_requires_all(cls, context, stack_id, requires):
+        '''Set requires of many resources of a stack, keyed by ID.'''
+        resource_objects.Resource.update_all_by_id(
+            context, stack_id,
+            dict((rsrc_id, {'requires': value})
+                 for rsrc_id, value in six.iteritems(requires)))
+
     def _break_if_required(self, action, hook):
         '''Block the resource until the hook is cleared if there is one.'''
         if self.stack.env.registry.matches_hook(self.name, hook):
@@ -516,6 +536,7 @@ class Resource(object):
         Expected exceptions are re-raised, with the Resource left in the
         IN_PROGRESS state.
         '''
+        Resource._actions_in_progress += 1
         try:
             self.state_set(action, self.IN_PROGRESS)
             yield
@@ -537,6 +558,13 @@ class Resource(object):
                     LOG.exception(_LE('Error marking resource as failed'))
         else:
             self.state_set(action, self.COMPLETE)
+        finally:
+            Resource._actions_in_progress -= 1
+
+    @staticmethod
+    def actions_in_progress():
+        '''Return the number of resource actions running in this process.'''
+        return Resource._actions_in_progress
 
     def action_handler_task(self, action, args=[], action_prefix=None):
         '''
@@ -565,6 +593,25 @@ class Resource(object):
                 while not check(handler_data):
                     yield
 
+    @contextlib.contextmanager
+    def _coalesced_state_writes(self, coalesce=True):
+        '''Return a context manager to coalesce state writes to the database.
+
+        Within the context, state changes are only written to the database
+        when leaving it, with a single update for the latest state.
+        '''
+        if not coalesce or self._pending_state is not None:
+            yield
+            return
+
+        self._pending_state = {}
+        try:
+            yield
+        finally:
+            pending, self._pending_state = self._pending_state, None
+            if pending:
+                self._update_db(pending)
+
     @scheduler.wrappertask
     def _do_action(self, action, pre_func=None, resource_data=None):
         '''
@@ -583,12 +630,18 @@ class Resource(object):
         '''
         assert action in self.ACTIONS, 'Invalid action %s' % action
 
-        with self._action_recorder(action):
-            if callable(pre_func):
-                pre_func()
+        # Without a handler the action completes in the same scheduler step
+        # it starts in, so only the final state needs to be written
+        idle = not callable(getattr(self, 'handle_%s' % action.lower(), None))
+
+        with self._coalesced_state_writes(idle):
+            with self._action_recorder(action):
+                if callable(pre_func):
+                    pre_func()
 
-            handler_args = [resource_data] if resource_data is not None else []
-            yield self.action_handler_task(action, args=handler_args)
+                handler_args = ([resource_data] if resource_data is not None
+                                else [])
+                yield self.action_handler_task(action, args=handler_args)
 
     def _update_stored_properties(self):
         self._stored_properties_data = function.resolve(self.properties.data)
@@ -986,34 +1039,54 @@ class Resource(object):
         self.resource_id = inst
         if self.id is not None:
             try:
-                rs = resource_objects.Resource.get_obj(self.context, self.id)
-                rs.update_and_save({'nova_instance': self.resource_id})
+                resource_objects.Resource.update_by_id(
+                    self.context, self.id,
+                    {'nova_instance': self.resource_id})
             except Exception as ex:
                 LOG.warn(_LW('db error %s'), ex)
 
+    def _store_values(self, metadata=None):
+        return {'action': self.action,
+                'status': self.status,
+                'status_reason': self.status_reason,
+                'stack_id': self.stack.id,
+                'nova_instance': self.resource_id,
+                'name': self.name,
+                'rsrc_metadata': metadata,
+                'properties_data': self._stored_properties_data,
+                'needed_by': self.needed_by,
+                'requires': self.requires,
+                'replaces': self.replaces,
+                'replaced_by': self.replaced_by,
+                'current_template_id': self.current_template_id,
+                'stack_name': self.stack.name}
+
+    def _stored(self, new_rs, metadata=None):
+        self.id = new_rs.id
+        self.uuid = new_rs.uuid
+        self.created_time = new_rs.created_at
+        self._rsrc_metadata = metadata
+
     def _store(self, metadata=None):
         '''Create the resource in the database.'''
         try:
-            rs = {'action': self.action,
-                  'status': self.status,
-                  'status_reason': self.status_reason,
-                  'stack_id': self.stack.id,
-                  'nova_instance': self.resource_id,
-                  'name': self.name,
-                  'rsrc_metadata': metadata,
-                  'properties_data': self._stored_properties_data,
-                  'needed_by': self.needed_by,
-                  'requires': self.requires,
-                  'replaces': self.replaces,
-                  'replaced_by': self.replaced_by,
-                  'current_template_id': self.current_template_id,
-                  'stack_name': self.stack.name}
-
-            new_rs = resource_objects.Resource.create(self.context, rs)
-            self.id = new_rs.id
-            self.uuid = new_rs.uuid
-            self.created_time = new_rs.created_at
-            self._rsrc_metadata = metadata
+            new_rs = resource_objects.Resource.create(self.context,
+                                                      self._store_values(
+                                                          metadata))
+            self._stored(new_rs, metadata)
+        except Exception as ex:
+            LOG.error(_LE('DB error %s'), ex)
+
+    @classmethod
+    def store_all(cls, context, resources):
+        '''Create the given resources in the database in one transaction.'''
+        if not resources:
+            return
+        try:
+            new_rss = resource_objects.Resource.create_all(
+                context, [rsrc._store_values() for rsrc in resources])
+            for rsrc, new_rs in zip(resources, new_rss):
+                rsrc._stored(new_rs)
         except Exception as ex:
             LOG.error(_LE('DB error %s'), ex)
 
@@ -1052,18 +1125,26 @@ class Resource(object):
             metadata = self._rsrc_metadata
 
         if self.id is not None:
-            try:
-                rs = resource_objects.Resource.get_obj(self.context, self.id)
-                rs.update_and_save(data)
-            except Exception as ex:
-                LOG.error(_LE('DB error %s'), ex)
-            else:
+            if self._pending_state is not None:
+                self._pending_state.update(data)
+                self._rsrc_metadata = metadata
+            elif self._update_db(data):
                 self._rsrc_metadata = metadata
         else:
             # This should only happen in unit tests
             LOG.warning(_LW('Resource "%s" not pre-stored in DB'), self)
             self._store(metadata)
 
+    def _update_db(self, values):
+        '''Write values to the resource's row, without reading it first.'''
+        try:
+            resource_objects.Resource.update_by_id(self.context, self.id,
+                                                   values)
+        except Exception as ex:
+            LOG.error(_LE('DB error %s'), ex)
+            return False
+        return True
+
     def _resolve_attribute(self, name):
         """
         Default implementation; should be overridden by resources that expose
@@ -1106,7 +1187,7 @@ class Resource(object):
         if new_state != old_state:
             self._add_event(action, status, reason)
 
-        self.stack.reset_resource_attributes()
+        self.stack.reset_resource_attributes(self)
 
     @property
     def state(self):
@@ -175,6 +175,23 @@ class ResourceDefinitionCore(object):
                                strict_func_deps(self._metadata,
                                                 path(METADATA)))
 
+    def required_resource_names(self):
+        """
+        Return the names of the resources on which this one depends.
+
+        Unlike dependencies(), no Resource object is looked up.
+        """
+        return set(itertools.chain(self._depends,
+                                   function.dependency_names(self._properties),
+                                   function.dependency_names(self._metadata)))
+
+    def metadata_dependency_names(self):
+        """
+        Return the names of the resources referenced from the metadata of this
+        resource.
+        """
+        return set(function.dependency_names(self._metadata))
+
     def properties(self, schema, context=None):
         """
         Return a Properties object representing the resource properties.
@@ -13,8 +13,10 @@
 
 import collections
 import datetime
+import functools
 import os
 import socket
+import time
 import warnings
 
 import eventlet
@@ -34,16 +36,21 @@ from heat.common.i18n import _LE
 from heat.common.i18n import _LI
 from heat.common.i18n import _LW
 from heat.common import identifier
+from heat.common import lru
 from heat.common import messaging as rpc_messaging
+from heat.common import query_stats
 from heat.common import service_utils
 from heat.common import template_format
+from heat.db import api as db_api
 from heat.engine import api
 from heat.engine import attributes
 from heat.engine import clients
 from heat.engine import environment
 from heat.engine import event as evt
+from heat.engine.notification import stack as stack_notification
 from heat.engine import parameter_groups
 from heat.engine import properties
+from heat.engine import resource
 from heat.engine import resources
 from heat.engine import service_software_config
 from heat.engine import service_stack_watch
@@ -57,6 +64,7 @@ from heat.objects import resource as resource_objects
 from heat.objects import service as service_objects
 from heat.objects import snapshot as snapshot_object
 from heat.objects import stack as stack_object
+from heat.objects import stack_lock as stack_lock_object
 from heat.objects import watch_data
 from heat.objects import watch_rule
 from heat.openstack.common import service
@@ -70,9 +78,61 @@ cfg.CONF.import_opt('max_stacks_per_tenant', 'heat.common.config')
 cfg.CONF.import_opt('enable_stack_abandon', 'heat.common.config')
 cfg.CONF.import_opt('enable_stack_adopt', 'heat.common.config')
 cfg.CONF.import_opt('convergence_engine', 'heat.common.config')
+cfg.CONF.import_opt('max_active_stacks_per_engine', 'heat.common.config')
+cfg.CONF.import_opt('max_engine_stack_threads', 'heat.common.config')
+cfg.CONF.import_opt('stale_lock_recovery_batch_size', 'heat.common.config')
+cfg.CONF.import_opt('stale_lock_recovery_pool_size', 'heat.common.config')
+cfg.CONF.import_opt('signal_batch_window', 'heat.common.config')
+cfg.CONF.import_opt('enable_cloud_watch_lite', 'heat.common.config')
 
 LOG = logging.getLogger(__name__)
 
+# Maximum number of metadata access grants to stack users remembered, and
+# the time in seconds for which each of them is remembered
+METADATA_ACCESS_CACHE_SIZE = 10000
+METADATA_ACCESS_CACHE_TTL = 60
+
+
+class _Relock(object):
+    """
+    Track whether an acquired stack lock is still held by its thread, when
+    the thread lets go of it while queued for the thread budget.
+
+    The lock is only re-taken if the stack is in the state it was in when
+    the lock was released, i.e. no other operation, on this engine or on
+    another one, ran on the stack in the meantime.
+    """
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.held = True
+        self._state = None
+
+    def _stack_state(self):
+        # A new context, so that the row is not served from the identity
+        # map of a session which has it loaded already
+        s = stack_object.Stack.get_by_id(context.get_admin_context(),
+                                         self.lock.stack_id,
+                                         show_deleted=True,
+                                         tenant_safe=False)
+        if s is None:
+            return None
+        return s.action, s.status, s.updated_at, s.deleted_at
+
+    def release(self):
+        self._state = self._stack_state()
+        self.held = False
+        self.lock.release()
+
+    def acquire(self):
+        if self.lock.try_acquire() is not None:
+            return False
+        if self._stack_state() != self._state:
+            self.lock.release()
+            return False
+        self.held = True
+        return True
+
 
 class ThreadGroupManager(object):
 
@@ -80,6 +140,10 @@ class ThreadGroupManager(object):
         super(ThreadGroupManager, self).__init__()
         self.groups = {}
         self.events = collections.defaultdict(list)
+        self._thread_budget = None
+        self._thread_stats = collections.defaultdict(
+            lambda: {'active': 0, 'queued': 0, 'wait_time': 0.0})
+        self._thread_wait_time = 0.0
 
         # Create dummy service task, because when there is nothing queued
         # on self.tg the process exits
@@ -111,6 +175,58 @@ class ThreadGroupManager(object):
             profiler.init(**trace)
         return func(*args, **kwargs)
 
+    def _get_thread_budget(self):
+        if (self._thread_budget is None and
+                cfg.CONF.max_engine_stack_threads > 0):
+            self._thread_budget = eventlet.semaphore.Semaphore(
+                cfg.CONF.max_engine_stack_threads)
+        return self._thread_budget
+
+    def _run_operation(self, stack_id, budgeted, relock, func,
+                       *args, **kwargs):
+        """
+        Run a stack operation, waiting for a slot in the engine-wide thread
+        budget first if required, and account for it in the stack's stats.
+
+        The stack lock is not held while waiting for a slot, so that a
+        queued operation does not keep the stack locked. The relock object
+        releases the lock before the wait and re-takes it afterwards; if
+        another operation took the stack meanwhile, this one is dropped.
+        """
+        budget = self._get_thread_budget() if budgeted else None
+        stats = self._thread_stats[stack_id]
+
+        queued_at = time.time()
+        stats['queued'] += 1
+        try:
+            locked = True
+            if budget is not None and not budget.acquire(blocking=False):
+                relock.release()
+                budget.acquire()
+                locked = relock.acquire()
+        finally:
+            stats['queued'] -= 1
+        if not locked:
+            budget.release()
+            if not (stats['active'] or stats['queued']):
+                self._thread_stats.pop(stack_id, None)
+            LOG.warn(_LW('Stack %s was locked by another operation while '
+                         'this one was queued, dropping it'), stack_id)
+            return
+        waited = time.time() - queued_at
+        stats['wait_time'] += waited
+        self._thread_wait_time += waited
+
+        stats['active'] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats['active'] -= 1
+            if budget is not None:
+                budget.release()
+            if not (stats['active'] or stats['queued']):
+                self._thread_stats.pop(stack_id, None)
+
     def start(self, stack_id, func, *args, **kwargs):
         """
         Run the given method in a sub-thread.
@@ -157,13 +273,22 @@ class ThreadGroupManager(object):
         :param kwargs: Keyword-args to be passed to func
 
         """
+        relock = _Relock(lock)
+
         def release(gt):
             """
             Callback function that will be passed to GreenThread.link().
             """
-            lock.release()
-
-        th = self.start(stack.id, func, *args, **kwargs)
+            if relock.held:
+                lock.release()
+
+        # Only operations on stacks count towards the thread budget, other
+        # threads such as signal and alarm deliveries may be what the
+        # operations are waiting for. Nested stacks run on behalf of a parent
+        # stack thread that already holds a slot, so they don't wait either.
+        operation = functools.partial(self._run_operation, stack.id,
+                                      stack.owner_id is None, relock, func)
+        th = self.start(stack.id, operation, *args, **kwargs)
         th.link(release)
         return th
 
@@ -214,8 +339,37 @@ class ThreadGroupManager(object):
         for event in self.events.pop(stack_id, []):
             event.send(message)
 
+    def load_stats(self):
+        """
+        Return the stacks, threads and resource actions currently running on
+        this engine, with the stack operations running and queued and the
+        time they spent waiting for the budget.
+        """
+        active = [tg for tg in six.itervalues(self.groups) if tg.threads]
+        stacks = dict((stack_id, dict(stats))
+                      for stack_id, stats in six.iteritems(self._thread_stats))
+        return {'active_stacks': len(active),
+                'active_threads': sum(len(tg.threads) for tg in active),
+                'active_resource_actions':
+                    resource.Resource.actions_in_progress(),
+                'queued_threads': sum(s['queued']
+                                      for s in six.itervalues(stacks)),
+                'max_threads': cfg.CONF.max_engine_stack_threads,
+                'thread_wait_time': self._thread_wait_time,
+                'stacks': stacks}
+
 
 @profiler.trace_cls("rpc")
+class _MetadataRefresh(object):
+    """The state of the metadata refreshes of a stack in this engine."""
+
+    def __init__(self):
+        self.pending = set()
+        self.running = False
+        # sent once the pass refreshing the pending names is finished
+        self.flushed = eventlet.event.Event()
+
+
 class EngineListener(service.Service):
     '''
     Listen on an AMQP queue named for the engine.  Allows individual
@@ -224,9 +378,11 @@ class EngineListener(service.Service):
 
     ACTIONS = (STOP_STACK, SEND) = ('stop_stack', 'send')
 
-    def __init__(self, host, engine_id, thread_group_mgr):
+    def __init__(self, host, engine_id, thread_group_mgr,
+                 software_config=None):
         super(EngineListener, self).__init__()
         self.thread_group_mgr = thread_group_mgr
+        self.software_config = software_config
         self.engine_id = engine_id
         self.host = host
 
@@ -254,6 +410,11 @@ class EngineListener(service.Service):
         stack_id = stack_identity['stack_id']
         self.thread_group_mgr.send(stack_id, message)
 
+    def metadata_software_deployments_changed(self, ctxt, server_id):
+        '''Wake the requests waiting for the metadata of a server.'''
+        if self.software_config is not None:
+            self.software_config.metadata_changed(server_id)
+
 
 @profiler.trace_cls("rpc")
 class EngineService(service.Service):
@@ -267,7 +428,7 @@ class EngineService(service.Service):
     by the RPC caller.
     """
 
-    RPC_API_VERSION = '1.9'
+    RPC_API_VERSION = '1.13'
 
     def __init__(self, host, topic, manager=None):
         super(EngineService, self).__init__()
@@ -288,6 +449,12 @@ class EngineService(service.Service):
         self.service_id = None
         self.manage_thread_grp = None
         self._rpc_server = None
+        self.watch_data_store = None
+        self.watch_rule_index = watchrule.WatchRuleIndex()
+        self._metadata_refresh = {}
+        self._signal_queues = {}
+        self._metadata_access = lru.LRUCache(METADATA_ACCESS_CACHE_SIZE,
+                                             ttl=METADATA_ACCESS_CACHE_TTL)
         self.software_config = service_software_config.SoftwareConfigService()
 
         if cfg.CONF.instance_user:
@@ -305,27 +472,21 @@ class EngineService(service.Service):
 
     def create_periodic_tasks(self):
         LOG.debug("Starting periodic watch tasks pid=%s" % os.getpid())
-        # Note with multiple workers, the parent process hasn't called start()
-        # so we need to create a ThreadGroupManager here for the periodic tasks
         if self.thread_group_mgr is None:
             self.thread_group_mgr = ThreadGroupManager()
         self.stack_watch = service_stack_watch.StackWatch(
-            self.thread_group_mgr)
-
-        # Create a periodic_watcher_task per-stack
-        admin_context = context.get_admin_context()
-        stacks = stack_object.Stack.get_all(
-            admin_context,
-            tenant_safe=False,
-            show_hidden=True)
-        for s in stacks:
-            self.stack_watch.start_watch_task(s.id, admin_context)
+            self.thread_group_mgr, self.engine_id)
+
+        # A single periodic_watcher_task evaluates this engine's share of
+        # the rules of all stacks
+        self.stack_watch.start(context.get_admin_context())
 
     def start(self):
         self.engine_id = stack_lock.StackLock.generate_engine_id()
         self.thread_group_mgr = ThreadGroupManager()
         self.listener = EngineListener(self.host, self.engine_id,
-                                       self.thread_group_mgr)
+                                       self.thread_group_mgr,
+                                       self.software_config)
         LOG.debug("Starting listener for engine %s" % self.engine_id)
         self.listener.start()
 
@@ -355,6 +516,14 @@ class EngineService(service.Service):
         self.manage_thread_grp.add_timer(cfg.CONF.periodic_interval,
                                          self.service_manage_report)
         self.manage_thread_grp.add_thread(self.reset_stack_status)
+        if cfg.CONF.enable_cloud_watch_lite:
+            # Every engine evaluates the watch rules of its own shard
+            self.create_periodic_tasks()
+        if cfg.CONF.watch_data_flush_interval > 0:
+            self.watch_data_store = watchrule.WatchDataStore()
+            self.manage_thread_grp.add_timer(
+                cfg.CONF.watch_data_flush_interval,
+                self._flush_watch_data)
 
         super(EngineService, self).start()
 
@@ -388,7 +557,12 @@ class EngineService(service.Service):
             self.thread_group_mgr.stop(stack_id, True)
             LOG.info(_LI("Stack %s processing was finished"), stack_id)
 
+        if self.stack_watch:
+            self.stack_watch.stop()
         self.manage_thread_grp.stop()
+        # Finish pushing the software deployment metadata
+        self.software_config.stop(graceful=True)
+        self._flush_watch_data()
         ctxt = context.get_admin_context()
         service_objects.Service.delete(ctxt, self.service_id)
         LOG.info(_LI('Service %s is deleted'), self.service_id)
@@ -423,14 +597,50 @@ class EngineService(service.Service):
         else:
             raise exception.StackNotFound(stack_name=stack_name)
 
-    def _get_stack(self, cnxt, stack_identity, show_deleted=False):
+    def _check_engine_load(self):
+        limit = cfg.CONF.max_active_stacks_per_engine
+        if not limit:
+            return
+
+        active = self.thread_group_mgr.load_stats()['active_stacks']
+        if active >= limit:
+            preferred_host = self._preferred_engine_host(limit)
+            LOG.warn(_LW('Engine %(engine)s rejected a request while running '
+                         '%(active)d stacks, preferred host: %(host)s'),
+                     {'engine': self.engine_id, 'active': active,
+                      'host': preferred_host})
+            raise exception.EngineOverloaded(engine_id=self.engine_id,
+                                             active=active,
+                                             preferred_host=preferred_host)
+
+    def _preferred_engine_host(self, limit):
+        '''
+        Return the host of the least loaded other engine still below the
+        limit, according to the load last reported in the service table, or
+        None if there is no such engine.
+        '''
+        cnxt = context.get_admin_context()
+        candidates = []
+        for srv in service_objects.Service.get_all(cnxt):
+            srv = service_utils.format_service(srv)
+            stats = srv[service_utils.SERVICE_LOAD_STATS] or {}
+            active = stats.get('active_stacks')
+            if (srv[service_utils.SERVICE_ENGINE_ID] == self.engine_id or
+                    srv[service_utils.SERVICE_STATUS] != 'up' or
+                    active is None or active >= limit):
+                continue
+            candidates.append((active, srv[service_utils.SERVICE_HOST]))
+        return min(candidates)[1] if candidates else None
+
+    def _get_stack(self, cnxt, stack_identity, show_deleted=False,
+                   eager_load=True):
         identity = identifier.HeatIdentifier(**stack_identity)
 
         s = stack_object.Stack.get_by_id(
             cnxt,
             identity.stack_id,
             show_deleted=show_deleted,
-            eager_load=True)
+            eager_load=eager_load)
 
         if s is None:
             raise exception.StackNotFound(stack_name=identity.stack_name)
@@ -671,6 +881,10 @@ class EngineService(service.Service):
         """
         LOG.info(_LI('Creating stack %s'), stack_name)
 
+        # Nested stacks are part of an action already admitted on the parent
+        if owner_id is None:
+            self._check_engine_load()
+
         def _create_stack_user(stack):
             if not stack.stack_user_project_id:
                 try:
@@ -687,12 +901,8 @@ class EngineService(service.Service):
             elif stack.status != stack.FAILED:
                 stack.create()
 
-            if (stack.action in (stack.CREATE, stack.ADOPT)
-                    and stack.status == stack.COMPLETE):
-                if self.stack_watch:
-                    # Schedule a periodic watcher task for this stack
-                    self.stack_watch.start_watch_task(stack.id, cnxt)
-            else:
+            if (stack.action not in (stack.CREATE, stack.ADOPT)
+                    or stack.status != stack.COMPLETE):
                 LOG.info(_LI("Stack create failed, status %s"), stack.status)
 
         convergence = cfg.CONF.convergence_engine
@@ -735,6 +945,9 @@ class EngineService(service.Service):
         db_stack = self._get_stack(cnxt, stack_identity)
         LOG.info(_LI('Updating stack %s'), db_stack.name)
 
+        if db_stack.owner_id is None:
+            self._check_engine_load()
+
         current_stack = parser.Stack.load(cnxt, stack=db_stack)
 
         if current_stack.action == current_stack.SUSPEND:
@@ -1070,7 +1283,8 @@ class EngineService(service.Service):
 
     @context.request_context
     def list_events(self, cnxt, stack_identity, filters=None, limit=None,
-                    marker=None, sort_keys=None, sort_dir=None):
+                    marker=None, sort_keys=None, sort_dir=None,
+                    include_properties=True):
         """
         The list_events method lists all events associated with a given stack.
         It supports pagination (``limit`` and ``marker``),
@@ -1084,6 +1298,8 @@ class EngineService(service.Service):
         :param marker: the ID of the last event in the previous page
         :param sort_keys: an array of fields used to sort the list
         :param sort_dir: the direction of the sort ('asc' or 'desc').
+        :param include_properties: whether to return the resource properties
+                                   stored in the events.
         """
 
         if stack_identity is not None:
@@ -1096,14 +1312,16 @@ class EngineService(service.Service):
                 marker=marker,
                 sort_keys=sort_keys,
                 sort_dir=sort_dir,
-                filters=filters)
+                filters=filters,
+                include_properties=include_properties)
         else:
             events = event_object.Event.get_all_by_tenant(
                 cnxt, limit=limit,
                 marker=marker,
                 sort_keys=sort_keys,
                 sort_dir=sort_dir,
-                filters=filters)
+                filters=filters,
+                include_properties=include_properties)
 
         stacks = {}
 
@@ -1114,7 +1332,9 @@ class EngineService(service.Service):
 
         return [api.format_event(evt.Event.load(cnxt,
                                                 e.id, e,
-                                                get_stack(e.stack_id)))
+                                                get_stack(e.stack_id),
+                                                include_properties),
+                                 include_properties)
                 for e in events]
 
     def _authorize_stack_user(self, cnxt, stack, resource_name):
@@ -1128,16 +1348,47 @@ class EngineService(service.Service):
             return True
 
         # fall back to looking for EC2 credentials in the context
+        access_key = self._ec2_access_key(cnxt)
+        if access_key is None:
+            return False
+
+        return stack.access_allowed(access_key, resource_name)
+
+    @staticmethod
+    def _ec2_access_key(cnxt):
         try:
             ec2_creds = jsonutils.loads(cnxt.aws_creds).get('ec2Credentials')
         except (TypeError, AttributeError):
             ec2_creds = None
 
         if not ec2_creds:
+            return None
+
+        return ec2_creds.get('access')
+
+    def _metadata_access_allowed(self, cnxt, s, resource_name):
+        '''
+        Check the access of a stack user to a resource's metadata, loading
+        the stack only the first time each user reads a given resource.
+
+        Only granted access is remembered, since access is only ever granted
+        to a resource of the stack once it has created the user's
+        credentials. Access is only revoked by updating or deleting the
+        stack, so a grant of a user to a resource is remembered for a short
+        time, and only for as long as the update time and the state of the
+        stack are unchanged.
+        '''
+        key = (cnxt.user_id, self._ec2_access_key(cnxt), s.id, resource_name)
+        stack_state = (s.updated_at, s.action, s.status)
+        if self._metadata_access.get(key) == stack_state:
+            return True
+
+        stack = parser.Stack.load(cnxt, stack=s)
+        if not self._authorize_stack_user(cnxt, stack, resource_name):
             return False
 
-        access_key = ec2_creds.get('access')
-        return stack.access_allowed(access_key, resource_name)
+        self._metadata_access.set(key, stack_state)
+        return True
 
     def _verify_stack_resource(self, stack, resource_name):
         if resource_name not in stack:
@@ -1166,6 +1417,43 @@ class EngineService(service.Service):
         return api.format_stack_resource(stack[resource_name],
                                          with_attr=with_attr)
 
+    @context.request_context
+    def describe_resource_metadata(self, cnxt, stack_identity, resource_name,
+                                   etag=None):
+        """
+        Return the metadata of a resource along with its entity tag.
+
+        The metadata is read from the resource's database record, so that
+        polling it does not require loading the stack.
+
+        :param cnxt: RPC context.
+        :param stack_identity: Name of the stack.
+        :param resource_name: the Resource.
+        :param etag: the entity tag of the metadata known to the caller, if
+                     it is still current the metadata is omitted.
+        """
+        s = self._get_stack(cnxt, stack_identity, eager_load=False)
+
+        if cfg.CONF.heat_stack_user_role in cnxt.roles:
+            if not self._metadata_access_allowed(cnxt, s, resource_name):
+                LOG.warn(_LW("Access denied to resource %s"), resource_name)
+                raise exception.Forbidden()
+
+        rs = resource_objects.Resource.get_metadata_by_name_and_stack(
+            cnxt, resource_name, s.id)
+        if rs is not None:
+            metadata = rs.rsrc_metadata
+        else:
+            # The resource has not been stored yet, its metadata is the one
+            # in the template
+            stack = parser.Stack.load(cnxt, stack=s)
+            if resource_name not in stack:
+                raise exception.ResourceNotFound(resource_name=resource_name,
+                                                 stack_name=stack.name)
+            metadata = stack[resource_name].metadata_get()
+
+        return api.format_resource_metadata(metadata, etag)
+
     @context.request_context
     def resource_signal(self, cnxt, stack_identity, resource_name, details,
                         sync_call=False):
@@ -1175,21 +1463,19 @@ class EngineService(service.Service):
                           implementation.
         '''
 
-        def _resource_signal(stack, rsrc, details):
-            LOG.debug("signaling resource %s:%s" % (stack.name, rsrc.name))
-            rsrc.signal(details)
-
-            # Refresh the metadata for all other resources, since signals can
-            # update metadata which is used by other resources, e.g
-            # when signalling a WaitConditionHandle resource, and other
-            # resources may refer to WaitCondition Fn::GetAtt Data
-            for r in stack.dependencies:
-                if (r.name != rsrc.name and r.id is not None and
-                        r.action != r.INIT):
-                    r.metadata_update()
-
         s = self._get_stack(cnxt, stack_identity)
 
+        if not sync_call:
+            # Signals are queued and delivered in batches to a stack loaded
+            # once per batch, so only check the database record here.
+            if resource_objects.Resource.get_by_name_and_stack(
+                    cnxt, resource_name, s.id) is None:
+                stack = parser.Stack.load(cnxt, stack=s,
+                                          use_stored_context=True)
+                self._verify_stack_resource(stack, resource_name)
+            self._queue_signal(cnxt, s.id, resource_name, details)
+            return
+
         # This is not "nice" converting to the stored context here,
         # but this happens because the keystone user associated with the
         # signal doesn't have permission to read the secret key of
@@ -1199,12 +1485,110 @@ class EngineService(service.Service):
 
         rsrc = stack[resource_name]
         if callable(rsrc.signal):
-            if sync_call:
-                _resource_signal(stack, rsrc, details)
-                return rsrc.metadata_get()
+            LOG.debug("signaling resource %s:%s" % (stack.name, rsrc.name))
+            rsrc.signal(details)
+
+            # Refresh the metadata of the resources referring to this one,
+            # since signals can update metadata which is used by other
+            # resources, e.g when signalling a WaitConditionHandle resource,
+            # and other resources may refer to WaitCondition Fn::GetAtt Data
+            self._refresh_metadata(stack, [rsrc.name])
+            return rsrc.metadata_get()
+
+    def _queue_signal(self, cnxt, stack_id, resource_name, details):
+        """
+        Queue a signal for a resource, starting a thread to deliver the
+        signals queued for the stack if there is not one already.
+        """
+        queue = self._signal_queues.get(stack_id)
+        if queue is None:
+            queue = collections.deque()
+            self._signal_queues[stack_id] = queue
+            th = self.thread_group_mgr.start(stack_id, self._process_signals,
+                                             cnxt, stack_id, queue)
+            # Linked rather than cleaned up by the thread itself, so that the
+            # queue is also dropped if the thread is killed before it starts
+            th.link(self._signals_done, stack_id, queue)
+        queue.append((resource_name, details))
+
+    def _process_signals(self, cnxt, stack_id, queue):
+        """
+        Deliver the signals queued for a stack.
+
+        Signals arriving within signal_batch_window seconds of each other
+        are delivered in order to the resources of a single loaded stack.
+        A signal queued while nothing else is pending is delivered without
+        waiting. The thread exits once the queue is empty.
+        """
+        while True:
+            # A lone signal is delivered straight away, only wait for more
+            # to arrive when there is already a burst to batch up
+            if len(queue) > 1:
+                eventlet.sleep(cfg.CONF.signal_batch_window)
+
+            # This is not "nice" converting to the stored context here,
+            # but this happens because the keystone user associated with
+            # the signal doesn't have permission to read the secret key
+            # of the user associated with the cfn-credentials file. The
+            # signals are thus delivered with the stored context of the
+            # stack whichever caller queued them, exactly as for a
+            # synchronous signal, and cnxt (the context of the first
+            # caller) is only used to read the stack record. Every caller
+            # has already been checked against the stack by
+            # resource_signal() before its signal was queued.
+            stack = parser.Stack.load(cnxt, stack_id=stack_id,
+                                      use_stored_context=True)
+            batch = [queue.popleft() for i in range(len(queue))]
+            self._signal_batch(stack, batch)
+            if not queue:
+                break
+
+    def _signals_done(self, gt, stack_id, queue):
+        """
+        Forget the signal queue of a stack once the thread delivering it has
+        exited, discarding any signals it did not deliver.
+        """
+        if queue:
+            LOG.warn(_LW("Discarding %(count)d signals queued for stack "
+                         "%(stack)s"), {'count': len(queue),
+                                        'stack': stack_id})
+        if self._signal_queues.get(stack_id) is queue:
+            del self._signal_queues[stack_id]
+
+    def _signal_batch(self, stack, signals):
+        """
+        Deliver a list of (resource_name, details) signals in order to the
+        resources of a stack, then refresh the metadata referring to them.
+        """
+        signalled = []
+        for resource_name, details in signals:
+            if resource_name not in stack:
+                LOG.warn(_LW("Resource %(resource)s not found in stack "
+                             "%(stack)s, discarding signal"),
+                         {'resource': resource_name, 'stack': stack.name})
+                continue
+
+            rsrc = stack[resource_name]
+            if not callable(rsrc.signal):
+                continue
+
+            LOG.debug("signaling resource %s:%s" % (stack.name, rsrc.name))
+            try:
+                rsrc.signal(details)
+            except Exception:
+                LOG.exception(_LE("Failed to signal resource %(resource)s "
+                                  "in stack %(stack)s"),
+                              {'resource': resource_name,
+                               'stack': stack.name})
             else:
-                self.thread_group_mgr.start(stack.id, _resource_signal,
-                                            stack, rsrc, details)
+                signalled.append(resource_name)
+
+        # Refresh the metadata of the resources referring to the signalled
+        # ones, since signals can update metadata which is used by other
+        # resources, e.g when signalling a WaitConditionHandle resource,
+        # and other resources may refer to WaitCondition Fn::GetAtt Data
+        if signalled:
+            self._refresh_metadata(stack, signalled)
 
     @context.request_context
     def find_physical_resource(self, cnxt, physical_resource_id):
@@ -1394,16 +1778,58 @@ class EngineService(service.Service):
         refresh_stack = parser.Stack.load(cnxt, stack=s,
                                           use_stored_context=True)
 
-        # Refresh the metadata for all other resources, since we expect
-        # resource_name to be a WaitCondition resource, and other
+        # Refresh the metadata of the resources referring to this one, since
+        # we expect resource_name to be a WaitCondition resource, and other
         # resources may refer to WaitCondition Fn::GetAtt Data, which
         # is updated here.
-        for res in refresh_stack.dependencies:
-            if res.name != resource_name and res.id is not None:
-                res.metadata_update()
+        self._refresh_metadata(refresh_stack, [resource_name])
 
         return resource.metadata_get()
 
+    def _refresh_metadata(self, stack, resource_names):
+        """
+        Refresh the metadata of the resources in a stack which refer to the
+        given resources, or to resources depending on them.
+
+        Refreshes requested for a stack while one is already running in
+        this engine are coalesced into a single further pass, made by the
+        thread already refreshing it on a freshly loaded stack. Their callers
+        wait for that pass to finish. The names of a pass that fails are kept
+        to be refreshed by the next refresh of the stack.
+        """
+        refresh = self._metadata_refresh.get(stack.id)
+        if refresh is None:
+            refresh = self._metadata_refresh[stack.id] = _MetadataRefresh()
+        refresh.pending.update(resource_names)
+        if refresh.running:
+            refresh.flushed.wait()
+            return
+
+        refresh.running = True
+        try:
+            while refresh.pending:
+                names, flushed = refresh.pending, refresh.flushed
+                refresh.pending = set()
+                refresh.flushed = eventlet.event.Event()
+                try:
+                    for res in stack.metadata_dependents(names):
+                        res.metadata_update()
+                except Exception as ex:
+                    refresh.pending.update(names)
+                    flushed.send(exc=ex)
+                    # names coalesced meanwhile are left for later as well
+                    refresh.flushed.send(exc=ex)
+                    refresh.flushed = eventlet.event.Event()
+                    raise
+                flushed.send()
+                if refresh.pending:
+                    stack = parser.Stack.load(stack.context,
+                                              stack_id=stack.id)
+        finally:
+            refresh.running = False
+            if not refresh.pending:
+                del self._metadata_refresh[stack.id]
+
     @context.request_context
     def create_watch_data(self, cnxt, watch_name, stats_data):
         '''
@@ -1414,13 +1840,12 @@ class EngineService(service.Service):
             if watch_name:
                 yield watchrule.WatchRule.load(cnxt, watch_name)
             else:
-                for wr in watch_rule.WatchRule.get_all(cnxt):
-                    if watchrule.rule_can_use_sample(wr, stats_data):
-                        yield watchrule.WatchRule.load(cnxt, watch=wr)
+                for wr in self.watch_rule_index.match(cnxt, stats_data):
+                    yield watchrule.WatchRule.load(cnxt, watch=wr)
 
         rule_run = False
         for rule in get_matching_watches():
-            rule.create_watch_data(stats_data)
+            rule.create_watch_data(stats_data, store=self.watch_data_store)
             rule_run = True
 
         if not rule_run:
@@ -1430,6 +1855,10 @@ class EngineService(service.Service):
 
         return stats_data
 
+    def _flush_watch_data(self):
+        if self.watch_data_store is not None:
+            self.watch_data_store.flush(context.get_admin_context())
+
     @context.request_context
     def show_watch(self, cnxt, watch_name):
         """
@@ -1532,6 +1961,12 @@ class EngineService(service.Service):
         return self.software_config.metadata_software_deployments(
             cnxt, server_id)
 
+    @context.request_context
+    def poll_metadata_software_deployments(self, cnxt, server_id, etag=None,
+                                           timeout=0):
+        return self.software_config.poll_metadata_software_deployments(
+            cnxt, server_id, etag=etag, timeout=timeout)
+
     @context.request_context
     def show_software_deployment(self, cnxt, deployment_id):
         return self.software_config.show_software_deployment(
@@ -1550,6 +1985,18 @@ class EngineService(service.Service):
             status_reason=status_reason,
             stack_user_project_id=stack_user_project_id)
 
+    @context.request_context
+    def create_software_deployments(self, cnxt, config_id, deployments,
+                                    action, status, status_reason,
+                                    stack_user_project_id):
+        return self.software_config.create_software_deployments(
+            cnxt, config_id=config_id,
+            deployments=deployments,
+            action=action,
+            status=status,
+            status_reason=status_reason,
+            stack_user_project_id=stack_user_project_id)
+
     @context.request_context
     def signal_software_deployment(self, cnxt, deployment_id, details,
                                    updated_at):
@@ -1585,6 +2032,13 @@ class EngineService(service.Service):
                   for srv in service_objects.Service.get_all(cnxt)]
         return result
 
+    def _load_stats(self):
+        stats = self.thread_group_mgr.load_stats()
+        stats['db_pool_checkedout'] = db_api.db_pool_checkedout()
+        if cfg.CONF.db_query_stats:
+            stats['db_queries'] = query_stats.counters()
+        return stats
+
     def service_manage_report(self):
         cnxt = context.get_admin_context()
 
@@ -1593,7 +2047,7 @@ class EngineService(service.Service):
             service_objects.Service.update_by_id(
                 cnxt,
                 self.service_id,
-                dict(deleted_at=None))
+                dict(deleted_at=None, load_stats=self._load_stats()))
             LOG.info(_LI('Service %s is updated'), self.service_id)
         else:
             service_ref = service_objects.Service.create(
@@ -1603,7 +2057,8 @@ class EngineService(service.Service):
                      binary=self.binary,
                      engine_id=self.engine_id,
                      topic=self.topic,
-                     report_interval=cfg.CONF.periodic_interval)
+                     report_interval=cfg.CONF.periodic_interval,
+                     load_stats=self._load_stats())
             )
             self.service_id = service_ref['id']
             LOG.info(_LI('Service %s is started'), self.service_id)
@@ -1626,8 +2081,84 @@ class EngineService(service.Service):
                 LOG.info(_LI('Service %s was aborted'), service_ref['id'])
                 service_objects.Service.delete(cnxt, service_ref['id'])
 
+    def _fail_stale_stacks(self, cnxt, stack_ids):
+        """
+        Mark FAILED the stacks of a batch that were left IN_PROGRESS.
+
+        The status of the whole batch is changed with one conditional UPDATE
+        per stack action, and the notifications and events are then sent from
+        the updated rows, so that no stack needs to be loaded.
+        """
+        reasons = dict((action,
+                        six.text_type('Engine went down during stack %s' %
+                                      action))
+                       for action in parser.Stack.ACTIONS)
+        failed = []
+        try:
+            failed = stack_object.Stack.status_set_all(
+                cnxt, stack_ids, parser.Stack.IN_PROGRESS,
+                parser.Stack.FAILED, reasons)
+            for db_stack in failed:
+                reason = reasons[db_stack.action]
+                try:
+                    stack_notification.send_failed(cnxt, db_stack, reason)
+                    event_object.Event.create(cnxt, {
+                        'resource_name': db_stack.name,
+                        'physical_resource_id': db_stack.id,
+                        'stack_id': db_stack.id,
+                        'resource_action': db_stack.action,
+                        'resource_status': parser.Stack.FAILED,
+                        'resource_status_reason': reason,
+                        'resource_type': 'OS::Heat::Stack',
+                        'resource_properties': {}})
+                except Exception:
+                    LOG.exception(_LE('Failed to report stack %s as '
+                                      'FAILED'), db_stack.id)
+        finally:
+            stack_lock_object.StackLock.release_all(stack_ids,
+                                                    self.engine_id)
+        LOG.info(_LI('Engine %(engine)s marked %(count)d stacks as FAILED '
+                     'after taking over their stale locks'),
+                 {'engine': self.engine_id, 'count': len(failed)})
+
+    def _recover_stale_locks(self, cnxt):
+        """
+        Recover in bulk the stacks locked by engines known to be dead.
+
+        Engines whose service heartbeat has expired are found with one pass
+        over the lock table, all of their locks are taken over at once, and
+        the stacks they left IN_PROGRESS are marked FAILED in batches on a
+        bounded pool of green threads. Locks held by engines without a
+        service record are left to the per-stack path.
+        """
+        dead_engines = [
+            engine_id
+            for engine_id in stack_lock_object.StackLock.get_engine_ids()
+            if (engine_id != self.engine_id and
+                stack_lock.StackLock.engine_heartbeat_alive(
+                    cnxt, engine_id) is False)]
+        if not dead_engines:
+            return
+
+        stack_ids = stack_lock_object.StackLock.steal_all(dead_engines,
+                                                          self.engine_id)
+        LOG.info(_LI('Engine %(engine)s took over %(count)d stack locks '
+                     'from dead engines %(dead)s'),
+                 {'engine': self.engine_id, 'count': len(stack_ids),
+                  'dead': ', '.join(dead_engines)})
+
+        batch_size = max(cfg.CONF.stale_lock_recovery_batch_size, 1)
+        pool = eventlet.GreenPool(
+            max(cfg.CONF.stale_lock_recovery_pool_size, 1))
+        for i in six.moves.range(0, len(stack_ids), batch_size):
+            pool.spawn_n(self._fail_stale_stacks, cnxt,
+                         stack_ids[i:i + batch_size])
+        pool.waitall()
+
     def reset_stack_status(self):
         cnxt = context.get_admin_context()
+        self._recover_stale_locks(cnxt)
+
         filters = {'status': parser.Stack.IN_PROGRESS}
         stacks = stack_object.Stack.get_all(cnxt,
                                             filters=filters,
@@ -11,6 +11,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import time
+
+import eventlet
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import timeutils
@@ -20,6 +25,9 @@ from six.moves.urllib import parse as urlparse
 
 from heat.common.i18n import _
 from heat.common.i18n import _LI
+from heat.common.i18n import _LW
+from heat.common import messaging as rpc_messaging
+from heat.common import timeutils as heat_timeutils
 from heat.engine import api
 from heat.objects import resource as resource_object
 from heat.objects import software_config as software_config_object
@@ -29,9 +37,53 @@ from heat.rpc import api as rpc_api
 
 LOG = logging.getLogger(__name__)
 
+cfg.CONF.import_opt('software_deployment_poll_timeout', 'heat.common.config')
+cfg.CONF.import_opt('max_software_deployment_pollers', 'heat.common.config')
+cfg.CONF.import_opt('software_deployment_push_workers', 'heat.common.config')
+cfg.CONF.import_opt('software_deployment_push_retries', 'heat.common.config')
+
+
+class MetadataVersion(object):
+    '''
+    A counter of the changes to the deployment metadata of a server, which
+    requests polling for a change can wait on.
+    '''
+
+    def __init__(self):
+        self.version = 0
+        self.pollers = 0
+        self._changed = eventlet.event.Event()
+
+    def changed(self):
+        self.version += 1
+        self._changed.send()
+        self._changed = eventlet.event.Event()
+
+    def wait(self, version, timeout):
+        '''
+        Wait until the counter moves past the given version, or the timeout
+        expires.
+        '''
+        if self.version == version:
+            with eventlet.Timeout(timeout, False):
+                self._changed.wait()
+
 
 class SoftwareConfigService(service.Service):
 
+    def __init__(self):
+        super(SoftwareConfigService, self).__init__()
+        # Counters are only kept for the servers being polled
+        self._metadata_versions = {}
+        self._pollers_waiting = 0
+        # The latest metadata to push to each URL, and the URLs waiting
+        # for a push worker in the order they were queued
+        self._metadata_pushes = {}
+        self._push_queue = collections.deque()
+        self._pushes_active = set()
+        self._push_workers = 0
+        self._http_session = None
+
     def show_software_config(self, cnxt, config_id):
         sc = software_config_object.SoftwareConfig.get_by_id(cnxt, config_id)
         return api.format_software_config(sc)
@@ -65,22 +117,108 @@ class SoftwareConfigService(service.Service):
             raise ValueError(_('server_id must be specified'))
         all_sd = software_deployment_object.SoftwareDeployment.get_all(
             cnxt, server_id)
+        return self._format_metadata(all_sd)
+
+    @staticmethod
+    def _format_metadata(all_sd):
         # sort the configs by config name, to give the list of metadata a
         # deterministic and controllable order.
         all_sd_s = sorted(all_sd, key=lambda sd: sd.config.name)
         result = [api.format_software_config(sd.config) for sd in all_sd_s]
         return result
 
-    def _push_metadata_software_deployments(self, cnxt, server_id):
+    def poll_metadata_software_deployments(self, cnxt, server_id, etag=None,
+                                           timeout=0):
+        '''
+        Return the deployment metadata of a server along with its entity
+        tag. If the tag matches the given etag, wait for up to timeout
+        seconds for the metadata to change before returning, and omit the
+        metadata if it still has not changed.
+        '''
+        timeout = min(timeout or 0, cfg.CONF.software_deployment_poll_timeout)
+        deadline = time.time() + timeout
+
+        mv = self._metadata_versions.setdefault(server_id, MetadataVersion())
+        mv.pollers += 1
+        try:
+            while True:
+                version = mv.version
+                result = api.format_resource_metadata(
+                    self.metadata_software_deployments(cnxt, server_id),
+                    etag)
+                remaining = deadline - time.time()
+                if (rpc_api.RES_METADATA in result or remaining <= 0 or
+                        self._pollers_waiting >=
+                        cfg.CONF.max_software_deployment_pollers):
+                    return result
+                self._pollers_waiting += 1
+                try:
+                    mv.wait(version, remaining)
+                finally:
+                    self._pollers_waiting -= 1
+        finally:
+            mv.pollers -= 1
+            if not mv.pollers:
+                del self._metadata_versions[server_id]
+
+    def metadata_changed(self, server_id):
+        '''Wake the requests waiting for the metadata of a server.'''
+        mv = self._metadata_versions.get(server_id)
+        if mv is not None:
+            mv.changed()
+
+    def _notify_metadata_changed(self, cnxt, server_id):
+        self.metadata_changed(server_id)
+        # Requests may be waiting on the other engines too
+        client = rpc_messaging.get_rpc_client(
+            version='1.0', topic=rpc_api.LISTENER_TOPIC)
+        client.prepare(fanout=True).cast(
+            cnxt, 'metadata_software_deployments_changed',
+            server_id=server_id)
+
+    def _push_metadata_software_deployments(self, cnxt, server_id,
+                                            deployments=None):
+        self._notify_metadata_changed(cnxt, server_id)
         rs = (resource_object.Resource.
               get_by_physical_resource_id(cnxt, server_id))
         if not rs:
             return
-        deployments = self.metadata_software_deployments(cnxt, server_id)
+        if deployments is None:
+            deployments = self.metadata_software_deployments(cnxt, server_id)
         md = rs.rsrc_metadata or {}
         md['deployments'] = deployments
         rs.update_and_save({'rsrc_metadata': md})
-
+        self._queue_resource_metadata_push(rs, md)
+
+    def _push_metadata_software_deployments_all(self, cnxt,
+                                                deployments_by_server):
+        '''
+        Push the deployment metadata of many servers.
+
+        The resources of all of the servers are looked up with one query, and
+        their metadata is written with one bulk update per stack.
+        '''
+        for server_id in deployments_by_server:
+            self._notify_metadata_changed(cnxt, server_id)
+        resources = (resource_object.Resource.
+                     get_all_by_physical_resource_ids(
+                         cnxt, list(deployments_by_server)))
+
+        metadata = {}
+        values_by_stack = collections.defaultdict(dict)
+        for server_id, rs in six.iteritems(resources):
+            md = rs.rsrc_metadata or {}
+            md['deployments'] = deployments_by_server[server_id]
+            metadata[server_id] = md
+            values_by_stack[rs.stack_id][rs.id] = {'rsrc_metadata': md}
+        for stack_id, values_by_id in six.iteritems(values_by_stack):
+            resource_object.Resource.update_all_by_id(cnxt, stack_id,
+                                                      values_by_id)
+
+        for server_id, rs in six.iteritems(resources):
+            self._queue_resource_metadata_push(rs, metadata[server_id])
+
+    def _queue_resource_metadata_push(self, rs, md):
         metadata_put_url = None
         for rd in rs.data:
             if rd.key == 'metadata_put_url':
@@ -88,7 +226,62 @@ class SoftwareConfigService(service.Service):
                 break
         if metadata_put_url:
             json_md = jsonutils.dumps(md)
-            requests.put(metadata_put_url, json_md)
+            self._queue_metadata_push(metadata_put_url, json_md)
+
+    def _queue_metadata_push(self, url, json_md):
+        '''
+        Push metadata to a URL from a worker thread.
+
+        Only the latest metadata queued for a URL is pushed, and a URL is
+        only pushed to by one worker at a time so that pushes can not
+        overtake each other.
+        '''
+        if url not in self._metadata_pushes and url not in self._pushes_active:
+            self._push_queue.append(url)
+        self._metadata_pushes[url] = json_md
+
+        if self._push_workers < max(cfg.CONF.software_deployment_push_workers,
+                                    1):
+            self._push_workers += 1
+            self.tg.add_thread(self._metadata_push_worker)
+
+    def _metadata_push_worker(self):
+        try:
+            while self._push_queue:
+                url = self._push_queue.popleft()
+                self._pushes_active.add(url)
+                try:
+                    while url in self._metadata_pushes:
+                        self._push_metadata(url,
+                                            self._metadata_pushes.pop(url))
+                finally:
+                    self._pushes_active.discard(url)
+        finally:
+            self._push_workers -= 1
+
+    def _session(self):
+        if self._http_session is None:
+            pool_size = max(cfg.CONF.software_deployment_push_workers, 1)
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+            self._http_session = requests.Session()
+            self._http_session.mount('http://', adapter)
+            self._http_session.mount('https://', adapter)
+        return self._http_session
+
+    def _push_metadata(self, url, json_md):
+        retries = max(cfg.CONF.software_deployment_push_retries, 0)
+        for attempt in six.moves.range(retries + 1):
+            if attempt:
+                eventlet.sleep(heat_timeutils.retry_backoff_delay(
+                    attempt, jitter_max=1.0))
+            try:
+                resp = self._session().put(url, json_md)
+                resp.raise_for_status()
+                return
+            except Exception as ex:
+                error = ex
+        LOG.warn(_LW('Failed to push deployment metadata to %(url)s: '
+                     '%(error)s'), {'url': url, 'error': error})
 
     def _refresh_software_deployment(self, cnxt, sd, deploy_signal_id):
         container, object_name = urlparse.urlparse(
@@ -164,6 +357,42 @@ class SoftwareConfigService(service.Service):
         self._push_metadata_software_deployments(cnxt, server_id)
         return api.format_software_deployment(sd)
 
+    def create_software_deployments(self, cnxt, config_id, deployments,
+                                    action, status, status_reason,
+                                    stack_user_project_id):
+        '''
+        Create a deployment of a config for each of many servers.
+
+        Each item of deployments holds the server_id and input_values of a
+        deployment. The deployments are created in one transaction, the
+        metadata of all of the servers is then read with one query and pushed
+        in bulk.
+        '''
+        for d in deployments:
+            if not d.get('server_id'):
+                raise ValueError(_('server_id must be specified'))
+
+        sds = software_deployment_object.SoftwareDeployment.create_all(cnxt, [{
+            'config_id': config_id,
+            'server_id': d['server_id'],
+            'input_values': d.get('input_values') or {},
+            'tenant': cnxt.tenant_id,
+            'stack_user_project_id': stack_user_project_id,
+            'action': action,
+            'status': status,
+            'status_reason': status_reason} for d in deployments])
+
+        server_ids = set(sd.server_id for sd in sds)
+        by_server = collections.defaultdict(list)
+        for sd in (software_deployment_object.SoftwareDeployment.
+                   get_all_by_servers(cnxt, server_ids)):
+            by_server[sd.server_id].append(sd)
+        self._push_metadata_software_deployments_all(
+            cnxt, dict((server_id, self._format_metadata(by_server[server_id]))
+                       for server_id in server_ids))
+
+        return [api.format_software_deployment(sd) for sd in sds]
+
     def signal_software_deployment(self, cnxt, deployment_id, details,
                                    updated_at):
 
@@ -11,86 +11,79 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
 import six
 
 from heat.common import context
 from heat.common.i18n import _LE
-from heat.common.i18n import _LW
-from heat.engine import stack
+from heat.engine import stack_lock
 from heat.engine import watchrule
-from heat.objects import stack as stack_object
+from heat.objects import service as service_object
 from heat.objects import watch_rule as watch_rule_object
-from heat.rpc import api as rpc_api
+from heat.openstack.common import threadgroup
 
 LOG = logging.getLogger(__name__)
 
 
 class StackWatch(object):
-    def __init__(self, thread_group_mgr):
-        self.thread_group_mgr = thread_group_mgr
-
-    def start_watch_task(self, stack_id, cnxt):
-
-        def stack_has_a_watchrule(sid):
-            wrs = watch_rule_object.WatchRule.get_all_by_stack(cnxt, sid)
-
-            now = timeutils.utcnow()
-            start_watch_thread = False
-            for wr in wrs:
-                # reset the last_evaluated so we don't fire off alarms when
-                # the engine has not been running.
-                watch_rule_object.WatchRule.update_by_id(
-                    cnxt, wr.id,
-                    {'last_evaluated': now})
-
-                if wr.state != rpc_api.WATCH_STATE_CEILOMETER_CONTROLLED:
-                    start_watch_thread = True
-
-            children = stack_object.Stack.get_all_by_owner_id(cnxt, sid)
-            for child in children:
-                if stack_has_a_watchrule(child.id):
-                    start_watch_thread = True
+    """
+    Evaluates the watch rules of all stacks from a single periodic task.
 
-            return start_watch_thread
+    Rules are sharded by id across the live heat-engine services, so each
+    rule is evaluated by one engine only. The stack owning a rule is only
+    loaded when one of its alarm actions has to be run.
+    """
 
-        if stack_has_a_watchrule(stack_id):
-            self.thread_group_mgr.add_timer(
-                stack_id,
-                self.periodic_watcher_task,
-                sid=stack_id)
-
-    def check_stack_watches(self, sid):
-        # Retrieve the stored credentials & create context
-        # Require tenant_safe=False to the stack_get to defeat tenant
-        # scoping otherwise we fail to retrieve the stack
-        LOG.debug("Periodic watcher task for stack %s" % sid)
-        admin_context = context.get_admin_context()
-        db_stack = stack_object.Stack.get_by_id(admin_context,
-                                                sid,
-                                                tenant_safe=False,
-                                                eager_load=True)
-        if not db_stack:
-            LOG.error(_LE("Unable to retrieve stack %s for periodic task"),
-                      sid)
-            return
-        stk = stack.Stack.load(admin_context, stack=db_stack,
-                               use_stored_context=True)
-
-        # recurse into any nested stacks.
-        children = stack_object.Stack.get_all_by_owner_id(admin_context, sid)
-        for child in children:
-            self.check_stack_watches(child.id)
-
-        # Get all watchrules for this stack and evaluate them
-        try:
-            wrs = watch_rule_object.WatchRule.get_all_by_stack(admin_context,
-                                                               sid)
-        except Exception as ex:
-            LOG.warn(_LW('periodic_task db error watch rule removed? %(ex)s'),
-                     ex)
-            return
+    def __init__(self, thread_group_mgr, engine_id):
+        self.thread_group_mgr = thread_group_mgr
+        self.engine_id = engine_id
+        self.tg = None
+
+    def start(self, cnxt):
+        # reset the last_evaluated of the rules in this engine's shard so we
+        # don't fire off alarms when the engine has not been running.
+        shard_count, shard_index = self._get_shard(cnxt)
+        now = timeutils.utcnow()
+        evaluation_times = {}
+        for wr in watch_rule_object.WatchRule.get_all_evaluable(
+                cnxt, shard_count=shard_count, shard_index=shard_index,
+                due_only=False):
+            rule = watchrule.WatchRule.load(cnxt, watch=wr)
+            rule.last_evaluated = now
+            evaluation_times[rule.id] = rule.evaluation_times()
+        watch_rule_object.WatchRule.update_all_by_id(cnxt, evaluation_times)
+
+        self.tg = threadgroup.ThreadGroup()
+        self.tg.add_timer(cfg.CONF.periodic_interval,
+                          self.periodic_watcher_task,
+                          initial_delay=cfg.CONF.periodic_interval)
+
+    def stop(self):
+        if self.tg is not None:
+            self.tg.stop()
+            self.tg = None
+
+    def _get_shard(self, cnxt):
+        """
+        Return the number of shards and the index of this engine's shard.
+        """
+        engines = set([self.engine_id])
+        for srv in service_object.Service.get_all(cnxt):
+            if srv.engine_id and stack_lock.StackLock.service_alive(srv):
+                engines.add(srv.engine_id)
+        engines = sorted(engines)
+        return len(engines), engines.index(self.engine_id)
+
+    def check_watches(self, cnxt):
+        shard_count, shard_index = self._get_shard(cnxt)
+        wrs = watch_rule_object.WatchRule.get_all_evaluable(
+            cnxt, shard_count=shard_count, shard_index=shard_index)
+        LOG.debug("Periodic watcher task evaluating %(count)d watch rules "
+                  "(shard %(index)d of %(shards)d)" % {
+                      'count': len(wrs), 'index': shard_index,
+                      'shards': shard_count})
 
         def run_alarm_action(stk, actions, details):
             for action in actions:
@@ -99,16 +92,22 @@ class StackWatch(object):
                 res.metadata_update()
 
         for wr in wrs:
-            rule = watchrule.WatchRule.load(stk.context, watch=wr)
-            actions = rule.evaluate()
+            try:
+                rule = watchrule.WatchRule.load(cnxt, watch=wr,
+                                                use_stored_context=True)
+                actions = rule.evaluate()
+            except Exception:
+                LOG.exception(_LE('Failed to evaluate watch rule %s'),
+                              wr.name)
+                continue
             if actions:
-                self.thread_group_mgr.start(sid, run_alarm_action, stk,
-                                            actions, rule.get_details())
+                self.thread_group_mgr.start(rule.stack_id, run_alarm_action,
+                                            rule.load_stack(), actions,
+                                            rule.get_details())
 
-    def periodic_watcher_task(self, sid):
+    def periodic_watcher_task(self):
         """
-        Periodic task, created for each stack, triggers watch-rule
-        evaluation for all rules defined for the stack
-        sid = stack ID
+        Periodic task, triggers the evaluation of all the watch rules which
+        are due in this engine's shard
         """
-        self.check_stack_watches(sid)
+        self.check_watches(context.get_admin_context())
@@ -64,6 +64,87 @@ class ForcedCancel(BaseException):
         return "Operation cancelled"
 
 
+class _ResourceMap(collections.MutableMapping):
+    """A mapping of resource names to the Resources of a stack.
+
+    A Resource is only instantiated the first time it is looked up, so that
+    operations on a single resource of a large stack do not pay for the
+    creation of all the others, or for loading their rows. Iterating over
+    the values instantiates all of them, loading their rows in one query.
+    """
+
+    def __init__(self, stack, definitions):
+        self._stack = stack
+        self._definitions = dict(definitions)
+        self._resources = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._resources[name]
+        except KeyError:
+            pass
+
+        res = resource.Resource(name, self._definitions[name], self._stack)
+        self._resources[name] = res
+        if len(self._resources) == len(self._definitions):
+            # There is no need to continue storing the db resources
+            # after all the resources are created
+            self._stack._db_resources = None
+        return res
+
+    def __setitem__(self, name, res):
+        # The definition is only used to instantiate the Resource, which is
+        # already done here
+        self._definitions[name] = None
+        self._resources[name] = res
+
+    def __delitem__(self, name):
+        del self._definitions[name]
+        self._resources.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._definitions
+
+    def __iter__(self):
+        return iter(self._definitions)
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def loaded(self):
+        """Return the Resources that have been instantiated so far."""
+        return list(six.itervalues(self._resources))
+
+    def load_all(self):
+        """Instantiate all of the Resources that have not been yet."""
+        missing = [name for name in self._definitions
+                   if name not in self._resources]
+        if len(missing) > 1:
+            self._stack._load_db_resources()
+        for name in missing:
+            self[name]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def values(self):
+        self.load_all()
+        return [self._resources[name] for name in self._definitions]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def items(self):
+        self.load_all()
+        return [(name, self._resources[name]) for name in self._definitions]
+
+    def definitions(self):
+        """Return the ResourceDefinitions, without instantiating anything."""
+        return dict((name, (self._resources[name].t
+                            if name in self._resources else defn))
+                    for name, defn in six.iteritems(self._definitions))
+
+
 class Stack(collections.Mapping):
 
     ACTIONS = (
@@ -208,12 +289,8 @@ class Stack(collections.Mapping):
     @property
     def resources(self):
         if self._resources is None:
-            self._resources = dict((name, resource.Resource(name, data, self))
-                                   for (name, data) in
-                                   self.t.resource_definitions(self).items())
-            # There is no need to continue storing the db resources
-            # after resource creation
-            self._db_resources = None
+            self._resources = _ResourceMap(self,
+                                           self.t.resource_definitions(self))
         return self._resources
 
     def iter_resources(self, nested_depth=0):
@@ -235,16 +312,23 @@ class Stack(collections.Mapping):
             for nested_res in nested_stack.iter_resources(nested_depth - 1):
                 yield nested_res
 
+    def _load_db_resources(self):
+        if not self.id or self._db_resources is not None:
+            return
+        try:
+            self._db_resources = resource_objects.Resource.get_all_by_stack(
+                self.context, self.id)
+        except exception.NotFound:
+            pass
+
     def db_resource_get(self, name):
         if not self.id:
             return None
         if self._db_resources is None:
-            try:
-                _db_resources = resource_objects.Resource.get_all_by_stack(
-                    self.context, self.id)
-                self._db_resources = _db_resources
-            except exception.NotFound:
-                return None
+            # Only the rows of the resources instantiated together are
+            # loaded in bulk, see _ResourceMap.load_all()
+            return resource_objects.Resource.get_by_name_and_stack(
+                self.context, name, self.id)
         return self._db_resources.get(name)
 
     @property
@@ -508,6 +592,18 @@ class Stack(collections.Mapping):
         '''Get the resource with the specified name.'''
         return self.resources[key]
 
+    def itervalues(self):
+        return six.itervalues(self.resources)
+
+    def values(self):
+        return self.resources.values()
+
+    def iteritems(self):
+        return six.iteritems(self.resources)
+
+    def items(self):
+        return self.resources.items()
+
     def add_resource(self, resource):
         '''Insert the given resource into the stack.'''
         template = resource.stack.t
@@ -584,11 +680,13 @@ class Stack(collections.Mapping):
         resource with the specified resource_name.
         '''
         if not self.resources:
-            # this also triggers lazy-loading of resources
-            # so is required for register_access_allowed_handler
-            # to be called
             return False
 
+        if credential_id not in self._access_allowed_handlers:
+            # Resources call register_access_allowed_handler when they
+            # are instantiated, so ensure that all of them have been
+            self.resources.load_all()
+
         handler = self._access_allowed_handlers.get(credential_id)
         return handler and handler(resource_name)
 
@@ -937,16 +1035,13 @@ class Stack(collections.Mapping):
         LOG.info(_LI('convergence_dependencies: %s'),
                  self.convergence_dependencies)
 
-        # create sync_points for resources in DB
-        for rsrc_id, is_update in self.convergence_dependencies:
-            sync_point.create(self.context, rsrc_id,
-                              self.current_traversal, is_update,
-                              self.id)
-        # create sync_point entry for stack
-        sync_point.create(
-            self.context, self.id, self.current_traversal,
-            False if self.action in (self.DELETE, self.SUSPEND) else True,
-            self.id)
+        # create sync_points for resources in DB, plus the entry for stack
+        stack_is_update = self.action not in (self.DELETE, self.SUSPEND)
+        sync_point.create_all(
+            self.context,
+            list(self.convergence_dependencies) + [(self.id,
+                                                    stack_is_update)],
+            self.current_traversal, self.id)
 
         # Store list of edges
         self.current_deps = {
@@ -1000,20 +1095,26 @@ class Stack(collections.Mapping):
             needed_by = old_requirers | new_requirers
             res.needed_by = list(needed_by)
 
+        new_rsrcs = []
         for rsrc in reversed(self.dependencies):
             existing_rsrc_db = get_existing_rsrc_db(rsrc.name)
             if existing_rsrc_db is None:
-                update_needed_by(rsrc)
                 rsrc.current_template_id = self.t.id
-                rsrc._store()
+                new_rsrcs.append(rsrc)
                 rsrcs[rsrc.name] = rsrc
             else:
-                update_needed_by(existing_rsrc_db)
-                resource.Resource.set_needed_by(
-                    existing_rsrc_db, existing_rsrc_db.needed_by
-                )
                 rsrcs[existing_rsrc_db.name] = existing_rsrc_db
 
+        # Store all new resources first, so that every requirer has an ID,
+        # then write needed_by for all of them at once.
+        resource.Resource.store_all(self.context, new_rsrcs)
+        needed_by = {}
+        for res in six.itervalues(rsrcs):
+            update_needed_by(res)
+            needed_by[res.id] = res.needed_by
+        resource.Resource.set_needed_by_all(self.context, self.id,
+                                            needed_by)
+
     def _convergence_dependencies(self, existing_resources,
                                   curr_template_dep):
         dep = curr_template_dep.translate(lambda res: (res.id, True))
@@ -1041,20 +1142,8 @@ class Stack(collections.Mapping):
                 reqs = conv_deps.requires((rsrc_id, is_update))
                 requires[rsrc_id] = list({id for id, is_update in reqs})
 
-            try:
-                rsrcs_db = resource_objects.Resource.get_all_by_stack(
-                    self.context, self.id)
-            except exception.NotFound:
-                rsrcs_db = None
-            else:
-                rsrcs_db = {res.id: res for res_name, res in rsrcs_db.items()}
-
-            if rsrcs_db:
-                for id, db_rsrc in rsrcs_db.items():
-                    if id in requires:
-                        resource.Resource.set_requires(
-                            db_rsrc, requires[id]
-                        )
+            resource.Resource.set_requires_all(self.context, self.id,
+                                               requires)
 
     @scheduler.wrappertask
     def update_task(self, newstack, action=UPDATE, event=None):
@@ -1555,15 +1644,102 @@ class Stack(collections.Mapping):
                       DeprecationWarning)
         return function.resolve(snippet)
 
-    def reset_resource_attributes(self):
+    def reset_resource_attributes(self, changed=None):
+        '''
+        Discard the cached attribute values of resources in the stack.
+
+        If the Resource whose state changed is given and it is part of the
+        dependency graph, only its own attributes and those of the resources
+        that depend on it, directly or indirectly, are reset. Otherwise the
+        attributes of every instantiated resource are reset.
+        '''
         # nothing is cached if no resources exist
         if not self._resources:
             return
+
+        if changed is not None:
+            affected = self._dependent_resources(changed)
+            if affected is not None:
+                for res in affected:
+                    res.attributes.reset_resolved_values()
+                return
+
         # a change in some resource may have side-effects in the attributes
-        # of other resources, so ensure that attributes are re-calculated
-        for res in six.itervalues(self.resources):
+        # of other resources, so ensure that attributes are re-calculated.
+        # Resources not instantiated yet have nothing cached.
+        if isinstance(self._resources, _ResourceMap):
+            resources = self._resources.loaded()
+        else:
+            resources = six.itervalues(self._resources)
+        for res in resources:
             res.attributes.reset_resolved_values()
 
+    def _dependent_resources(self, res):
+        '''
+        Return the given Resource and all the Resources that require it,
+        directly or indirectly, according to the dependency graph.
+
+        Returns None if the dependency graph has not been calculated yet or
+        does not contain the Resource, since calculating it would mean
+        instantiating every resource in the stack.
+        '''
+        deps = self._dependencies
+        if deps is None:
+            return None
+
+        try:
+            pending = list(deps.required_by(res))
+        except KeyError:
+            return None
+
+        affected = [res]
+        seen = set([id(res)])
+        while pending:
+            dependent = pending.pop()
+            if id(dependent) in seen:
+                continue
+            seen.add(id(dependent))
+            affected.append(dependent)
+            pending.extend(deps.required_by(dependent))
+        return affected
+
+    def metadata_dependents(self, resource_names):
+        '''
+        Return the created Resources whose metadata refers to any of the
+        named resources, or to a resource which depends on one of them.
+
+        Signalling a resource can change the attributes of the resources
+        depending on it, e.g. the Data of a WaitCondition when its handle is
+        signalled, so the metadata of these Resources should be refreshed.
+        The named resources themselves are not included.
+
+        The dependents are found from the resource definitions, so only the
+        Resources returned are instantiated.
+        '''
+        definitions = self.resources.definitions()
+        required_by = collections.defaultdict(set)
+        for name, defn in six.iteritems(definitions):
+            for required in defn.required_resource_names():
+                required_by[required].add(name)
+
+        changed = set()
+        pending = [name for name in resource_names if name in definitions]
+        while pending:
+            name = pending.pop()
+            if name not in changed:
+                changed.add(name)
+                pending.extend(required_by[name])
+
+        dependents = []
+        for name, defn in six.iteritems(definitions):
+            if (name in resource_names or
+                    changed.isdisjoint(defn.metadata_dependency_names())):
+                continue
+            rsrc = self[name]
+            if rsrc.id is not None and rsrc.action != rsrc.INIT:
+                dependents.append(rsrc)
+        return dependents
+
     def has_cache_data(self):
         if self.cache_data is not None:
             return True
@@ -18,16 +18,19 @@ from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_utils import excutils
+from oslo_utils import timeutils
 
 from heat.common import exception
 from heat.common.i18n import _LI
 from heat.common.i18n import _LW
 from heat.common import messaging as rpc_messaging
+from heat.objects import service as service_objects
 from heat.objects import stack as stack_object
 from heat.objects import stack_lock as stack_lock_object
 from heat.rpc import api as rpc_api
 
 cfg.CONF.import_opt('engine_life_check_timeout', 'heat.common.config')
+cfg.CONF.import_opt('engine_heartbeat_missed_limit', 'heat.common.config')
 
 LOG = logging.getLogger(__name__)
 
@@ -39,8 +42,39 @@ class StackLock(object):
         self.engine_id = engine_id
         self.listener = None
 
+    @staticmethod
+    def engine_heartbeat_alive(context, engine_id):
+        """
+        Check the liveness of an engine from its service heartbeat.
+
+        Returns True if the engine reported to the service table recently,
+        False if the heartbeat is stale or the service was stopped, and None
+        if the engine has no service record, in which case the caller has to
+        fall back to probing the engine over RPC.
+        """
+        srv = service_objects.Service.get_by_engine_id(context, engine_id)
+        if srv is None:
+            return None
+        return StackLock.service_alive(srv)
+
+    @staticmethod
+    def service_alive(srv):
+        """Check whether a service record has a recent heartbeat."""
+        if srv.deleted_at is not None:
+            return False
+
+        last_report = srv.updated_at or srv.created_at
+        max_age = (srv.report_interval *
+                   cfg.CONF.engine_heartbeat_missed_limit)
+        age = (timeutils.utcnow() - last_report).total_seconds()
+        return age <= max_age
+
     @staticmethod
     def engine_alive(context, engine_id):
+        alive = StackLock.engine_heartbeat_alive(context, engine_id)
+        if alive is not None:
+            return alive
+
         client = rpc_messaging.get_rpc_client(
             version='1.0', topic=rpc_api.LISTENER_TOPIC,
             server=engine_id)
@@ -25,6 +25,17 @@ def create(context, entity_id, traversal_id, is_update, stack_id):
     return sync_point_object.SyncPoint.create(context, values)
 
 
+def create_all(context, entities, traversal_id, stack_id):
+    """
+    Creates sync point entries in DB for (entity_id, is_update) pairs.
+    """
+    values_list = [{'entity_id': entity_id, 'traversal_id': traversal_id,
+                    'is_update': is_update, 'atomic_key': 0,
+                    'stack_id': stack_id, 'input_data': {}}
+                   for entity_id, is_update in entities]
+    return sync_point_object.SyncPoint.create_all(context, values_list)
+
+
 def get(context, entity_id, traversal_id, is_update):
     """
     Retrieves a sync point entry from DB.
@@ -12,13 +12,17 @@
 #    under the License.
 
 
+import collections
 import datetime
 
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
+import six
 
 from heat.common import exception
 from heat.common.i18n import _
+from heat.common.i18n import _LE
 from heat.common.i18n import _LI
 from heat.common.i18n import _LW
 from heat.engine import stack
@@ -56,13 +60,18 @@ class WatchRule(object):
 
     def __init__(self, context, watch_name, rule, stack_id=None,
                  state=NODATA, wid=None, watch_data=None,
-                 last_evaluated=timeutils.utcnow()):
+                 last_evaluated=timeutils.utcnow(),
+                 use_stored_context=False):
         self.context = context
+        self.use_stored_context = use_stored_context
+        self._stack = None
         self.now = timeutils.utcnow()
         self.name = watch_name
         self.state = state
         self.rule = rule
         self.stack_id = stack_id
+        self._indexed = (self._index_entry(rule, state)
+                         if wid is not None else None)
         period = 0
         if 'Period' in rule:
             period = int(rule['Period'])
@@ -70,13 +79,40 @@ class WatchRule(object):
             period = int(rule['period'])
         self.timeperiod = datetime.timedelta(seconds=period)
         self.id = wid
-        self.watch_data = watch_data or []
+        self._watch_data = watch_data
         self.last_evaluated = last_evaluated
 
+    @property
+    def watch_data(self):
+        '''
+        The samples for this rule which fall within the evaluation period.
+
+        Unless supplied explicitly, only samples newer than the current
+        period are fetched from the database, so the cost of evaluating a
+        rule does not grow with the age of the alarm.
+        '''
+        if self._watch_data is None:
+            if self.id is None:
+                self._watch_data = []
+            else:
+                self._watch_data = list(
+                    watch_data_objects.WatchData.get_all_by_watch_rule_id(
+                        self.context, self.id,
+                        since=self.now - self.timeperiod))
+        return self._watch_data
+
+    @watch_data.setter
+    def watch_data(self, data):
+        self._watch_data = data
+
     @classmethod
-    def load(cls, context, watch_name=None, watch=None):
+    def load(cls, context, watch_name=None, watch=None,
+             use_stored_context=False):
         '''
         Load the watchrule object, either by name or via an existing DB object
+
+        With use_stored_context, alarm actions run with the stored context of
+        the stack instead of the given one, as done by the periodic watcher.
         '''
         if watch is None:
             try:
@@ -94,8 +130,8 @@ class WatchRule(object):
                        stack_id=watch.stack_id,
                        state=watch.state,
                        wid=watch.id,
-                       watch_data=watch.watch_data,
-                       last_evaluated=watch.last_evaluated)
+                       last_evaluated=watch.last_evaluated,
+                       use_stored_context=use_stored_context)
 
     def store(self):
         '''
@@ -109,6 +145,7 @@ class WatchRule(object):
             'state': self.state,
             'stack_id': self.stack_id
         }
+        wr_values.update(self.evaluation_times())
 
         if not self.id:
             wr = watch_rule_objects.WatchRule.create(self.context, wr_values)
@@ -117,6 +154,28 @@ class WatchRule(object):
             watch_rule_objects.WatchRule.update_by_id(self.context, self.id,
                                                       wr_values)
 
+        indexed = self._index_entry(self.rule, self.state)
+        if indexed != self._indexed:
+            WatchRuleIndex.rules_changed()
+            self._indexed = indexed
+
+    def evaluation_times(self):
+        '''
+        Return the values of the last and next evaluation times to store
+        '''
+        return {'last_evaluated': self.last_evaluated,
+                'next_evaluation': self.last_evaluated + self.timeperiod}
+
+    @classmethod
+    def _index_entry(cls, rule, state):
+        '''
+        Return what a WatchRuleIndex holds of a rule, None if it is not
+        indexed.
+        '''
+        if state == cls.SUSPENDED:
+            return None
+        return state == cls.CEILOMETER_CONTROLLED, rule
+
     def destroy(self):
         '''
         Delete the watchrule from the database.
@@ -137,96 +196,50 @@ class WatchRule(object):
         else:
             return False
 
-    def do_Maximum(self):
-        data = 0
-        have_data = False
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                continue
-            if not have_data:
-                data = float(d.data[self.rule['MetricName']]['Value'])
-                have_data = True
-            if float(d.data[self.rule['MetricName']]['Value']) > data:
-                data = float(d.data[self.rule['MetricName']]['Value'])
+    def _samples(self):
+        '''
+        Return the samples which fall within the current period
+        '''
+        since = self.now - self.timeperiod
+        return [d for d in self.watch_data if d.created_at >= since]
 
-        if not have_data:
-            return self.NODATA
+    def _values(self):
+        metric = self.rule['MetricName']
+        return [float(d.data[metric]['Value']) for d in self._samples()]
 
+    def _check_threshold(self, data):
         if self.do_data_cmp(data,
                             float(self.rule['Threshold'])):
             return self.ALARM
         else:
             return self.NORMAL
 
-    def do_Minimum(self):
-        data = 0
-        have_data = False
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                continue
-            if not have_data:
-                data = float(d.data[self.rule['MetricName']]['Value'])
-                have_data = True
-            elif float(d.data[self.rule['MetricName']]['Value']) < data:
-                data = float(d.data[self.rule['MetricName']]['Value'])
-
-        if not have_data:
+    def do_Maximum(self):
+        values = self._values()
+        if not values:
             return self.NODATA
+        return self._check_threshold(max(values))
 
-        if self.do_data_cmp(data,
-                            float(self.rule['Threshold'])):
-            return self.ALARM
-        else:
-            return self.NORMAL
+    def do_Minimum(self):
+        values = self._values()
+        if not values:
+            return self.NODATA
+        return self._check_threshold(min(values))
 
     def do_SampleCount(self):
         '''
         count all samples within the specified period
         '''
-        data = 0
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                continue
-            data = data + 1
-
-        if self.do_data_cmp(data,
-                            float(self.rule['Threshold'])):
-            return self.ALARM
-        else:
-            return self.NORMAL
+        return self._check_threshold(len(self._samples()))
 
     def do_Average(self):
-        data = 0
-        samples = 0
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                continue
-            samples = samples + 1
-            data = data + float(d.data[self.rule['MetricName']]['Value'])
-
-        if samples == 0:
+        values = self._values()
+        if not values:
             return self.NODATA
-
-        data = data / samples
-        if self.do_data_cmp(data,
-                            float(self.rule['Threshold'])):
-            return self.ALARM
-        else:
-            return self.NORMAL
+        return self._check_threshold(sum(values) / len(values))
 
     def do_Sum(self):
-        data = 0
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                LOG.debug('ignoring %s' % str(d.data))
-                continue
-            data = data + float(d.data[self.rule['MetricName']]['Value'])
-
-        if self.do_data_cmp(data,
-                            float(self.rule['Threshold'])):
-            return self.ALARM
-        else:
-            return self.NORMAL
+        return self._check_threshold(sum(self._values()))
 
     def get_alarm_state(self):
         fn = getattr(self, 'do_%s' % self.rule['Statistic'])
@@ -252,8 +265,35 @@ class WatchRule(object):
 
         self.last_evaluated = self.now
         self.store()
+        self.prune_watch_data()
         return actions
 
+    def prune_watch_data(self):
+        '''
+        Delete samples which are too old to affect any future evaluation
+        '''
+        if not self.id or cfg.CONF.watch_data_max_age <= 0:
+            return
+        max_age = max(self.timeperiod,
+                      datetime.timedelta(seconds=cfg.CONF.watch_data_max_age))
+        watch_data_objects.WatchData.delete_by_watch_rule_id(
+            self.context, self.id, self.now - max_age)
+
+    def load_stack(self):
+        '''
+        Load the stack the rule belongs to, only done when an action fires
+        '''
+        if self._stack is None:
+            s = stack_object.Stack.get_by_id(
+                self.context,
+                self.stack_id,
+                tenant_safe=not self.use_stored_context,
+                eager_load=True)
+            self._stack = stack.Stack.load(
+                self.context, stack=s,
+                use_stored_context=self.use_stored_context)
+        return self._stack
+
     def rule_actions(self, new_state):
         LOG.info(_LI('WATCH: stack:%(stack)s, watch_name:%(watch_name)s, '
                      'new_state:%(new_state)s'), {'stack': self.stack_id,
@@ -263,11 +303,7 @@ class WatchRule(object):
         if self.ACTION_MAP[new_state] not in self.rule:
             LOG.info(_LI('no action for new state %s'), new_state)
         else:
-            s = stack_object.Stack.get_by_id(
-                self.context,
-                self.stack_id,
-                eager_load=True)
-            stk = stack.Stack.load(self.context, stack=s)
+            stk = self.load_stack()
             if (stk.action != stk.DELETE
                     and stk.status == stk.COMPLETE):
                 for refid in self.rule[self.ACTION_MAP[new_state]]:
@@ -297,7 +333,11 @@ class WatchRule(object):
                       'k': k, 'sample': sample})
             clients.client('ceilometer').samples.create(**sample)
 
-    def create_watch_data(self, data):
+    def create_watch_data(self, data, store=None):
+        '''
+        Record a metric sample for this rule, in the given WatchDataStore if
+        any, else directly in the database.
+        '''
         if self.state == self.CEILOMETER_CONTROLLED:
             # this is a short term measure for those that have cfn-push-stats
             # within their templates, but want to use Ceilometer alarms.
@@ -325,6 +365,10 @@ class WatchRule(object):
             'data': data,
             'watch_rule_id': self.id
         }
+        if store is not None:
+            store.add(watch_data)
+            return
+
         wd = watch_data_objects.WatchData.create(self.context, watch_data)
         LOG.debug('new watch:%(name)s data:%(data)s'
                   % {'name': self.name, 'data': str(wd.data)})
@@ -398,3 +442,114 @@ def rule_can_use_sample(wr, stats_data):
             if match_dimesions(rule_dims, data_dims):
                 return True
     return False
+
+
+class WatchRuleIndex(object):
+    '''
+    Maps metric names to the watch rules which may use samples of them
+
+    The index is rebuilt as soon as a rule is created or deleted by any
+    engine, or its definition is changed by this one, and at least once per
+    periodic_interval to pick up the changes made by other engines.
+    '''
+
+    # Bumped whenever this process stores a rule which is indexed
+    # differently
+    _generation = 0
+
+    def __init__(self):
+        self._rules = {}
+        self._built_at = None
+        self._built_generation = None
+        self._version = None
+
+    @classmethod
+    def rules_changed(cls):
+        cls._generation += 1
+
+    def _build(self, cnxt, version):
+        rules = collections.defaultdict(list)
+        for wr in watch_rule_objects.WatchRule.get_all(cnxt):
+            if wr.state == WatchRule.SUSPENDED:
+                continue
+            if wr.state == WatchRule.CEILOMETER_CONTROLLED:
+                metric = wr.rule.get('meter_name')
+            else:
+                metric = wr.rule.get('MetricName')
+            rules[metric].append(wr)
+        self._rules = dict(rules)
+        self._built_at = timeutils.utcnow()
+        self._built_generation = self._generation
+        self._version = version
+
+    def _expired(self, version):
+        if (self._built_at is None or
+                self._built_generation != self._generation or
+                self._version != version):
+            return True
+        age = timeutils.utcnow() - self._built_at
+        return age.total_seconds() >= cfg.CONF.periodic_interval
+
+    def invalidate(self):
+        self._built_at = None
+
+    def match(self, cnxt, stats_data):
+        '''
+        Return the watch rules which can use the given sample
+        '''
+        version = watch_rule_objects.WatchRule.get_version(cnxt)
+        if self._expired(version):
+            self._build(cnxt, version)
+        return [wr for k in stats_data if k != 'Namespace'
+                for wr in self._rules.get(k, [])
+                if rule_can_use_sample(wr, stats_data)]
+
+
+class WatchDataStore(object):
+    '''
+    Buffers the samples pushed to watch rules and writes them in batches
+
+    Each rule has a bounded buffer, the oldest samples are dropped if the
+    samples of a rule arrive faster than they are written.
+    '''
+
+    def __init__(self, size=None):
+        size = size or cfg.CONF.watch_data_buffer_size
+        self._buffers = collections.defaultdict(
+            lambda: collections.deque(maxlen=size))
+
+    def __len__(self):
+        return sum(len(b) for b in six.itervalues(self._buffers))
+
+    def add(self, values):
+        values = dict(values, created_at=timeutils.utcnow())
+        self._buffers[values['watch_rule_id']].append(values)
+
+    def flush(self, cnxt):
+        '''
+        Write all the buffered samples with a single INSERT
+
+        If that fails, the samples of each rule are written separately and
+        those which still can't be written, e.g. because their rule has been
+        deleted, are dropped so they can't hold up the later samples.
+        '''
+        buffers, self._buffers = self._buffers, collections.defaultdict(
+            self._buffers.default_factory)
+        values_list = [v for b in six.itervalues(buffers) for v in b]
+        if not values_list:
+            return
+        try:
+            watch_data_objects.WatchData.create_all(cnxt, values_list)
+            return
+        except Exception as ex:
+            LOG.warn(_LW('Failed to store %(count)d watch data samples, '
+                         'storing them per rule: %(ex)s'),
+                     {'count': len(values_list), 'ex': ex})
+
+        for rule_id, samples in six.iteritems(buffers):
+            try:
+                watch_data_objects.WatchData.create_all(cnxt, list(samples))
+            except Exception:
+                LOG.exception(_LE('Dropping %(count)d watch data samples of '
+                                  'watch rule %(id)s'),
+                              {'count': len(samples), 'id': rule_id})
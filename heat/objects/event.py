@@ -40,8 +40,10 @@ class Event(base.VersionedObject, base.VersionedObjectDictCompat):
     }
 
     @staticmethod
-    def _from_db_object(context, event, db_event):
+    def _from_db_object(context, event, db_event, include_properties=True):
         for field in event.fields:
+            if field == 'resource_properties' and not include_properties:
+                continue
             event[field] = db_event[field]
         event._context = context
         event.obj_reset_changes()
@@ -58,17 +60,21 @@ class Event(base.VersionedObject, base.VersionedObjectDictCompat):
                 for db_event in db_api.event_get_all(context)]
 
     @classmethod
-    def get_all_by_tenant(cls, context, **kwargs):
-        return [cls._from_db_object(context, cls(), db_event)
-                for db_event in db_api.event_get_all_by_tenant(context,
-                                                               **kwargs)]
+    def get_all_by_tenant(cls, context, include_properties=True, **kwargs):
+        return [cls._from_db_object(context, cls(), db_event,
+                                    include_properties)
+                for db_event in db_api.event_get_all_by_tenant(
+                    context, include_properties=include_properties,
+                    **kwargs)]
 
     @classmethod
-    def get_all_by_stack(cls, context, stack_id, **kwargs):
-        return [cls._from_db_object(context, cls(), db_event)
-                for db_event in db_api.event_get_all_by_stack(context,
-                                                              stack_id,
-                                                              **kwargs)]
+    def get_all_by_stack(cls, context, stack_id, include_properties=True,
+                         **kwargs):
+        return [cls._from_db_object(context, cls(), db_event,
+                                    include_properties)
+                for db_event in db_api.event_get_all_by_stack(
+                    context, stack_id,
+                    include_properties=include_properties, **kwargs)]
 
     @classmethod
     def count_all_by_stack(cls, context, stack_id):
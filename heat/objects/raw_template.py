@@ -49,10 +49,12 @@ class RawTemplate(
         # If any of the parameters were encrypted, then decrypt them
         parameters = tpl.environment[env_fmt.PARAMETERS]
         encrypted_param_names = tpl.environment[env_fmt.ENCRYPTED_PARAM_NAMES]
-        for param_name in encrypted_param_names:
-            decrypt_function_name = parameters[param_name][0]
-            decrypt_function = getattr(crypt, decrypt_function_name)
-            decrypted_val = decrypt_function(parameters[param_name][1])
+        decrypted_vals = crypt.decrypt_all(
+            (parameters[param_name][0], parameters[param_name][1],
+             ('raw_template', db_tpl.id, param_name))
+            for param_name in encrypted_param_names)
+        for param_name, decrypted_val in zip(encrypted_param_names,
+                                             decrypted_vals):
             parameters[param_name] = encodeutils.safe_decode(decrypted_val)
         tpl.environment[env_fmt.PARAMETERS] = parameters
 
@@ -100,6 +100,20 @@ class Resource(
     def create(cls, context, values):
         return db_api.resource_create(context, values)
 
+    @classmethod
+    def create_all(cls, context, values_list):
+        return db_api.resource_create_all(context, values_list)
+
+    @classmethod
+    def update_by_id(cls, context, resource_id, values, atomic_key=None):
+        return db_api.resource_update_by_id(context, resource_id, values,
+                                            atomic_key=atomic_key)
+
+    @classmethod
+    def update_all_by_id(cls, context, stack_id, values_by_id):
+        return db_api.resource_update_all_by_id(context, stack_id,
+                                                values_by_id)
+
     @classmethod
     def delete(cls, context, resource_id):
         resource_db = db_api.resource_get(context, resource_id)
@@ -133,6 +147,13 @@ class Resource(
         resource = cls._from_db_object(cls(context), context, resource_db)
         return resource
 
+    @classmethod
+    def get_metadata_by_name_and_stack(cls, context, resource_name,
+                                       stack_id):
+        return db_api.resource_metadata_get_by_name_and_stack(context,
+                                                              resource_name,
+                                                              stack_id)
+
     @classmethod
     def get_by_physical_resource_id(cls, context, physical_resource_id):
         resource_db = db_api.resource_get_by_physical_resource_id(
@@ -141,6 +162,15 @@ class Resource(
         resource = cls._from_db_object(cls(context), context, resource_db)
         return resource
 
+    @classmethod
+    def get_all_by_physical_resource_ids(cls, context, physical_resource_ids):
+        resources_db = db_api.resource_get_all_by_physical_resource_ids(
+            context, physical_resource_ids)
+        return dict((physical_resource_id,
+                     cls._from_db_object(cls(context), context, resource_db))
+                    for physical_resource_id, resource_db
+                    in six.iteritems(resources_db))
+
     def update_and_save(self, values):
         resource_db = db_api.resource_get(self._context, self.id)
         resource_db.update_and_save(values)
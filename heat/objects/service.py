@@ -20,6 +20,7 @@ from oslo_versionedobjects import base
 from oslo_versionedobjects import fields
 
 from heat.db import api as db_api
+from heat.objects import fields as heat_fields
 
 
 class Service(base.VersionedObject,
@@ -33,6 +34,7 @@ class Service(base.VersionedObject,
         'binary': fields.StringField(),
         'topic': fields.StringField(),
         'report_interval': fields.IntegerField(),
+        'load_stats': heat_fields.JsonField(nullable=True),
         'created_at': fields.DateTimeField(read_only=True),
         'updated_at': fields.DateTimeField(nullable=True),
         'deleted_at': fields.DateTimeField(nullable=True)
@@ -59,6 +61,13 @@ class Service(base.VersionedObject,
         service = cls._from_db_object(context, cls(), service_db)
         return service
 
+    @classmethod
+    def get_by_engine_id(cls, context, engine_id):
+        service_db = db_api.service_get_by_engine_id(context, engine_id)
+        if service_db is None:
+            return None
+        return cls._from_db_object(context, cls(), service_db)
+
     @classmethod
     def create(cls, context, values):
         return cls._from_db_object(
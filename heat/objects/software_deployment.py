@@ -65,6 +65,12 @@ class SoftwareDeployment(base.VersionedObject,
         return cls._from_db_object(
             context, cls(), db_api.software_deployment_create(context, values))
 
+    @classmethod
+    def create_all(cls, context, values_list):
+        return [cls._from_db_object(context, cls(), db_deployment)
+                for db_deployment in db_api.software_deployment_create_all(
+                    context, values_list)]
+
     @classmethod
     def get_by_id(cls, context, deployment_id):
         return cls._from_db_object(
@@ -77,6 +83,13 @@ class SoftwareDeployment(base.VersionedObject,
                 for db_deployment in db_api.software_deployment_get_all(
                     context, server_id)]
 
+    @classmethod
+    def get_all_by_servers(cls, context, server_ids):
+        return [cls._from_db_object(context, cls(), db_deployment)
+                for db_deployment in
+                db_api.software_deployment_get_all_by_servers(
+                    context, server_ids)]
+
     @classmethod
     def update_by_id(cls, context, deployment_id, values):
         return cls._from_db_object(
@@ -61,21 +61,45 @@ class Stack(
         'parent_resource_name': fields.StringField(nullable=True),
     }
 
+    # Unless it was eagerly loaded with the stack, the template is only
+    # fetched on first access, see the raw_template property
+    _raw_template = None
+
+    @property
+    def raw_template(self):
+        if self._raw_template is None:
+            self._raw_template = raw_template.RawTemplate.get_by_id(
+                self._context, self.raw_template_id)
+        return self._raw_template
+
+    @raw_template.setter
+    def raw_template(self, value):
+        self._raw_template = value
+
     @staticmethod
     def _from_db_object(context, stack, db_stack):
+        # The columns are copied from the row's __dict__, so make sure they
+        # are loaded, and copy them before issuing any other query: the row
+        # may be expired again meanwhile by another thread sharing the
+        # session.
+        db_stack['id']
         for field in stack.fields:
-            if field == 'raw_template':
-                stack['raw_template'] = (
-                    raw_template.RawTemplate.get_by_id(
-                        context, db_stack['raw_template_id']))
-            elif field == 'tags':
-                if db_stack.get(field) is not None:
-                    stack['tags'] = stack_tag.StackTagList.get(
-                        context, db_stack['id'])
-                else:
-                    stack['tags'] = None
-            else:
+            if field not in ('raw_template', 'tags'):
                 stack[field] = db_stack.__dict__.get(field)
+
+        db_tpl = db_stack.__dict__.get('raw_template')
+        if db_tpl is not None:
+            stack['raw_template'] = raw_template.RawTemplate._from_db_object(
+                context, raw_template.RawTemplate(), db_tpl)
+        elif (stack._raw_template is not None and
+              str(stack._raw_template.id) != str(stack.raw_template_id)):
+            # refreshed after the stack moved to a new template
+            stack['raw_template'] = None
+
+        if db_stack.get('tags') is not None:
+            stack['tags'] = stack_tag.StackTagList.get(context, stack.id)
+        else:
+            stack['tags'] = None
         stack._context = context
         stack.obj_reset_changes()
         return stack
@@ -150,6 +174,12 @@ class Stack(
     def update_by_id(cls, context, stack_id, values):
         return db_api.stack_update(context, stack_id, values)
 
+    @classmethod
+    def status_set_all(cls, context, stack_ids, old_status, new_status,
+                       reasons):
+        return db_api.stack_status_set_all(context, stack_ids, old_status,
+                                           new_status, reasons)
+
     @classmethod
     def delete(cls, context, stack_id):
         return db_api.stack_delete(context, stack_id)
@@ -42,6 +42,14 @@ class StackLock(base.VersionedObject,
                                        old_engine_id,
                                        new_engine_id)
 
+    @classmethod
+    def steal_all(cls, old_engine_ids, new_engine_id):
+        return db_api.stack_lock_steal_all(old_engine_ids, new_engine_id)
+
+    @classmethod
+    def release_all(cls, stack_ids, engine_id):
+        return db_api.stack_lock_release_all(stack_ids, engine_id)
+
     @classmethod
     def release(cls, stack_id, engine_id):
         return db_api.stack_lock_release(stack_id, engine_id)
@@ -49,3 +57,7 @@ class StackLock(base.VersionedObject,
     @classmethod
     def get_engine_id(cls, stack_id):
         return db_api.stack_lock_get_engine_id(stack_id)
+
+    @classmethod
+    def get_engine_ids(cls):
+        return db_api.stack_lock_get_engine_ids()
@@ -54,13 +54,23 @@ class WatchData(base.VersionedObject, base.VersionedObjectDictCompat):
         db_data = db_api.watch_data_create(context, values)
         return cls._from_db_object(context, cls(), db_data)
 
+    @classmethod
+    def create_all(cls, context, values_list):
+        db_api.watch_data_create_all(context, values_list)
+
     @classmethod
     def get_all(cls, context):
         return [cls._from_db_object(context, cls(), db_data)
                 for db_data in db_api.watch_data_get_all(context)]
 
     @classmethod
-    def get_all_by_watch_rule_id(cls, context, watch_rule_id):
+    def get_all_by_watch_rule_id(cls, context, watch_rule_id, since=None):
         return (cls._from_db_object(context, cls(), db_data)
                 for db_data in db_api.watch_data_get_all_by_watch_rule_id(
-                    context, watch_rule_id))
+                    context, watch_rule_id, since=since))
+
+    @classmethod
+    def delete_by_watch_rule_id(cls, context, watch_rule_id, before):
+        return db_api.watch_data_delete_by_watch_rule_id(context,
+                                                         watch_rule_id,
+                                                         before)
@@ -33,6 +33,7 @@ class WatchRule(base.VersionedObject, base.VersionedObjectDictCompat):
         'rule': heat_fields.JsonField(nullable=True),
         'state': fields.StringField(nullable=True),
         'last_evaluated': fields.DateTimeField(nullable=True),
+        'next_evaluation': fields.DateTimeField(nullable=True),
         'stack_id': fields.StringField(),
         'stack': fields.ObjectField(stack.Stack),
         'watch_data': fields.ListOfObjectsField(watch_data.WatchData),
@@ -47,14 +48,19 @@ class WatchRule(base.VersionedObject, base.VersionedObjectDictCompat):
                 rule[field] = stack.Stack._from_db_object(
                     context, stack.Stack(), db_rule[field])
             elif field == 'watch_data':
-                rule[field] = watch_data.WatchData.get_all_by_watch_rule_id(
-                    context, db_rule['id'])
+                # The samples are not loaded with the rule, use
+                # get_watch_data() to fetch the ones of interest
+                continue
             else:
                 rule[field] = db_rule[field]
         rule._context = context
         rule.obj_reset_changes()
         return rule
 
+    def get_watch_data(self, since=None):
+        return list(watch_data.WatchData.get_all_by_watch_rule_id(
+            self._context, self.id, since=since))
+
     @classmethod
     def get_by_id(cls, context, rule_id):
         db_rule = db_api.watch_rule_get(context, rule_id)
@@ -76,6 +82,22 @@ class WatchRule(base.VersionedObject, base.VersionedObjectDictCompat):
                 for db_rule in db_api.watch_rule_get_all_by_stack(context,
                                                                   stack_id)]
 
+    @classmethod
+    def get_all_evaluable(cls, context, shard_count=1, shard_index=0,
+                          due_only=True):
+        return [cls._from_db_object(context, cls(), db_rule)
+                for db_rule in db_api.watch_rule_get_all_evaluable(
+                    context, shard_count=shard_count,
+                    shard_index=shard_index, due_only=due_only)]
+
+    @classmethod
+    def get_version(cls, context):
+        return db_api.watch_rule_get_version(context)
+
+    @classmethod
+    def update_all_by_id(cls, context, values_by_id):
+        return db_api.watch_rule_update_all_by_id(context, values_by_id)
+
     @classmethod
     def update_by_id(cls, context, watch_id, values):
         db_api.watch_rule_update(context, watch_id, values)
@@ -80,6 +80,12 @@ RES_SCHEMA_KEYS = (
     RES_TYPE, 'properties', 'attributes',
 )
 
+RES_METADATA_KEYS = (
+    RES_METADATA_ETAG,
+) = (
+    'etag',
+)
+
 EVENT_KEYS = (
     EVENT_ID,
     EVENT_STACK_ID, EVENT_STACK_NAME,
@@ -30,6 +30,10 @@ class EngineClient(object):
         1.1 - Add support_status argument to list_resource_types()
         1.4 - Add support for service list
         1.9 - Add template_type option to generate_template()
+        1.10 - Add include_properties option to list_events()
+        1.11 - Add describe_resource_metadata()
+        1.12 - Add poll_metadata_software_deployments()
+        1.13 - Add create_software_deployments()
     '''
 
     BASE_RPC_API_VERSION = '1.0'
@@ -43,14 +47,29 @@ class EngineClient(object):
     def make_msg(method, **kwargs):
         return method, kwargs
 
-    def call(self, ctxt, msg, version=None):
+    def call(self, ctxt, msg, version=None, server=None):
         method, kwargs = msg
-        if version is not None:
-            client = self._client.prepare(version=version)
+        if version is not None or server is not None:
+            client = self._client.prepare(version=version, server=server)
         else:
             client = self._client
         return client.call(ctxt, method, **kwargs)
 
+    def _call_balanced(self, ctxt, msg, **kwargs):
+        """
+        Make a call, retrying it once on the host of the less loaded engine
+        suggested by an overloaded engine that rejected it.
+        """
+        try:
+            return self.call(ctxt, msg, **kwargs)
+        except Exception as ex:
+            if self.local_error_name(ex) != 'EngineOverloaded':
+                raise
+            host = getattr(ex, 'kwargs', {}).get('preferred_host')
+            if not host:
+                raise
+        return self.call(ctxt, msg, server=host, **kwargs)
+
     def cast(self, ctxt, msg, version=None):
         method, kwargs = msg
         if version is not None:
@@ -226,7 +245,7 @@ class EngineClient(object):
         :param stack_user_project_id: stack user project for nested stack
         :param parent_resource_name: the parent resource name
         """
-        return self.call(
+        return self._call_balanced(
             ctxt, self.make_msg('create_stack', stack_name=stack_name,
                                 template=template,
                                 params=params, files=files, args=args,
@@ -252,12 +271,13 @@ class EngineClient(object):
         :param files: files referenced from the environment.
         :param args: Request parameters/args passed from API
         """
-        return self.call(ctxt, self.make_msg('update_stack',
-                                             stack_identity=stack_identity,
-                                             template=template,
-                                             params=params,
-                                             files=files,
-                                             args=args))
+        return self._call_balanced(ctxt,
+                                   self.make_msg('update_stack',
+                                                 stack_identity=stack_identity,
+                                                 template=template,
+                                                 params=params,
+                                                 files=files,
+                                                 args=args))
 
     def validate_template(self, ctxt, template, params=None):
         """
@@ -349,7 +369,8 @@ class EngineClient(object):
                          version='1.9')
 
     def list_events(self, ctxt, stack_identity, filters=None, limit=None,
-                    marker=None, sort_keys=None, sort_dir=None,):
+                    marker=None, sort_keys=None, sort_dir=None,
+                    include_properties=True):
         """
         The list_events method lists all events associated with a given stack.
         It supports pagination (``limit`` and ``marker``),
@@ -363,6 +384,8 @@ class EngineClient(object):
         :param marker: the ID of the last event in the previous page
         :param sort_keys: an array of fields used to sort the list
         :param sort_dir: the direction of the sort ('asc' or 'desc').
+        :param include_properties: whether to return the resource properties
+                                   stored in the events.
         """
         return self.call(ctxt, self.make_msg('list_events',
                                              stack_identity=stack_identity,
@@ -370,7 +393,10 @@ class EngineClient(object):
                                              limit=limit,
                                              marker=marker,
                                              sort_keys=sort_keys,
-                                             sort_dir=sort_dir))
+                                             sort_dir=sort_dir,
+                                             include_properties=(
+                                                 include_properties)),
+                         version='1.10')
 
     def describe_stack_resource(self, ctxt, stack_identity, resource_name,
                                 with_attr=None):
@@ -387,6 +413,23 @@ class EngineClient(object):
                                        with_attr=with_attr),
                          version='1.2')
 
+    def describe_resource_metadata(self, ctxt, stack_identity, resource_name,
+                                   etag=None):
+        """
+        Get the metadata of a resource, along with its entity tag.
+        :param ctxt: RPC context.
+        :param stack_identity: Name of the stack.
+        :param resource_name: the Resource.
+        :param etag: the entity tag of the metadata known to the caller,
+                     if it is still current the metadata is not returned.
+        """
+        return self.call(ctxt,
+                         self.make_msg('describe_resource_metadata',
+                                       stack_identity=stack_identity,
+                                       resource_name=resource_name,
+                                       etag=etag),
+                         version='1.11')
+
     def find_physical_resource(self, ctxt, physical_resource_id):
         """
         Return an identifier for the resource with the specified physical
@@ -545,6 +588,24 @@ class EngineClient(object):
         return self.call(cnxt, self.make_msg('metadata_software_deployments',
                                              server_id=server_id))
 
+    def poll_metadata_software_deployments(self, cnxt, server_id, etag=None,
+                                           timeout=0):
+        """
+        Get the deployment metadata of a server, along with its entity tag.
+        :param cnxt: RPC context.
+        :param server_id: ID of the server.
+        :param etag: the entity tag of the metadata known to the caller,
+                     if it is still current the metadata is not returned.
+        :param timeout: the time in seconds to wait for the metadata to
+                        change from the one identified by etag.
+        """
+        return self.call(cnxt,
+                         self.make_msg('poll_metadata_software_deployments',
+                                       server_id=server_id,
+                                       etag=etag,
+                                       timeout=timeout),
+                         version='1.12')
+
     def show_software_deployment(self, cnxt, deployment_id):
         return self.call(cnxt, self.make_msg('show_software_deployment',
                                              deployment_id=deployment_id))
@@ -564,6 +625,27 @@ class EngineClient(object):
             status_reason=status_reason,
             stack_user_project_id=stack_user_project_id))
 
+    def create_software_deployments(self, cnxt, config_id, deployments,
+                                    action='INIT', status='COMPLETE',
+                                    status_reason='',
+                                    stack_user_project_id=None):
+        """
+        Create a deployment of a config for each of many servers.
+        :param cnxt: RPC context.
+        :param config_id: ID of the config to deploy.
+        :param deployments: list of dicts holding the server_id and
+                            input_values of each deployment.
+        """
+        return self.call(cnxt, self.make_msg(
+            'create_software_deployments',
+            config_id=config_id,
+            deployments=deployments,
+            action=action,
+            status=status,
+            status_reason=status_reason,
+            stack_user_project_id=stack_user_project_id),
+            version='1.13')
+
     def update_software_deployment(self, cnxt, deployment_id,
                                    config_id=None, input_values=None,
                                    output_values=None, action=None,
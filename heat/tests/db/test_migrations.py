@@ -30,6 +30,7 @@ from oslo_db.sqlalchemy import test_migrations
 from oslo_db.sqlalchemy import utils
 from oslo_serialization import jsonutils
 import six
+from six.moves import cPickle as pickle
 import sqlalchemy
 
 from heat.db.sqlalchemy import migrate_repo
@@ -609,6 +610,67 @@ class HeatMigrationsCheckers(test_migrations.WalkVersionsMixin,
     def _check_062(self, engine, data):
         self.assertColumnExists(engine, 'stack', 'parent_resource_name')
 
+    def _check_063(self, engine, data):
+        self.assertColumnExists(engine, 'service', 'load_stats')
+
+    def _check_064(self, engine, data):
+        self.assertIndexMembers(engine, 'watch_data',
+                                'ix_watch_data_watch_rule_id_created_at',
+                                ['watch_rule_id', 'created_at'])
+
+    def _pre_upgrade_065(self, engine):
+        event = utils.get_table(engine, 'event')
+        data = [dict(id=4200 + i,
+                     stack_id='167aaefb-152e-505d-b13a-35d4c816390c',
+                     uuid=str(uuid.uuid4()),
+                     resource_name='res%d' % i,
+                     resource_properties=props)
+                for i, props in enumerate([
+                    pickle.dumps({'Foo': 'bar', 'Count': 3}),
+                    b'not a pickle',
+                    None])]
+        engine.execute(event.insert(), data)
+        return data
+
+    def _check_065(self, engine, data):
+        self.assertColumnType(engine, 'event', 'resource_properties',
+                              sqlalchemy.Text)
+        self.assertColumnNotExists(engine, 'event',
+                                   'new_resource_properties')
+        event = utils.get_table(engine, 'event')
+        rows = dict(engine.execute(
+            sqlalchemy.select([event.c.id, event.c.resource_properties]).where(
+                event.c.id.in_([d['id'] for d in data]))).fetchall())
+        self.assertEqual({'Foo': 'bar', 'Count': 3},
+                         jsonutils.loads(rows[4200]))
+        self.assertIn('Error', jsonutils.loads(rows[4201]))
+        self.assertIsNone(rows[4202])
+
+    def _check_066(self, engine, data):
+        self.assertIndexMembers(engine, 'resource',
+                                'ix_resource_stack_id_name',
+                                ['stack_id', 'name'])
+        self.assertIndexMembers(engine, 'resource',
+                                'ix_resource_nova_instance',
+                                ['nova_instance'])
+        self.assertIndexMembers(engine, 'resource_data',
+                                'ix_resource_data_resource_id',
+                                ['resource_id'])
+        self.assertIndexMembers(engine, 'stack', 'ix_stack_owner_id',
+                                ['owner_id'])
+        self.assertIndexMembers(engine, 'software_deployment',
+                                'ix_software_deployment_server_id_created_at',
+                                ['server_id', 'created_at'])
+        sd = utils.get_table(engine, 'software_deployment')
+        self.assertNotIn('ix_software_deployment_server_id',
+                         [idx.name for idx in sd.indexes])
+
+    def _check_067(self, engine, data):
+        self.assertColumnExists(engine, 'watch_rule', 'next_evaluation')
+        self.assertIndexMembers(engine, 'watch_rule',
+                                'ix_watch_rule_next_evaluation',
+                                ['next_evaluation'])
+
 
 class TestHeatMigrationsMySQL(HeatMigrationsCheckers,
                               test_base.MySQLOpportunisticTestCase):
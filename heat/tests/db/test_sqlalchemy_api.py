@@ -13,6 +13,7 @@
 
 import datetime
 import json
+import re
 import uuid
 
 import mock
@@ -20,8 +21,10 @@ import mox
 from oslo_config import cfg
 from oslo_utils import timeutils
 import six
+import sqlalchemy
 
 from heat.common import context
+from heat.common import crypt
 from heat.common import exception
 from heat.common import template_format
 from heat.db.sqlalchemy import api as db_api
@@ -1120,6 +1123,32 @@ class SqlAlchemyTest(common.HeatTestCase):
             self.ctx, server_id=str(uuid.uuid4()))
         self.assertEqual([], all)
 
+    def test_software_deployment_create_all(self):
+        values = self._deployment_values()
+        other_values = dict(values, server_id=str(uuid.uuid4()))
+        deployments = db_api.software_deployment_create_all(
+            self.ctx, [values, other_values])
+        self.assertEqual(2, len(deployments))
+        self.assertEqual(values['server_id'], deployments[0].server_id)
+        self.assertEqual(other_values['server_id'], deployments[1].server_id)
+        self.assertEqual(
+            deployments[0],
+            db_api.software_deployment_get(self.ctx, deployments[0].id))
+
+    def test_software_deployment_get_all_by_servers(self):
+        values = self._deployment_values()
+        other_values = dict(values, server_id=str(uuid.uuid4()))
+        d1 = db_api.software_deployment_create(self.ctx, values)
+        d2 = db_api.software_deployment_create(self.ctx, other_values)
+        db_api.software_deployment_create(
+            self.ctx, dict(values, server_id=str(uuid.uuid4())))
+
+        all = db_api.software_deployment_get_all_by_servers(
+            self.ctx, [values['server_id'], other_values['server_id']])
+        self.assertEqual(set([d1.id, d2.id]), set(d.id for d in all))
+        self.assertEqual([], db_api.software_deployment_get_all_by_servers(
+            self.ctx, [str(uuid.uuid4())]))
+
     def test_software_deployment_update(self):
         deployment_id = str(uuid.uuid4())
         err = self.assertRaises(exception.NotFound,
@@ -1621,6 +1650,37 @@ class DBAPIStackTest(common.HeatTestCase):
         self.assertRaises(exception.NotFound, db_api.stack_update, self.ctx,
                           UUID2, values)
 
+    def test_stack_status_set_all(self):
+        s_create = create_stack(self.ctx, self.template, self.user_creds,
+                                action='CREATE', status='IN_PROGRESS')
+        s_update = create_stack(self.ctx, self.template, self.user_creds,
+                                action='UPDATE', status='IN_PROGRESS')
+        s_done = create_stack(self.ctx, self.template, self.user_creds,
+                              action='UPDATE', status='COMPLETE')
+        reasons = {'CREATE': 'create went down',
+                   'UPDATE': 'update went down'}
+
+        rows = db_api.stack_status_set_all(
+            self.ctx, [s_create.id, s_update.id, s_done.id],
+            'IN_PROGRESS', 'FAILED', reasons)
+
+        self.assertEqual(set([(s_create.id, 'CREATE'),
+                              (s_update.id, 'UPDATE')]),
+                         set((r.id, r.action) for r in rows))
+        row = [r for r in rows if r.id == s_create.id][0]
+        self.assertEqual(s_create.name, row.name)
+        self.assertEqual(s_create.tenant, row.tenant)
+        self.assertEqual(s_create.username, row.username)
+        self.assertEqual(s_create.created_at, row.created_at)
+        stack = db_api.stack_get(self.ctx, s_create.id)
+        self.assertEqual('FAILED', stack.status)
+        self.assertEqual('create went down', stack.status_reason)
+        stack = db_api.stack_get(self.ctx, s_update.id)
+        self.assertEqual('FAILED', stack.status)
+        self.assertEqual('update went down', stack.status_reason)
+        stack = db_api.stack_get(self.ctx, s_done.id)
+        self.assertEqual('COMPLETE', stack.status)
+
     def test_stack_get_returns_a_stack(self):
         stack = create_stack(self.ctx, self.template, self.user_creds)
         ret_stack = db_api.stack_get(self.ctx, stack.id, show_deleted=False)
@@ -1922,6 +1982,59 @@ class DBAPIResourceTest(common.HeatTestCase):
         self.assertEqual('{"foo": "123"}', json.dumps(ret_res.rsrc_metadata))
         self.assertEqual(self.stack.id, ret_res.stack_id)
 
+    def test_resource_create_all(self):
+        values = [{'name': 'res%d' % i,
+                   'stack_id': self.stack.id,
+                   'action': 'INIT',
+                   'status': 'COMPLETE',
+                   'needed_by': [],
+                   'requires': []} for i in range(3)]
+        resources = db_api.resource_create_all(self.ctx, values)
+        self.assertEqual(['res0', 'res1', 'res2'],
+                         [r.name for r in resources])
+        for res in resources:
+            self.assertIsNotNone(res.id)
+            self.assertIsNotNone(res.uuid)
+            ret_res = db_api.resource_get(self.ctx, res.id)
+            self.assertEqual(res.name, ret_res.name)
+            self.assertEqual(self.stack.id, ret_res.stack_id)
+
+    def test_resource_update_all_by_id(self):
+        res1 = create_resource(self.ctx, self.stack, name='res1')
+        res2 = create_resource(self.ctx, self.stack, name='res2')
+        res3 = create_resource(self.ctx, self.stack, name='res3')
+
+        rows = db_api.resource_update_all_by_id(
+            self.ctx, self.stack.id,
+            {res1.id: {'needed_by': [res2.id]},
+             res2.id: {'needed_by': [res3.id]},
+             res3.id: {'requires': [res1.id],
+                       'status': 'failed'}})
+        self.assertEqual(3, rows)
+
+        self.assertEqual([res2.id],
+                         db_api.resource_get(self.ctx, res1.id).needed_by)
+        self.assertEqual([res3.id],
+                         db_api.resource_get(self.ctx, res2.id).needed_by)
+        ret_res3 = db_api.resource_get(self.ctx, res3.id)
+        self.assertEqual([res1.id], ret_res3.requires)
+        self.assertEqual('failed', ret_res3.status)
+
+    def test_resource_update_all_by_id_other_stack(self):
+        stack2 = create_stack(self.ctx, self.template, self.user_creds)
+        res1 = create_resource(self.ctx, self.stack, name='res1')
+        res2 = create_resource(self.ctx, stack2, name='res2')
+
+        self.assertRaises(exception.NotFound,
+                          db_api.resource_update_all_by_id,
+                          self.ctx, self.stack.id,
+                          {res1.id: {'needed_by': [res2.id]},
+                           res2.id: {'needed_by': [res1.id]}})
+
+        # nothing is updated
+        self.assertIsNone(db_api.resource_get(self.ctx, res1.id).needed_by)
+        self.assertIsNone(db_api.resource_get(self.ctx, res2.id).needed_by)
+
     def test_resource_get(self):
         res = create_resource(self.ctx, self.stack)
         ret_res = db_api.resource_get(self.ctx, res.id)
@@ -1945,6 +2058,17 @@ class DBAPIResourceTest(common.HeatTestCase):
                                                                 'abc',
                                                                 self.stack.id))
 
+    def test_resource_metadata_get_by_name_and_stack(self):
+        res = create_resource(self.ctx, self.stack)
+
+        ret = db_api.resource_metadata_get_by_name_and_stack(
+            self.ctx, 'test_resource_name', self.stack.id)
+        self.assertEqual(res.id, ret.id)
+        self.assertEqual({'foo': '123'}, ret.rsrc_metadata)
+
+        self.assertIsNone(db_api.resource_metadata_get_by_name_and_stack(
+            self.ctx, 'abc', self.stack.id))
+
     def test_resource_get_by_physical_resource_id(self):
         create_resource(self.ctx, self.stack)
 
@@ -1955,6 +2079,20 @@ class DBAPIResourceTest(common.HeatTestCase):
         self.assertIsNone(db_api.resource_get_by_physical_resource_id(self.ctx,
                                                                       UUID2))
 
+    def test_resource_get_all_by_physical_resource_ids(self):
+        create_resource(self.ctx, self.stack)
+        create_resource(self.ctx, self.stack, name='res2',
+                        nova_instance=UUID2)
+
+        resources = db_api.resource_get_all_by_physical_resource_ids(
+            self.ctx, [UUID1, UUID2, UUID3])
+        self.assertEqual(set([UUID1, UUID2]), set(resources))
+        self.assertEqual(UUID2, resources[UUID2].nova_instance)
+
+        ctx = utils.dummy_context(tenant_id='other')
+        self.assertEqual({}, db_api.resource_get_all_by_physical_resource_ids(
+            ctx, [UUID1]))
+
     def test_resource_get_all(self):
         values = [
             {'name': 'res1'},
@@ -2056,6 +2194,47 @@ class DBAPIStackLockTest(common.HeatTestCase):
         observed = db_api.stack_lock_release(self.stack.id, UUID2)
         self.assertTrue(observed)
 
+    def test_stack_lock_get_engine_ids(self):
+        stack2 = create_stack(self.ctx, self.template, self.user_creds)
+        stack3 = create_stack(self.ctx, self.template, self.user_creds)
+        db_api.stack_lock_create(self.stack.id, UUID1)
+        db_api.stack_lock_create(stack2.id, UUID1)
+        db_api.stack_lock_create(stack3.id, UUID2)
+        observed = db_api.stack_lock_get_engine_ids()
+        self.assertEqual(set([UUID1, UUID2]), set(observed))
+        self.assertEqual(2, len(observed))
+
+    def test_stack_lock_steal_all(self):
+        stack2 = create_stack(self.ctx, self.template, self.user_creds)
+        stack3 = create_stack(self.ctx, self.template, self.user_creds)
+        db_api.stack_lock_create(self.stack.id, UUID1)
+        db_api.stack_lock_create(stack2.id, UUID2)
+        db_api.stack_lock_create(stack3.id, UUID3)
+
+        observed = db_api.stack_lock_steal_all([UUID1, UUID2], UUID3)
+        self.assertEqual(set([self.stack.id, stack2.id]), set(observed))
+        for stack_id in (self.stack.id, stack2.id, stack3.id):
+            self.assertEqual(UUID3,
+                             db_api.stack_lock_get_engine_id(stack_id))
+
+    def test_stack_lock_steal_all_none_held(self):
+        db_api.stack_lock_create(self.stack.id, UUID1)
+        observed = db_api.stack_lock_steal_all([UUID2], UUID3)
+        self.assertEqual([], observed)
+        self.assertEqual(UUID1,
+                         db_api.stack_lock_get_engine_id(self.stack.id))
+
+    def test_stack_lock_release_all(self):
+        stack2 = create_stack(self.ctx, self.template, self.user_creds)
+        db_api.stack_lock_create(self.stack.id, UUID1)
+        db_api.stack_lock_create(stack2.id, UUID2)
+
+        observed = db_api.stack_lock_release_all([self.stack.id, stack2.id],
+                                                 UUID1)
+        self.assertEqual(1, observed)
+        self.assertIsNone(db_api.stack_lock_get_engine_id(self.stack.id))
+        self.assertEqual(UUID2, db_api.stack_lock_get_engine_id(stack2.id))
+
 
 class DBAPIResourceDataTest(common.HeatTestCase):
     def setUp(self):
@@ -2095,6 +2274,18 @@ class DBAPIResourceDataTest(common.HeatTestCase):
         self.assertEqual('foo', vals.get('test_resource_key'))
         self.assertEqual('test_value', vals.get('encryped_resource_key'))
 
+    def test_resource_data_get_all_decrypts_once(self):
+        create_resource_data(self.ctx, self.resource,
+                             key='encryped_resource_key', redact=True)
+        decrypt = mock.Mock(wraps=crypt.oslo_decrypt_v1)
+        with mock.patch.dict(crypt.DECRYPT_METHODS,
+                             {'oslo_decrypt_v1': decrypt}):
+            for i in range(3):
+                vals = db_api.resource_data_get_all(self.resource)
+                self.assertEqual('test_value',
+                                 vals['encryped_resource_key'])
+            self.assertEqual(1, decrypt.call_count)
+
     def test_resource_data_delete(self):
         create_resource_data(self.ctx, self.resource)
         res_data = db_api.resource_data_get_by_key(self.ctx, self.resource.id,
@@ -2205,6 +2396,19 @@ class DBAPIEventTest(common.HeatTestCase):
         events = db_api.event_get_all_by_stack(self.ctx, self.stack2.id)
         self.assertEqual(1, len(events))
 
+    def test_event_get_all_by_stack_without_properties(self):
+        self.stack1 = create_stack(self.ctx, self.template, self.user_creds)
+        create_event(self.ctx, stack_id=self.stack1.id)
+
+        events = db_api.event_get_all_by_stack(self.ctx, self.stack1.id,
+                                               include_properties=False)
+        self.assertEqual(1, len(events))
+        self.assertIn('resource_properties',
+                      sqlalchemy.inspect(events[0]).unloaded)
+
+        events = db_api.event_get_all_by_stack(self.ctx, self.stack1.id)
+        self.assertEqual({'name': 'foo'}, events[0].resource_properties)
+
     def test_event_count_all_by_stack(self):
         self.stack1 = create_stack(self.ctx, self.template, self.user_creds)
         self.stack2 = create_stack(self.ctx, self.template, self.user_creds)
@@ -2274,6 +2478,72 @@ class DBAPIWatchRuleTest(common.HeatTestCase):
         wrs = db_api.watch_rule_get_all_by_stack(self.ctx, self.stack1.id)
         self.assertEqual(2, len(wrs))
 
+    def test_watch_rule_get_all_evaluable(self):
+        values = [
+            {'name': 'rule1', 'state': 'NORMAL'},
+            {'name': 'rule2', 'state': 'ALARM'},
+            {'name': 'rule3', 'state': 'SUSPENDED'},
+            {'name': 'rule4', 'state': 'CEILOMETER_CONTROLLED'},
+            {'name': 'rule5', 'state': 'NODATA'},
+        ]
+        [create_watch_rule(self.ctx, self.stack, **val) for val in values]
+
+        wrs = db_api.watch_rule_get_all_evaluable(self.ctx)
+        self.assertEqual(['rule1', 'rule2', 'rule5'],
+                         sorted(wr.name for wr in wrs))
+
+        shards = [db_api.watch_rule_get_all_evaluable(self.ctx,
+                                                      shard_count=2,
+                                                      shard_index=i)
+                  for i in range(2)]
+        self.assertEqual(3, sum(len(shard) for shard in shards))
+        for i, shard in enumerate(shards):
+            for wr in shard:
+                self.assertEqual(i, wr.id % 2)
+
+    def test_watch_rule_get_version(self):
+        self.assertEqual((0, None), db_api.watch_rule_get_version(self.ctx))
+        wr1 = create_watch_rule(self.ctx, self.stack, name='rule1')
+        wr2 = create_watch_rule(self.ctx, self.stack, name='rule2')
+        self.assertEqual((2, wr2.id), db_api.watch_rule_get_version(self.ctx))
+
+        db_api.watch_rule_delete(self.ctx, wr1.id)
+        self.assertEqual((1, wr2.id), db_api.watch_rule_get_version(self.ctx))
+
+    def test_watch_rule_get_all_evaluable_due(self):
+        now = timeutils.utcnow()
+        values = [
+            {'name': 'rule1', 'next_evaluation': None},
+            {'name': 'rule2',
+             'next_evaluation': now - datetime.timedelta(seconds=10)},
+            {'name': 'rule3',
+             'next_evaluation': now + datetime.timedelta(seconds=10)},
+        ]
+        [create_watch_rule(self.ctx, self.stack, **val) for val in values]
+
+        wrs = db_api.watch_rule_get_all_evaluable(self.ctx)
+        self.assertEqual(['rule1', 'rule2'], sorted(wr.name for wr in wrs))
+        wrs = db_api.watch_rule_get_all_evaluable(self.ctx, due_only=False)
+        self.assertEqual(3, len(wrs))
+
+    def test_watch_rule_update_all_by_id(self):
+        wr1, wr2, wr3 = [create_watch_rule(self.ctx, self.stack, name=name)
+                         for name in ('rule1', 'rule2', 'rule3')]
+        then = timeutils.utcnow() - datetime.timedelta(days=1)
+        self.assertEqual(2, db_api.watch_rule_update_all_by_id(
+            self.ctx, {wr1.id: {'last_evaluated': then},
+                       wr2.id: {'last_evaluated': then}}))
+
+        self.assertEqual(then,
+                         db_api.watch_rule_get(self.ctx,
+                                               wr1.id).last_evaluated)
+        self.assertEqual(then,
+                         db_api.watch_rule_get(self.ctx,
+                                               wr2.id).last_evaluated)
+        self.assertNotEqual(then,
+                            db_api.watch_rule_get(self.ctx,
+                                                  wr3.id).last_evaluated)
+
     def test_watch_rule_update(self):
         watch_rule = create_watch_rule(self.ctx, self.stack)
         values = {
@@ -2332,6 +2602,51 @@ class DBAPIWatchDataTest(common.HeatTestCase):
         data = [wd.data for wd in watch_data]
         [self.assertIn(val['data'], data) for val in values]
 
+    def test_watch_data_create_all(self):
+        now = timeutils.utcnow()
+        db_api.watch_data_create_all(self.ctx, [
+            {'data': {'foo': i}, 'watch_rule_id': self.watch_rule.id,
+             'created_at': now} for i in range(3)])
+        watch_data = db_api.watch_data_get_all_by_watch_rule_id(
+            self.ctx, self.watch_rule.id)
+        self.assertEqual([0, 1, 2], sorted(wd.data['foo']
+                                           for wd in watch_data))
+
+    def _create_aged_watch_data(self):
+        now = timeutils.utcnow()
+        other_rule = create_watch_rule(self.ctx, self.stack, name='other')
+        for age in (10, 100, 1000):
+            create_watch_data(self.ctx, self.watch_rule,
+                              data={'foo': age},
+                              created_at=now - datetime.timedelta(
+                                  seconds=age))
+        create_watch_data(self.ctx, other_rule, created_at=now)
+        return now
+
+    def test_watch_data_get_all_by_watch_rule_id(self):
+        now = self._create_aged_watch_data()
+        watch_data = db_api.watch_data_get_all_by_watch_rule_id(
+            self.ctx, self.watch_rule.id)
+        self.assertEqual(3, len(watch_data))
+
+        watch_data = db_api.watch_data_get_all_by_watch_rule_id(
+            self.ctx, self.watch_rule.id,
+            since=now - datetime.timedelta(seconds=500))
+        self.assertEqual([10, 100],
+                         sorted(wd.data['foo'] for wd in watch_data))
+
+    def test_watch_data_delete_by_watch_rule_id(self):
+        now = self._create_aged_watch_data()
+        deleted = db_api.watch_data_delete_by_watch_rule_id(
+            self.ctx, self.watch_rule.id,
+            now - datetime.timedelta(seconds=50))
+        self.assertEqual(2, deleted)
+
+        watch_data = db_api.watch_data_get_all_by_watch_rule_id(
+            self.ctx, self.watch_rule.id)
+        self.assertEqual([10], [wd.data['foo'] for wd in watch_data])
+        self.assertEqual(2, len(db_api.watch_data_get_all(self.ctx)))
+
 
 class DBAPIServiceTest(common.HeatTestCase):
     def setUp(self):
@@ -2378,6 +2693,21 @@ class DBAPIServiceTest(common.HeatTestCase):
         self.assertEqual('heat-engine', services_by_args[0].binary)
         self.assertEqual('engine-0', services_by_args[0].host)
 
+    def test_service_get_by_engine_id(self):
+        service = create_service(self.ctx)
+        ret_service = db_api.service_get_by_engine_id(self.ctx,
+                                                      service.engine_id)
+        self.assertEqual(service.id, ret_service.id)
+
+        # soft-deleted services are still returned
+        db_api.service_delete(self.ctx, service.id)
+        ret_service = db_api.service_get_by_engine_id(self.ctx,
+                                                      service.engine_id)
+        self.assertIsNotNone(ret_service.deleted_at)
+
+        self.assertIsNone(db_api.service_get_by_engine_id(self.ctx,
+                                                          'no-such-engine'))
+
     def test_service_update(self):
         service = create_service(self.ctx)
         values = {'hostname': 'host-updated',
@@ -2431,6 +2761,38 @@ class DBAPIResourceUpdateTest(common.HeatTestCase):
         self.assertEqual('IN_PROGRESS', db_res.status)
         self.assertEqual(1, db_res.atomic_key)
 
+    def test_resource_update_by_id(self):
+        values = {'action': 'CREATE',
+                  'status': 'IN_PROGRESS',
+                  'rsrc_metadata': {'foo': 'bar'}}
+        ret = db_api.resource_update_by_id(self.ctx, self.resource.id,
+                                           values)
+        self.assertTrue(ret)
+        db_res = db_api.resource_get(self.ctx, self.resource.id)
+        self.assertEqual('CREATE', db_res.action)
+        self.assertEqual('IN_PROGRESS', db_res.status)
+        self.assertEqual({'foo': 'bar'}, db_res.rsrc_metadata)
+        self.assertEqual(0, db_res.atomic_key)
+
+        self.assertFalse(db_api.resource_update_by_id(
+            self.ctx, self.resource.id + 1, values))
+
+    def test_resource_update_by_id_atomic_key(self):
+        values = {'action': 'CREATE', 'status': 'COMPLETE'}
+        ret = db_api.resource_update_by_id(self.ctx, self.resource.id,
+                                           values, atomic_key=1)
+        self.assertFalse(ret)
+        db_res = db_api.resource_get(self.ctx, self.resource.id)
+        self.assertEqual(0, db_res.atomic_key)
+        self.assertNotEqual('COMPLETE', db_res.status)
+
+        ret = db_api.resource_update_by_id(self.ctx, self.resource.id,
+                                           values, atomic_key=0)
+        self.assertTrue(ret)
+        db_res = db_api.resource_get(self.ctx, self.resource.id)
+        self.assertEqual(1, db_res.atomic_key)
+        self.assertEqual('COMPLETE', db_res.status)
+
     def test_locked_resource_update_by_same_engine(self):
         values = {'engine_id': 'engine-1',
                   'action': 'CREATE',
@@ -2584,6 +2946,24 @@ class DBAPISyncPointTest(common.HeatTestCase):
         self.assertEqual(sync_point_stack.input_data,
                          ret_sync_point_stack.input_data)
 
+    def test_sync_point_create_all(self):
+        values = [{'entity_id': str(res.id),
+                   'traversal_id': self.stack.current_traversal,
+                   'is_update': True,
+                   'atomic_key': 0,
+                   'stack_id': self.stack.id,
+                   'input_data': {}} for res in self.resources]
+        db_api.sync_point_create_all(self.ctx, values)
+
+        for res in self.resources:
+            ret_sync_point = db_api.sync_point_get(
+                self.ctx, str(res.id), self.stack.current_traversal, True)
+            self.assertIsNotNone(ret_sync_point)
+            self.assertEqual(self.stack.id, ret_sync_point.stack_id)
+            self.assertEqual({}, ret_sync_point.input_data)
+            self.assertEqual(0, ret_sync_point.atomic_key)
+            self.assertIsNotNone(ret_sync_point.created_at)
+
     def test_sync_point_update(self):
         sync_point = create_sync_point(
             self.ctx, entity_id=str(self.resources[0].id),
@@ -2683,3 +3063,91 @@ class DBAPISyncPointTest(common.HeatTestCase):
             self.ctx, self.stack.id, self.stack.current_traversal, True
         )
         self.assertEqual(None, ret_sync_point_stack)
+
+
+class DBAPIQueryPlanTest(common.HeatTestCase):
+    """Check that the queries on the hot paths are served by an index."""
+
+    def setUp(self):
+        super(DBAPIQueryPlanTest, self).setUp()
+        self.ctx = utils.dummy_context()
+        template = create_raw_template(self.ctx)
+        user_creds = create_user_creds(self.ctx)
+        self.stack = create_stack(self.ctx, template, user_creds)
+        self.resource = create_resource(self.ctx, self.stack)
+        self.resource.context = self.ctx
+        create_resource_data(self.ctx, self.resource)
+
+    def _query_plans(self, func, *args):
+        """Return the SQLite query plans of the SELECTs func executes."""
+        plans = []
+
+        def explain(conn, cursor, statement, parameters, context, many):
+            if statement.lstrip().upper().startswith('SELECT'):
+                explain_cursor = conn.connection.cursor()
+                explain_cursor.execute('EXPLAIN QUERY PLAN ' + statement,
+                                       parameters)
+                plans.extend(row[-1] for row in explain_cursor.fetchall())
+
+        engine = db_api.get_engine()
+        sqlalchemy.event.listen(engine, 'before_cursor_execute', explain)
+        try:
+            func(self.ctx, *args)
+        finally:
+            sqlalchemy.event.remove(engine, 'before_cursor_execute', explain)
+        return plans
+
+    def assertIndexUsed(self, table, plans):
+        # e.g. "SEARCH TABLE resource USING INDEX ix_resource_nova_instance
+        # (nova_instance=?)", or "SEARCH resource_data_1 USING ..." for an
+        # aliased table in recent versions of SQLite
+        table_re = re.compile(r'^(SEARCH|SCAN) (TABLE )?%s(_\d+)?\b' % table)
+        details = [d for d in plans if table_re.match(d)]
+        self.assertNotEqual([], details,
+                            'No query on %s in %s' % (table, plans))
+        for detail in details:
+            self.assertTrue(detail.startswith('SEARCH') and
+                            'USING' in detail and
+                            'AUTOMATIC' not in detail,
+                            'Query on %s not using an index: %s' %
+                            (table, detail))
+
+    def test_resource_get_all_by_stack(self):
+        plans = self._query_plans(db_api.resource_get_all_by_stack,
+                                  self.stack.id)
+        self.assertIndexUsed('resource', plans)
+        self.assertIndexUsed('resource_data', plans)
+
+    def test_resource_get_by_name_and_stack(self):
+        plans = self._query_plans(db_api.resource_get_by_name_and_stack,
+                                  self.resource.name, self.stack.id)
+        self.assertIndexUsed('resource', plans)
+        self.assertIndexUsed('resource_data', plans)
+
+    def test_resource_get_by_physical_resource_id(self):
+        plans = self._query_plans(db_api.resource_get_by_physical_resource_id,
+                                  self.resource.nova_instance)
+        self.assertIndexUsed('resource', plans)
+
+    def test_resource_get_all_by_physical_resource_ids(self):
+        plans = self._query_plans(
+            db_api.resource_get_all_by_physical_resource_ids,
+            [self.resource.nova_instance, str(uuid.uuid4())])
+        self.assertIndexUsed('resource', plans)
+
+    def test_stack_get_all_by_owner_id(self):
+        plans = self._query_plans(db_api.stack_get_all_by_owner_id,
+                                  self.stack.id)
+        self.assertIndexUsed('stack', plans)
+
+    def test_software_deployment_get_all(self):
+        plans = self._query_plans(db_api.software_deployment_get_all,
+                                  str(uuid.uuid4()))
+        self.assertIndexUsed('software_deployment', plans)
+        self.assertFalse([d for d in plans if 'TEMP B-TREE' in d], plans)
+
+    def test_software_deployment_get_all_by_servers(self):
+        plans = self._query_plans(
+            db_api.software_deployment_get_all_by_servers,
+            [str(uuid.uuid4()), str(uuid.uuid4())])
+        self.assertIndexUsed('software_deployment', plans)
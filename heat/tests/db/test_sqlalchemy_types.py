@@ -11,6 +11,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 from sqlalchemy.dialects.mysql import base as mysql_base
 from sqlalchemy.dialects.sqlite import base as sqlite_base
 from sqlalchemy import types
@@ -64,6 +65,20 @@ class JsonTest(common.HeatTestCase):
         result = self.sqltype.process_result_value(value, dialect)
         self.assertIsNone(result)
 
+    def test_process_result_value_fast_codec(self):
+        fast_json = mock.Mock()
+        fast_json.loads.return_value = {'foo': 'fast'}
+        self.patchobject(db_types, 'fast_json', new=fast_json)
+        result = self.sqltype.process_result_value('{"foo": "bar"}', None)
+        self.assertEqual({'foo': 'fast'}, result)
+
+    def test_process_result_value_fast_codec_fallback(self):
+        fast_json = mock.Mock()
+        fast_json.loads.side_effect = ValueError
+        self.patchobject(db_types, 'fast_json', new=fast_json)
+        result = self.sqltype.process_result_value('{"foo": "bar"}', None)
+        self.assertEqual({'foo': 'bar'}, result)
+
 
 class ListTest(common.HeatTestCase):
 
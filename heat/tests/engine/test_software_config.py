@@ -14,7 +14,9 @@
 import datetime
 import uuid
 
+import eventlet
 import mock
+from oslo_config import cfg
 from oslo_messaging.rpc import dispatcher
 from oslo_serialization import jsonutils as json
 from oslo_utils import timeutils
@@ -213,6 +215,51 @@ class SoftwareConfigServiceTest(common.HeatTestCase):
             ctx, server_id=server_id)
         self.assertEqual(0, len(metadata))
 
+    @mock.patch.object(service_software_config.SoftwareConfigService,
+                       'metadata_software_deployments')
+    def test_poll_metadata_software_deployments(self, md_sd):
+        md_sd.return_value = [{'name': 'foo'}]
+        res = self.engine.poll_metadata_software_deployments(
+            self.ctx, server_id='1234')
+        self.assertEqual([{'name': 'foo'}], res['metadata'])
+
+        # an unchanged etag returns without the metadata once the
+        # timeout expires
+        res = self.engine.poll_metadata_software_deployments(
+            self.ctx, server_id='1234', etag=res['etag'], timeout=0.01)
+        self.assertNotIn('metadata', res)
+        self.assertEqual({}, self.engine.software_config._metadata_versions)
+
+    @mock.patch.object(service_software_config.SoftwareConfigService,
+                       'metadata_software_deployments')
+    def test_poll_metadata_software_deployments_changed(self, md_sd):
+        md_sd.return_value = [{'name': 'foo'}]
+        etag = self.engine.poll_metadata_software_deployments(
+            self.ctx, server_id='1234')['etag']
+
+        def change():
+            md_sd.return_value = [{'name': 'bar'}]
+            self.engine.software_config.metadata_changed('1234')
+
+        eventlet.spawn_after(0.01, change)
+        res = self.engine.poll_metadata_software_deployments(
+            self.ctx, server_id='1234', etag=etag, timeout=10)
+        self.assertEqual([{'name': 'bar'}], res['metadata'])
+        self.assertEqual(3, md_sd.call_count)
+
+    @mock.patch.object(service_software_config.SoftwareConfigService,
+                       'metadata_software_deployments')
+    def test_poll_metadata_software_deployments_max_pollers(self, md_sd):
+        cfg.CONF.set_override('max_software_deployment_pollers', 0)
+        md_sd.return_value = [{'name': 'foo'}]
+        etag = self.engine.poll_metadata_software_deployments(
+            self.ctx, server_id='1234')['etag']
+
+        res = self.engine.poll_metadata_software_deployments(
+            self.ctx, server_id='1234', etag=etag, timeout=10)
+        self.assertNotIn('metadata', res)
+        self.assertEqual(2, md_sd.call_count)
+
     def test_show_software_deployment(self):
         deployment_id = str(uuid.uuid4())
         ex = self.assertRaises(dispatcher.ExpectedException,
@@ -375,6 +422,69 @@ class SoftwareConfigServiceTest(common.HeatTestCase):
         self.assertEqual(deployment_id, deployment['id'])
         self.assertEqual(kwargs['input_values'], deployment['input_values'])
 
+    @mock.patch.object(service_software_config.SoftwareConfigService,
+                       '_push_metadata_software_deployments_all')
+    @mock.patch.object(service_software_config.SoftwareConfigService,
+                       '_push_metadata_software_deployments')
+    def test_create_software_deployments(self, pmsd, pmsd_all):
+        config = self._create_software_config(name='config_heat')
+        other = self._create_software_config(name='config_apache')
+        server_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+        self._create_software_deployment(config_id=other['id'],
+                                         server_id=server_ids[0])
+        pmsd.reset_mock()
+
+        deployments = self.engine.create_software_deployments(
+            self.ctx, config['id'],
+            [{'server_id': server_id, 'input_values': {'mode': server_id}}
+             for server_id in server_ids],
+            'INIT', 'COMPLETE', '', None)
+        self.assertEqual(2, len(deployments))
+        for deployment, server_id in zip(deployments, server_ids):
+            self.assertEqual(server_id, deployment['server_id'])
+            self.assertEqual(config['id'], deployment['config_id'])
+            self.assertEqual({'mode': server_id}, deployment['input_values'])
+
+        # the metadata of every server is pushed at once, including the
+        # configs already deployed to it
+        self.assertFalse(pmsd.called)
+        self.assertEqual(1, pmsd_all.call_count)
+        pushed = pmsd_all.call_args[0][1]
+        self.assertEqual(set(server_ids), set(pushed))
+        self.assertEqual(['config_apache', 'config_heat'],
+                         [md['name'] for md in pushed[server_ids[0]]])
+        self.assertEqual(['config_heat'],
+                         [md['name'] for md in pushed[server_ids[1]]])
+
+    def test_create_software_deployments_metadata(self):
+        t = template_format.parse(tools.wp_template)
+        stack = utils.parse_stack(t, stack_name='test_create_deployments')
+
+        tools.setup_mocks(self.m, stack)
+        self.m.ReplayAll()
+        stack.store()
+        stack.create()
+        server_id = stack['WebServer'].resource_id
+        config = self._create_software_config()
+
+        self.engine.create_software_deployments(
+            self.ctx, config['id'],
+            [{'server_id': server_id}, {'server_id': str(uuid.uuid4())}],
+            'INIT', 'COMPLETE', '', None)
+
+        rs = resource_objects.Resource.get_by_physical_resource_id(
+            self.ctx, server_id)
+        self.assertEqual([config['id']],
+                         [md['id'] for md in
+                          rs.rsrc_metadata.get('deployments')])
+
+    def test_create_software_deployments_no_server(self):
+        config = self._create_software_config()
+        self.assertRaises(ValueError,
+                          self.engine.create_software_deployments,
+                          self.ctx, config['id'], [{}],
+                          'INIT', 'COMPLETE', '', None)
+
     @mock.patch.object(service_software_config.SoftwareConfigService,
                        '_refresh_software_deployment')
     def test_show_software_deployment_refresh(
@@ -528,9 +638,9 @@ class SoftwareConfigServiceTest(common.HeatTestCase):
                        'metadata_software_deployments')
     @mock.patch.object(service_software_config.resource_object.Resource,
                        'get_by_physical_resource_id')
-    @mock.patch.object(service_software_config.requests, 'put')
+    @mock.patch.object(service_software_config.requests, 'Session')
     def test_push_metadata_software_deployments_temp_url(
-            self, put, res_get, md_sd):
+            self, session, res_get, md_sd):
         rs = mock.Mock()
         rs.rsrc_metadata = {'original': 'metadata'}
         rd = mock.Mock()
@@ -552,9 +662,74 @@ class SoftwareConfigServiceTest(common.HeatTestCase):
         rs.update_and_save.assert_called_once_with(
             {'rsrc_metadata': result_metadata})
 
+        self.engine.software_config.tg.wait()
+        put = session.return_value.put
         put.assert_called_once_with(
             'http://192.168.2.2/foo/bar', json.dumps(result_metadata))
 
+    @mock.patch.object(service_software_config.resource_object.Resource,
+                       'update_all_by_id')
+    @mock.patch.object(service_software_config.resource_object.Resource,
+                       'get_all_by_physical_resource_ids')
+    @mock.patch.object(service_software_config.requests, 'Session')
+    def test_push_metadata_software_deployments_all(
+            self, session, res_get_all, update_all):
+        rs1 = mock.Mock(id=1, stack_id='stack1', data=[],
+                        rsrc_metadata={'original': 'metadata'})
+        rd = mock.Mock(key='metadata_put_url',
+                       value='http://192.168.2.2/foo/bar')
+        rs2 = mock.Mock(id=2, stack_id='stack1', data=[rd],
+                        rsrc_metadata=None)
+        res_get_all.return_value = {'1234': rs1, '5678': rs2}
+
+        self.engine.software_config._push_metadata_software_deployments_all(
+            self.ctx, {'1234': [{'deploy': 'this'}],
+                       '5678': [{'deploy': 'that'}],
+                       'gone': [{'deploy': 'nowhere'}]})
+
+        self.assertEqual(1, res_get_all.call_count)
+        self.assertEqual(set(['1234', '5678', 'gone']),
+                         set(res_get_all.call_args[0][1]))
+        update_all.assert_called_once_with(self.ctx, 'stack1', {
+            1: {'rsrc_metadata': {'original': 'metadata',
+                                  'deployments': [{'deploy': 'this'}]}},
+            2: {'rsrc_metadata': {'deployments': [{'deploy': 'that'}]}}})
+        self.assertFalse(rs1.update_and_save.called)
+
+        self.engine.software_config.tg.wait()
+        put = session.return_value.put
+        put.assert_called_once_with(
+            'http://192.168.2.2/foo/bar',
+            json.dumps({'deployments': [{'deploy': 'that'}]}))
+
+    @mock.patch.object(service_software_config.requests, 'Session')
+    def test_metadata_pushes_coalesced(self, session):
+        put = session.return_value.put
+        sc = self.engine.software_config
+        sc._queue_metadata_push('http://192.0.2.1/a', '{"v": 1}')
+        sc._queue_metadata_push('http://192.0.2.1/a', '{"v": 2}')
+        sc._queue_metadata_push('http://192.0.2.1/b', '{"v": 1}')
+        sc.tg.wait()
+
+        self.assertEqual([mock.call('http://192.0.2.1/a', '{"v": 2}'),
+                          mock.call('http://192.0.2.1/b', '{"v": 1}')],
+                         put.call_args_list)
+        self.assertEqual(0, sc._push_workers)
+        self.assertEqual({}, sc._metadata_pushes)
+
+    @mock.patch.object(service_software_config.eventlet, 'sleep')
+    @mock.patch.object(service_software_config.requests, 'Session')
+    def test_metadata_push_retried(self, session, sleep):
+        cfg.CONF.set_override('software_deployment_push_retries', 2)
+        put = session.return_value.put
+        put.side_effect = [Exception('boom'), mock.Mock()]
+        sc = self.engine.software_config
+        sc._queue_metadata_push('http://192.0.2.1/a', '{"v": 1}')
+        sc.tg.wait()
+
+        self.assertEqual(2, put.call_count)
+        self.assertEqual(1, sleep.call_count)
+
     @mock.patch.object(service_software_config.SoftwareConfigService,
                        'signal_software_deployment')
     @mock.patch.object(swift.SwiftClientPlugin, '_create')
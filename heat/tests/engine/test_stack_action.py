@@ -31,6 +31,7 @@ class StackServiceActionsTest(common.HeatTestCase):
         self.ctx = utils.dummy_context()
         self.man = service.EngineService('a-host', 'a-topic')
         self.man.create_periodic_tasks()
+        self.addCleanup(self.man.stack_watch.stop)
 
     @mock.patch.object(stack.Stack, 'load')
     @mock.patch.object(service.ThreadGroupManager, 'start')
@@ -35,6 +35,7 @@ class SnapshotServiceTest(common.HeatTestCase):
 
         self.engine = service.EngineService('a-host', 'a-topic')
         self.engine.create_periodic_tasks()
+        self.addCleanup(self.engine.stack_watch.stop)
         utils.setup_dummy_db()
 
     def _create_stack(self, stack_name):
@@ -1180,13 +1180,14 @@ class CfnStackControllerTest(common.HeatTestCase):
 
         kwargs = {'stack_identity': identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': True}
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
             dummy_req.context, ('identify_stack', {'stack_name': stack_name})
         ).AndReturn(identity)
         rpc_client.EngineClient.call(
-            dummy_req.context, ('list_events', kwargs)
+            dummy_req.context, ('list_events', kwargs), version='1.10'
         ).AndReturn(engine_resp)
 
         self.m.ReplayAll()
@@ -1318,6 +1319,50 @@ class CfnStackControllerTest(common.HeatTestCase):
 
         self.assertEqual(expected, response)
 
+    def test_describe_stack_resource_stack_user(self):
+        # Format a dummy request
+        stack_name = "wordpress"
+        identity = dict(identifier.HeatIdentifier('t', stack_name, '6'))
+        params = {'Action': 'DescribeStackResource',
+                  'StackName': stack_name,
+                  'LogicalResourceId': "WikiDatabase"}
+        dummy_req = self._dummy_GET_request(params)
+        dummy_req.context.roles = [cfg.CONF.heat_stack_user_role]
+        self._stub_enforce(dummy_req, 'DescribeStackResource')
+
+        # Stub out the RPC call to the engine with a pre-canned response
+        engine_resp = {u'etag': u'0123abcd',
+                       u'metadata': {u'wordpress': []}}
+
+        self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
+        rpc_client.EngineClient.call(
+            dummy_req.context, ('identify_stack', {'stack_name': stack_name})
+        ).AndReturn(identity)
+        args = {
+            'stack_identity': identity,
+            'resource_name': dummy_req.params.get('LogicalResourceId'),
+            'etag': None,
+        }
+        rpc_client.EngineClient.call(
+            dummy_req.context, ('describe_resource_metadata', args),
+            version='1.11'
+        ).AndReturn(engine_resp)
+
+        self.m.ReplayAll()
+
+        response = self.controller.describe_stack_resource(dummy_req)
+
+        expected = {'DescribeStackResourceResponse':
+                    {'DescribeStackResourceResult':
+                     {'StackResourceDetail':
+                      {'StackId': u'arn:openstack:heat::t:stacks/wordpress/6',
+                       'StackName': u'wordpress',
+                       'Metadata': {u'wordpress': []},
+                       'LogicalResourceId': u'WikiDatabase'}}}}
+
+        self.assertEqual(expected, response)
+        self.m.VerifyAll()
+
     def test_describe_stack_resource_nonexistent_stack(self):
         # Format a dummy request
         stack_name = "wibble"
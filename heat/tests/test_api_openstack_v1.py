@@ -2597,33 +2597,20 @@ class ResourceControllerTest(ControllerTest, common.HeatTestCase):
         res_name = 'WikiDatabase'
         stack_identity = identifier.HeatIdentifier(self.tenant,
                                                    'wordpress', '6')
-        res_identity = identifier.ResourceIdentifier(resource_name=res_name,
-                                                     **stack_identity)
 
         req = self._get(stack_identity._tenant_path())
 
         engine_resp = {
-            u'description': u'',
-            u'resource_identity': dict(res_identity),
-            u'stack_name': stack_identity.stack_name,
-            u'resource_name': res_name,
-            u'resource_status_reason': None,
-            u'updated_time': u'2012-07-23T13:06:00Z',
-            u'stack_identity': dict(stack_identity),
-            u'resource_action': u'CREATE',
-            u'resource_status': u'COMPLETE',
-            u'physical_resource_id':
-            u'a3455d8c-9f88-404d-a85b-5315293e67de',
-            u'resource_type': u'AWS::EC2::Instance',
+            u'etag': u'abc123',
             u'metadata': {u'ensureRunning': u'true'}
         }
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
             req.context,
-            ('describe_stack_resource',
+            ('describe_resource_metadata',
              {'stack_identity': stack_identity, 'resource_name': res_name,
-              'with_attr': None}),
-            version='1.2'
+              'etag': None}),
+            version='1.11'
         ).AndReturn(engine_resp)
         self.m.ReplayAll()
 
@@ -2632,11 +2619,50 @@ class ResourceControllerTest(ControllerTest, common.HeatTestCase):
                                           stack_id=stack_identity.stack_id,
                                           resource_name=res_name)
 
-        expected = {'metadata': {u'ensureRunning': u'true'}}
+        expected = {'etag': u'abc123',
+                    'metadata': {u'ensureRunning': u'true'}}
 
         self.assertEqual(expected, result)
         self.m.VerifyAll()
 
+    def test_metadata_show_not_modified(self, mock_enforce):
+        self._mock_enforce_setup(mock_enforce, 'metadata', True)
+        res_name = 'WikiDatabase'
+        stack_identity = identifier.HeatIdentifier(self.tenant,
+                                                   'wordpress', '6')
+        res_identity = identifier.ResourceIdentifier(resource_name=res_name,
+                                                     **stack_identity)
+
+        req = self._get(res_identity._tenant_path() + '/metadata')
+        req.headers['If-None-Match'] = '"abc123"'
+
+        self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
+        rpc_client.EngineClient.call(
+            req.context,
+            ('describe_resource_metadata',
+             {'stack_identity': stack_identity, 'resource_name': res_name,
+              'etag': 'abc123'}),
+            version='1.11'
+        ).AndReturn({u'etag': u'abc123'})
+        self.m.ReplayAll()
+
+        ex = self.assertRaises(webob.exc.HTTPNotModified,
+                               self.controller.metadata,
+                               req, tenant_id=self.tenant,
+                               stack_name=stack_identity.stack_name,
+                               stack_id=stack_identity.stack_id,
+                               resource_name=res_name)
+        self.assertEqual('"abc123"', ex.headers['ETag'])
+        self.m.VerifyAll()
+
+    def test_metadata_serializer(self, mock_enforce):
+        response = webob.Response()
+        resources.ResourceSerializer().metadata(
+            response, {'etag': 'abc123', 'metadata': {'foo': 'bar'}})
+        self.assertEqual('abc123', response.etag)
+        self.assertEqual({'metadata': {'foo': 'bar'}},
+                         json.loads(response.body))
+
     def test_metadata_show_nonexist(self, mock_enforce):
         self._mock_enforce_setup(mock_enforce, 'metadata', True)
         res_name = 'WikiDatabase'
@@ -2651,10 +2677,10 @@ class ResourceControllerTest(ControllerTest, common.HeatTestCase):
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
             req.context,
-            ('describe_stack_resource',
+            ('describe_resource_metadata',
              {'stack_identity': stack_identity, 'resource_name': res_name,
-              'with_attr': None}),
-            version='1.2'
+              'etag': None}),
+            version='1.11'
         ).AndRaise(to_remote_error(error))
         self.m.ReplayAll()
 
@@ -2683,10 +2709,10 @@ class ResourceControllerTest(ControllerTest, common.HeatTestCase):
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
             req.context,
-            ('describe_stack_resource',
+            ('describe_resource_metadata',
              {'stack_identity': stack_identity, 'resource_name': res_name,
-              'with_attr': None}),
-            version='1.2'
+              'etag': None}),
+            version='1.11'
         ).AndRaise(to_remote_error(error))
         self.m.ReplayAll()
 
@@ -2787,7 +2813,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         kwargs = {'stack_identity': stack_identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': False}
 
         engine_resp = [
             {
@@ -2820,7 +2847,7 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
         ]
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
-            req.context, ('list_events', kwargs)
+            req.context, ('list_events', kwargs), version='1.10'
         ).AndReturn(engine_resp)
         self.m.ReplayAll()
 
@@ -2872,7 +2899,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         kwargs = {'stack_identity': stack_identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': False}
 
         engine_resp = [
             {
@@ -2892,7 +2920,7 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
             req.context,
-            ('list_events', kwargs)
+            ('list_events', kwargs), version='1.10'
         ).AndReturn(engine_resp)
         self.m.ReplayAll()
 
@@ -2931,13 +2959,14 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         kwargs = {'stack_identity': stack_identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': False}
 
         error = heat_exc.StackNotFound(stack_name='a')
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
             req.context,
-            ('list_events', kwargs)
+            ('list_events', kwargs), version='1.10'
         ).AndRaise(to_remote_error(error))
         self.m.ReplayAll()
 
@@ -2982,7 +3011,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         kwargs = {'stack_identity': stack_identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': False}
 
         engine_resp = [
             {
@@ -3002,7 +3032,7 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
             req.context,
-            ('list_events', kwargs)
+            ('list_events', kwargs), version='1.10'
         ).AndReturn(engine_resp)
         self.m.ReplayAll()
 
@@ -3038,7 +3068,7 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         rpc_call_args, _ = mock_call.call_args
         engine_args = rpc_call_args[1][1]
-        self.assertEqual(6, len(engine_args))
+        self.assertEqual(7, len(engine_args))
         self.assertIn('limit', engine_args)
         self.assertEqual(10, engine_args['limit'])
         self.assertIn('sort_keys', engine_args)
@@ -3049,6 +3079,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
         self.assertEqual('fake sort dir', engine_args['sort_dir'])
         self.assertIn('filters', engine_args)
         self.assertIsNone(engine_args['filters'])
+        self.assertIn('include_properties', engine_args)
+        self.assertFalse(engine_args['include_properties'])
         self.assertNotIn('balrog', engine_args)
 
     @mock.patch.object(rpc_client.EngineClient, 'call')
@@ -3129,7 +3161,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         kwargs = {'stack_identity': stack_identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': True}
 
         engine_resp = [
             {
@@ -3163,7 +3196,7 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
             req.context,
-            ('list_events', kwargs)
+            ('list_events', kwargs), version='1.10'
         ).AndReturn(engine_resp)
         self.m.ReplayAll()
 
@@ -3219,7 +3252,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         kwargs = {'stack_identity': stack_identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': True}
 
         engine_resp = [
             {
@@ -3238,7 +3272,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
         ]
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
-            req.context, ('list_events', kwargs)).AndReturn(engine_resp)
+            req.context, ('list_events', kwargs),
+            version='1.10').AndReturn(engine_resp)
         self.m.ReplayAll()
 
         self.assertRaises(webob.exc.HTTPNotFound,
@@ -3265,7 +3300,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         kwargs = {'stack_identity': stack_identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': True}
 
         engine_resp = [
             {
@@ -3284,7 +3320,8 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
         ]
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
-            req.context, ('list_events', kwargs)).AndReturn(engine_resp)
+            req.context, ('list_events', kwargs),
+            version='1.10').AndReturn(engine_resp)
         self.m.ReplayAll()
 
         self.assertRaises(webob.exc.HTTPNotFound,
@@ -3307,12 +3344,13 @@ class EventControllerTest(ControllerTest, common.HeatTestCase):
 
         kwargs = {'stack_identity': stack_identity,
                   'limit': None, 'sort_keys': None, 'marker': None,
-                  'sort_dir': None, 'filters': None}
+                  'sort_dir': None, 'filters': None,
+                  'include_properties': True}
 
         error = heat_exc.StackNotFound(stack_name='a')
         self.m.StubOutWithMock(rpc_client.EngineClient, 'call')
         rpc_client.EngineClient.call(
-            req.context, ('list_events', kwargs)
+            req.context, ('list_events', kwargs), version='1.10'
         ).AndRaise(to_remote_error(error))
         self.m.ReplayAll()
 
@@ -3780,6 +3818,15 @@ class RoutesTest(common.HeatTestCase):
             {
                 'tenant_id': 'aaaa'
             })
+        self.assertRoute(
+            self.m,
+            '/aaaa/software_deployments/bulk',
+            'POST',
+            'create_bulk',
+            'SoftwareDeploymentController',
+            {
+                'tenant_id': 'aaaa'
+            })
         self.assertRoute(
             self.m,
             '/aaaa/software_deployments/bbbb',
@@ -4291,6 +4338,49 @@ class SoftwareDeploymentControllerTest(ControllerTest, common.HeatTestCase):
             whitelist = mock_call.call_args[1]
             self.assertEqual({'server_id': server_id}, whitelist)
 
+    @mock.patch.object(policy.Enforcer, 'enforce')
+    def test_metadata(self, mock_enforce):
+        self._mock_enforce_setup(mock_enforce, 'metadata')
+        server_id = 'fb322564-7927-473d-8aad-68ae7fbf2abf'
+        req = self._get('/software_deployments/metadata/%s' % server_id)
+        return_value = {'etag': 'abc123', 'metadata': [{'name': 'foo'}]}
+        with mock.patch.object(
+                self.controller.rpc_client,
+                'poll_metadata_software_deployments',
+                return_value=return_value) as mock_call:
+            resp = self.controller.metadata(
+                req, server_id=server_id, tenant_id=self.tenant)
+            self.assertEqual(return_value, resp)
+            mock_call.assert_called_once_with(
+                req.context, server_id=server_id, etag=None, timeout=0)
+
+    @mock.patch.object(policy.Enforcer, 'enforce')
+    def test_metadata_not_modified(self, mock_enforce):
+        self._mock_enforce_setup(mock_enforce, 'metadata')
+        server_id = 'fb322564-7927-473d-8aad-68ae7fbf2abf'
+        req = self._get('/software_deployments/metadata/%s' % server_id,
+                        {'timeout': '20'})
+        req.headers['If-None-Match'] = '"abc123"'
+        with mock.patch.object(
+                self.controller.rpc_client,
+                'poll_metadata_software_deployments',
+                return_value={'etag': 'abc123'}) as mock_call:
+            ex = self.assertRaises(webob.exc.HTTPNotModified,
+                                   self.controller.metadata,
+                                   req, server_id=server_id,
+                                   tenant_id=self.tenant)
+            self.assertEqual('"abc123"', ex.headers['ETag'])
+            mock_call.assert_called_once_with(
+                req.context, server_id=server_id, etag='abc123', timeout=20)
+
+    def test_metadata_serializer(self):
+        response = webob.Response()
+        software_deployments.SoftwareDeploymentSerializer().metadata(
+            response, {'etag': 'abc123', 'metadata': [{'name': 'foo'}]})
+        self.assertEqual('abc123', response.etag)
+        self.assertEqual({'metadata': [{'name': 'foo'}]},
+                         json.loads(response.body))
+
     @mock.patch.object(policy.Enforcer, 'enforce')
     def test_show(self, mock_enforce):
         self._mock_enforce_setup(mock_enforce, 'show')
@@ -4367,6 +4457,37 @@ class SoftwareDeploymentControllerTest(ControllerTest, common.HeatTestCase):
                 req, body=body, tenant_id=self.tenant)
             self.assertEqual(expected, resp)
 
+    @mock.patch.object(policy.Enforcer, 'enforce')
+    def test_create_bulk(self, mock_enforce):
+        self._mock_enforce_setup(mock_enforce, 'create_bulk')
+        config_id = 'd00ba4aa-db33-42e1-92f4-2a6469260107'
+        server_ids = ['fb322564-7927-473d-8aad-68ae7fbf2abf',
+                      '5f7f08de-4d2c-4b83-b8c6-bd1e6b5a6cb7']
+        deployments = [{'server_id': server_id, 'input_values': {}}
+                       for server_id in server_ids]
+        body = {
+            'action': 'INIT',
+            'status': 'COMPLETE',
+            'status_reason': None,
+            'config_id': config_id,
+            'deployments': deployments}
+        return_value = [dict(d, id=str(i), config_id=config_id)
+                        for i, d in enumerate(deployments)]
+        req = self._post('/software_deployments/bulk', json.dumps(body))
+
+        expected = {'software_deployments': return_value}
+        with mock.patch.object(
+                self.controller.rpc_client,
+                'create_software_deployments',
+                return_value=return_value) as mock_call:
+            resp = self.controller.create_bulk(
+                req, body=body, tenant_id=self.tenant)
+            self.assertEqual(expected, resp)
+            mock_call.assert_called_once_with(
+                req.context, deployments=deployments, config_id=config_id,
+                action='INIT', status='COMPLETE', status_reason=None,
+                stack_user_project_id=None)
+
     @mock.patch.object(policy.Enforcer, 'enforce')
     def test_update(self, mock_enforce):
         self._mock_enforce_setup(mock_enforce, 'update')
@@ -0,0 +1,73 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from heat.common import lru
+from heat.tests import common
+
+
+class LRUCacheTest(common.HeatTestCase):
+
+    def setUp(self):
+        super(LRUCacheTest, self).setUp()
+        self.now = 1000.0
+        self.patchobject(lru.time, 'time', side_effect=lambda: self.now)
+
+    def test_evict_least_recently_used(self):
+        cache = lru.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_expire(self):
+        cache = lru.LRUCache(10, ttl=60)
+        cache.set('a', 1)
+        self.now += 59
+        self.assertEqual(1, cache.get('a'))
+        self.now += 1
+        self.assertEqual('gone', cache.get('a', 'gone'))
+        self.assertEqual(0, len(cache))
+
+    def test_no_ttl(self):
+        cache = lru.LRUCache(10)
+        cache.set('a', 1)
+        self.now += 10 ** 6
+        self.assertEqual(1, cache.get('a'))
+
+    def test_settings_callable(self):
+        settings = {'size': 1, 'ttl': 5}
+        cache = lru.LRUCache(lambda: settings['size'],
+                             ttl=lambda: settings['ttl'])
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertIsNone(cache.get('a'))
+        self.now += 5
+        self.assertIsNone(cache.get('b'))
+
+        settings['size'] = 0
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(0, len(cache))
+
+    def test_clear(self):
+        cache = lru.LRUCache(10)
+        cache.set('a', mock.sentinel.value)
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
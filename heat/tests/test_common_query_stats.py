@@ -0,0 +1,103 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_config import cfg
+import sqlalchemy
+
+from heat.common import context
+from heat.common import query_stats
+from heat.db import api as db_api
+from heat.tests import common
+from heat.tests import utils
+
+
+class QueryStatsTest(common.HeatTestCase):
+
+    def setUp(self):
+        super(QueryStatsTest, self).setUp()
+        self.ctx = utils.dummy_context()
+        query_stats._counters.clear()
+        self.addCleanup(query_stats._counters.clear)
+
+    def test_collect(self):
+        with query_stats.collect('outer') as stats:
+            db_api.stack_get_all(self.ctx)
+            with query_stats.collect('inner') as inner:
+                db_api.stack_count_all(self.ctx)
+            self.assertIs(stats, inner)
+        self.assertEqual('outer', stats.name)
+        # each query is preceded by the ping of the connection checked out
+        self.assertEqual(4, stats.count)
+        self.assertEqual(4, len(stats.slowest))
+        self.assertFalse(query_stats.active())
+
+        # nothing is recorded outside of a block
+        db_api.stack_get_all(self.ctx)
+        self.assertEqual(4, stats.count)
+
+    def test_collect_failed_statement(self):
+        conn = db_api.get_engine().connect()
+        self.addCleanup(conn.close)
+        with query_stats.collect('test') as stats:
+            self.assertRaises(sqlalchemy.exc.OperationalError, conn.execute,
+                              'SELECT * FROM no_such_table')
+            conn.execute('SELECT 1')
+        self.assertEqual(['SELECT 1'],
+                         [statement for t, statement in stats.slowest])
+
+    def test_slowest(self):
+        stats = query_stats.QueryStats('test')
+        for i in range(query_stats.SLOWEST_STATEMENTS + 2):
+            stats.record('SELECT %d' % i, i)
+        self.assertEqual(query_stats.SLOWEST_STATEMENTS + 2, stats.count)
+        self.assertEqual([(6, 'SELECT 6'), (5, 'SELECT 5'), (4, 'SELECT 4'),
+                          (3, 'SELECT 3'), (2, 'SELECT 2')], stats.slowest)
+
+    def test_rpc_call_disabled(self):
+        with query_stats.rpc_call('list_stacks'):
+            self.assertFalse(query_stats.active())
+        self.assertEqual({}, query_stats.counters())
+
+    def test_rpc_call(self):
+        cfg.CONF.set_override('db_query_stats', True)
+        for i in range(2):
+            with query_stats.rpc_call('list_stacks'):
+                db_api.stack_get_all(self.ctx)
+        counters = query_stats.counters()
+        self.assertEqual(['list_stacks'], list(counters))
+        self.assertEqual(2, counters['list_stacks']['calls'])
+        self.assertEqual(4, counters['list_stacks']['statements'])
+        self.assertEqual(0, counters['list_stacks']['over_threshold'])
+
+    def test_rpc_call_over_threshold(self):
+        cfg.CONF.set_override('db_query_stats', True)
+        cfg.CONF.set_override('db_query_log_threshold', 1)
+        with mock.patch.object(query_stats.LOG, 'warn') as warn:
+            with query_stats.rpc_call('list_stacks'):
+                db_api.stack_get_all(self.ctx)
+                db_api.stack_count_all(self.ctx)
+        self.assertEqual(1, warn.call_count)
+        self.assertEqual(
+            1, query_stats.counters()['list_stacks']['over_threshold'])
+
+    def test_request_context(self):
+        cfg.CONF.set_override('db_query_stats', True)
+
+        class Service(object):
+            @context.request_context
+            def count_stacks(self, cnxt):
+                return db_api.stack_count_all(cnxt)
+
+        Service().count_stacks(self.ctx)
+        self.assertEqual(1, query_stats.counters()['count_stacks']['calls'])
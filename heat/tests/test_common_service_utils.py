@@ -30,6 +30,7 @@ class TestServiceUtils(common.HeatTestCase):
         service.hostname = 'host.devstack.org'
         service.host = 'engine-1'
         service.report_interval = 60
+        service.load_stats = {'active_stacks': 1}
         service.topic = 'engine'
         service.created_at = datetime.datetime.utcnow()
         service.deleted_at = None
@@ -44,6 +45,7 @@ class TestServiceUtils(common.HeatTestCase):
         self.assertEqual(service_dict['topic'], service.topic)
         self.assertEqual(service_dict['report_interval'],
                          service.report_interval)
+        self.assertEqual(service_dict['load_stats'], service.load_stats)
         self.assertEqual(service_dict['created_at'], service.created_at)
         self.assertEqual(service_dict['updated_at'], service.updated_at)
         self.assertEqual(service_dict['deleted_at'], service.deleted_at)
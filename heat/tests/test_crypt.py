@@ -0,0 +1,96 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_config import cfg
+
+from heat.common import crypt
+from heat.common import exception
+from heat.common import lru
+from heat.tests import common
+
+
+class CryptTest(common.HeatTestCase):
+
+    def setUp(self):
+        super(CryptTest, self).setUp()
+        crypt.decrypted_cache.clear()
+        self.addCleanup(crypt.decrypted_cache.clear)
+
+    def test_encrypt_decrypt(self):
+        method, data = crypt.encrypt(b'secret')
+        self.assertEqual('oslo_decrypt_v1', method)
+        self.assertEqual(b'secret', crypt.decrypt(method, data))
+        self.assertEqual(0, len(crypt.decrypted_cache))
+
+    def test_decrypt_none(self):
+        self.assertIsNone(crypt.decrypt(None, 'foo', 1))
+        self.assertIsNone(crypt.decrypt('oslo_decrypt_v1', None, 1))
+
+    def test_decrypt_cached(self):
+        method, data = crypt.encrypt(b'secret')
+        decrypt = mock.Mock(wraps=crypt.oslo_decrypt_v1)
+        with mock.patch.dict(crypt.DECRYPT_METHODS,
+                             {'oslo_decrypt_v1': decrypt}):
+            self.assertEqual(b'secret', crypt.decrypt(method, data, 1))
+            self.assertEqual(b'secret', crypt.decrypt(method, data, 1))
+            self.assertEqual(1, decrypt.call_count)
+
+            # a new ciphertext for the same row is decrypted again
+            method, data = crypt.encrypt(b'other')
+            self.assertEqual(b'other', crypt.decrypt(method, data, 1))
+            self.assertEqual(2, decrypt.call_count)
+
+    def test_decrypt_all(self):
+        items = [crypt.encrypt(v) + (i,)
+                 for i, v in enumerate([b'a', b'b', b'c'])]
+        items.append((None, None, 3))
+        self.assertEqual([b'a', b'b', b'c', None], crypt.decrypt_all(items))
+        self.assertEqual(3, len(crypt.decrypted_cache))
+
+    def test_cache_bounded(self):
+        cfg.CONF.set_override('decrypted_cache_size', 2)
+        items = [crypt.encrypt(v) + (i,)
+                 for i, v in enumerate([b'a', b'b', b'c'])]
+        crypt.decrypt_all(items)
+        self.assertEqual(2, len(crypt.decrypted_cache))
+        method, data, cache_id = items[0]
+        key = crypt._cache_key(method, cache_id, data)
+        self.assertIsNone(crypt.decrypted_cache.get(key))
+
+    def test_cache_disabled(self):
+        cfg.CONF.set_override('decrypted_cache_size', 0)
+        method, data = crypt.encrypt(b'secret')
+        self.assertEqual(b'secret', crypt.decrypt(method, data, 1))
+        self.assertEqual(0, len(crypt.decrypted_cache))
+
+    def test_cache_disabled_ttl(self):
+        cfg.CONF.set_override('decrypted_cache_ttl', 0)
+        method, data = crypt.encrypt(b'secret')
+        self.assertEqual(b'secret', crypt.decrypt(method, data, 1))
+        self.assertEqual(0, len(crypt.decrypted_cache))
+
+    @mock.patch.object(lru.time, 'time')
+    def test_cache_expired(self, mock_time):
+        cfg.CONF.set_override('decrypted_cache_ttl', 60)
+        mock_time.return_value = 1000.0
+        method, data = crypt.encrypt(b'secret')
+        crypt.decrypt(method, data, 1)
+        key = crypt._cache_key(method, data=data, cache_id=1)
+        self.assertEqual(b'secret', crypt.decrypted_cache.get(key))
+
+        mock_time.return_value = 1060.0
+        self.assertIsNone(crypt.decrypted_cache.get(key))
+
+    def test_decrypt_unknown_method(self):
+        self.assertRaises(exception.Error, crypt.decrypt, 'globals', 'foo')
@@ -266,6 +266,13 @@ class FormatTest(common.HeatTestCase):
             event_id_formatted['path'])
         self.assertEqual(event_id, event_identifier.event_id)
 
+    def test_format_event_without_properties(self):
+        event = self._dummy_event('abc123yc-9f88-404d-a85b-531529456xyz')
+
+        formatted = api.format_event(event, include_properties=False)
+        self.assertNotIn(rpc_api.EVENT_RES_PROPERTIES, formatted)
+        self.assertEqual('generic1', formatted[rpc_api.EVENT_RES_NAME])
+
     @mock.patch.object(api, 'format_stack_resource')
     def test_format_stack_preview(self, mock_fmt_resource):
         def mock_format_resources(res, **kwargs):
@@ -11,7 +11,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import datetime
+import time
 import uuid
 
 import eventlet
@@ -26,11 +28,14 @@ import six
 from heat.common import context
 from heat.common import exception
 from heat.common import identifier
+from heat.common import lru
 from heat.common import messaging
 from heat.common import service_utils
 from heat.common import template_format
 from heat.engine import dependencies
 from heat.engine import environment
+from heat.engine import notification
+from heat.engine.notification import stack as stack_notification
 from heat.engine import properties
 from heat.engine import resource as res
 from heat.engine.resources.aws.ec2 import instance as instances
@@ -563,6 +568,7 @@ class StackServiceCreateUpdateDeleteTest(common.HeatTestCase):
         self.ctx = utils.dummy_context()
         self.man = service.EngineService('a-host', 'a-topic')
         self.man.create_periodic_tasks()
+        self.addCleanup(self.man.stack_watch.stop)
 
     def _test_stack_create(self, stack_name):
         params = {'foo': 'bar'}
@@ -1637,6 +1643,7 @@ class StackConvergenceServiceCreateUpdateTest(common.HeatTestCase):
         self.ctx = utils.dummy_context()
         self.man = service.EngineService('a-host', 'a-topic')
         self.man.create_periodic_tasks()
+        self.addCleanup(self.man.stack_watch.stop)
 
     def _stub_update_mocks(self, stack_to_load, stack_to_return):
         self.m.StubOutWithMock(parser, 'Stack')
@@ -1838,6 +1845,7 @@ class StackServiceTest(common.HeatTestCase):
         self.ctx = utils.dummy_context(tenant_id='stack_service_test_tenant')
         self.eng = service.EngineService('a-host', 'a-topic')
         self.eng.create_periodic_tasks()
+        self.addCleanup(self.eng.stack_watch.stop)
         self.eng.engine_id = 'engine-fake-uuid'
         cfg.CONF.set_default('heat_stack_user_role', 'stack_user_role')
         res._register_class('ResourceWithPropsType',
@@ -1845,31 +1853,22 @@ class StackServiceTest(common.HeatTestCase):
 
     def test_make_sure_rpc_version(self):
         self.assertEqual(
-            '1.9',
+            '1.13',
             service.EngineService.RPC_API_VERSION,
             ('RPC version is changed, please update this test to new version '
              'and make sure additional test cases are added for RPC APIs '
              'added in new version'))
 
-    @mock.patch.object(service_stack_watch.StackWatch, 'start_watch_task')
-    @mock.patch.object(stack_object.Stack, 'get_all')
-    @mock.patch.object(service.service.Service, 'start')
-    def test_start_watches_all_stacks(self, mock_super_start, mock_get_all,
-                                      start_watch_task):
-        s1 = mock.Mock(id=1)
-        s2 = mock.Mock(id=2)
-        mock_get_all.return_value = [s1, s2]
-        start_watch_task.return_value = None
-
+    @mock.patch.object(service_stack_watch.StackWatch, 'start')
+    def test_create_periodic_tasks_starts_stack_watch(self, mock_start):
         self.eng.thread_group_mgr = None
         self.eng.create_periodic_tasks()
 
-        mock_get_all.assert_called_once_with(mock.ANY, tenant_safe=False,
-                                             show_hidden=True)
-        calls = start_watch_task.call_args_list
-        self.assertEqual(2, start_watch_task.call_count)
-        self.assertIn(mock.call(1, mock.ANY), calls)
-        self.assertIn(mock.call(2, mock.ANY), calls)
+        self.assertIsNotNone(self.eng.thread_group_mgr)
+        self.assertEqual('engine-fake-uuid', self.eng.stack_watch.engine_id)
+        self.assertIs(self.eng.thread_group_mgr,
+                      self.eng.stack_watch.thread_group_mgr)
+        mock_start.assert_called_once_with(mock.ANY)
 
     @tools.stack_context('service_identify_test_stack', False)
     def test_stack_identify(self):
@@ -2122,7 +2121,8 @@ class StackServiceTest(common.HeatTestCase):
                                                     sort_keys=sort_keys,
                                                     marker=marker,
                                                     sort_dir=sort_dir,
-                                                    filters=filters)
+                                                    filters=filters,
+                                                    include_properties=True)
 
     @mock.patch.object(event_object.Event, 'get_all_by_tenant')
     def test_tenant_events_list_passes_marker_and_filters(
@@ -2141,7 +2141,18 @@ class StackServiceTest(common.HeatTestCase):
                                                            sort_keys=sort_keys,
                                                            marker=marker,
                                                            sort_dir=sort_dir,
-                                                           filters=filters)
+                                                           filters=filters,
+                                                           include_properties=(
+                                                               True))
+
+    @mock.patch.object(event_object.Event, 'get_all_by_tenant')
+    def test_tenant_events_list_without_properties(
+            self, mock_tenant_events_get_all):
+        mock_tenant_events_get_all.return_value = []
+        self.assertEqual([], self.eng.list_events(self.ctx, None,
+                                                  include_properties=False))
+        kwargs = mock_tenant_events_get_all.call_args[1]
+        self.assertFalse(kwargs['include_properties'])
 
     @tools.stack_context('service_list_all_test_stack')
     def test_stack_list_all(self):
@@ -2759,6 +2770,74 @@ class StackServiceTest(common.HeatTestCase):
 
         self.m.VerifyAll()
 
+    @tools.stack_context('service_resource_metadata_test_stack')
+    def test_describe_resource_metadata(self):
+        rsrc = self.stack['WebServer']
+        metadata = rsrc.metadata_get()
+        # the stack is not loaded to read the metadata
+        self.m.StubOutWithMock(parser.Stack, 'load')
+        self.m.ReplayAll()
+
+        res = self.eng.describe_resource_metadata(self.ctx,
+                                                  self.stack.identifier(),
+                                                  'WebServer')
+        self.assertEqual(metadata, res['metadata'])
+        etag = res['etag']
+
+        res = self.eng.describe_resource_metadata(self.ctx,
+                                                  self.stack.identifier(),
+                                                  'WebServer', etag=etag)
+        self.assertEqual({'etag': etag}, res)
+
+        rsrc.metadata_set({'foo': 'bar'})
+        res = self.eng.describe_resource_metadata(self.ctx,
+                                                  self.stack.identifier(),
+                                                  'WebServer', etag=etag)
+        self.assertEqual({'foo': 'bar'}, res['metadata'])
+        self.assertNotEqual(etag, res['etag'])
+
+        self.m.VerifyAll()
+
+    @tools.stack_context('service_resource_metadata_user_test_stack')
+    def test_describe_resource_metadata_stack_user(self):
+        self.ctx.roles = [cfg.CONF.heat_stack_user_role]
+        self.m.StubOutWithMock(service.EngineService, '_authorize_stack_user')
+        service.EngineService._authorize_stack_user(
+            self.ctx, mox.IgnoreArg(), 'WebServer').AndReturn(True)
+        service.EngineService._authorize_stack_user(
+            self.ctx, mox.IgnoreArg(), 'foo').AndReturn(False)
+        service.EngineService._authorize_stack_user(
+            self.ctx, mox.IgnoreArg(), 'WebServer').AndReturn(True)
+        service.EngineService._authorize_stack_user(
+            self.ctx, mox.IgnoreArg(), 'WebServer').AndReturn(True)
+        self.m.ReplayAll()
+        now = time.time()
+        self.patchobject(lru.time, 'time', side_effect=lambda: now)
+
+        # the access granted is remembered
+        for i in range(2):
+            res = self.eng.describe_resource_metadata(
+                self.ctx, self.stack.identifier(), 'WebServer')
+            self.assertIn('metadata', res)
+
+        ex = self.assertRaises(dispatcher.ExpectedException,
+                               self.eng.describe_resource_metadata,
+                               self.ctx, self.stack.identifier(), 'foo')
+        self.assertEqual(exception.Forbidden, ex.exc_info[0])
+
+        # until the state of the stack changes
+        self.stack.state_set(self.stack.UPDATE, self.stack.IN_PROGRESS,
+                             'test')
+        self.eng.describe_resource_metadata(
+            self.ctx, self.stack.identifier(), 'WebServer')
+
+        # or it expires
+        now += service.METADATA_ACCESS_CACHE_TTL
+        self.eng.describe_resource_metadata(
+            self.ctx, self.stack.identifier(), 'WebServer')
+
+        self.m.VerifyAll()
+
     @tools.stack_context('service_resources_describe_test_stack')
     def test_stack_resources_describe(self):
         self.m.StubOutWithMock(parser.Stack, 'load')
@@ -2869,6 +2948,16 @@ class StackServiceTest(common.HeatTestCase):
 
         self.m.VerifyAll()
 
+    @tools.stack_context('service_resources_list_budget_test_stack')
+    def test_stack_resources_list_query_budget(self):
+        with utils.query_budget(self, 13):
+            self.eng.list_stack_resources(self.ctx, self.stack.identifier())
+
+    @tools.stack_context('service_describe_budget_test_stack', False)
+    def test_stack_describe_query_budget(self):
+        with utils.query_budget(self, 9):
+            self.eng.show_stack(self.ctx, self.stack.identifier())
+
     @mock.patch.object(parser.Stack, 'load')
     @tools.stack_context('service_resources_list_test_stack_with_depth')
     def test_stack_resources_list_with_depth(self, mock_load):
@@ -2946,7 +3035,8 @@ class StackServiceTest(common.HeatTestCase):
                                         mox.IgnoreArg(),
                                         mox.IgnoreArg(),
                                         mox.IgnoreArg(),
-                                        mox.IgnoreArg()).AndReturn(None)
+                                        mox.IgnoreArg()).AndReturn(
+                                            tools.DummyThread())
 
         self.m.ReplayAll()
 
@@ -3040,6 +3130,119 @@ class StackServiceTest(common.HeatTestCase):
         self.m.VerifyAll()
         self.stack.delete()
 
+    def test_signal_queue_batched(self):
+        stack = tools.get_stack('signal_queue', self.ctx, policy_template)
+        self.stack = stack
+        tools.setup_keystone_mocks(self.m, stack)
+        self.m.ReplayAll()
+        stack.store()
+        stack.create()
+
+        signals = []
+
+        def record_signal(rsrc, details):
+            signals.append((rsrc.name, details))
+
+        with mock.patch.object(res.Resource, 'signal', autospec=True,
+                               side_effect=record_signal):
+            with mock.patch.object(parser.Stack, 'load',
+                                   wraps=parser.Stack.load) as mock_load:
+                # queued without yielding, as for a burst of signals
+                # arriving while the stack is being signalled
+                for i in range(3):
+                    self.eng._queue_signal(self.ctx, stack.id,
+                                           'WebServerScaleDownPolicy',
+                                           {'count': i})
+                self.eng.thread_group_mgr.groups[stack.id].wait()
+
+        self.assertEqual([('WebServerScaleDownPolicy', {'count': i})
+                          for i in range(3)], signals)
+        self.assertEqual(1, mock_load.call_count)
+        self.assertEqual({}, self.eng._signal_queues)
+        self.m.VerifyAll()
+
+    def test_signal_queue_single_not_delayed(self):
+        stack = tools.get_stack('signal_queue', self.ctx, policy_template)
+        self.stack = stack
+        tools.setup_keystone_mocks(self.m, stack)
+        self.m.ReplayAll()
+        stack.store()
+        stack.create()
+
+        with mock.patch.object(res.Resource, 'signal') as mock_signal:
+            with mock.patch.object(service.eventlet, 'sleep') as mock_sleep:
+                self.eng.resource_signal(self.ctx,
+                                         dict(self.stack.identifier()),
+                                         'WebServerScaleDownPolicy',
+                                         {'count': 0})
+                self.eng.thread_group_mgr.groups[stack.id].wait()
+
+        mock_signal.assert_called_once_with({'count': 0})
+        self.assertFalse(mock_sleep.called)
+        self.assertEqual({}, self.eng._signal_queues)
+        self.m.VerifyAll()
+
+    def test_signal_batch_not_callable(self):
+        stack = tools.get_stack('signal_batch', self.ctx, policy_template)
+        self.stack = stack
+        tools.setup_keystone_mocks(self.m, stack)
+        self.m.ReplayAll()
+        stack.store()
+        stack.create()
+
+        self.patchobject(res.Resource, 'signal', new=None)
+        mock_refresh = self.patchobject(self.eng, '_refresh_metadata')
+        mock_log = self.patchobject(service.LOG, 'exception')
+        self.eng._signal_batch(stack, [('WebServerScaleDownPolicy', {})])
+
+        self.assertFalse(mock_log.called)
+        self.assertFalse(mock_refresh.called)
+        self.m.VerifyAll()
+
+    def test_signal_queue_dropped_when_stopped(self):
+        with mock.patch.object(parser.Stack, 'load') as mock_load:
+            self.eng._queue_signal(self.ctx, 'stack-id', 'handle', {})
+            self.assertIn('stack-id', self.eng._signal_queues)
+            # the thread is killed before it gets to run
+            self.eng.thread_group_mgr.stop('stack-id')
+
+        self.assertFalse(mock_load.called)
+        self.assertEqual({}, self.eng._signal_queues)
+
+    def test_signal_instantiates_only_dependents(self):
+        res._register_class('GenericResourceType',
+                            generic_rsrc.GenericResource)
+        resources = dict(('other%d' % i, {'type': 'GenericResourceType'})
+                         for i in range(5))
+        resources.update({
+            'handle': {'type': 'GenericResourceType'},
+            'wait': {'type': 'GenericResourceType',
+                     'depends_on': 'handle'},
+            'server': {'type': 'GenericResourceType',
+                       'metadata': {'data': {'get_attr': ['wait', 'foo']}}}})
+        tpl = {'heat_template_version': '2013-05-23',
+               'resources': resources}
+        stack = parser.Stack(self.ctx, 'signal_dependents',
+                             templatem.Template(tpl))
+        stack.store()
+        stack.create()
+        stack = parser.Stack.load(self.ctx, stack_id=stack.id)
+
+        with mock.patch.object(res.Resource, 'signal') as mock_signal:
+            with mock.patch.object(res.Resource,
+                                   'metadata_update') as mock_update:
+                with mock.patch.object(resource_objects.Resource,
+                                       'get_all_by_stack') as mock_get_all:
+                    self.eng._signal_batch(stack, [('handle', {})])
+
+        mock_signal.assert_called_once_with({})
+        mock_update.assert_called_once_with()
+        # only the signalled resource and the one referring to it are
+        # created, and the rows of the others are not loaded
+        self.assertEqual(set(['handle', 'server']),
+                         set(r.name for r in stack.resources.loaded()))
+        self.assertFalse(mock_get_all.called)
+
     def test_signal_returns_metadata(self):
         stack = tools.get_stack('signal_reception', self.ctx, policy_template)
         self.stack = stack
@@ -3068,6 +3271,57 @@ class StackServiceTest(common.HeatTestCase):
         self.assertIsNone(md)
         self.m.VerifyAll()
 
+    def test_metadata_refresh_coalesced(self):
+        stack = mock.Mock(id='stack-id')
+        reloaded = mock.Mock(id='stack-id')
+        dependent = mock.Mock()
+        reloaded.metadata_dependents.return_value = [dependent]
+        waiters = []
+
+        def concurrent_signals(names):
+            # Refreshes requested while this one is running are deferred
+            waiters.append(eventlet.spawn(self.eng._refresh_metadata,
+                                          stack, ['handle2']))
+            waiters.append(eventlet.spawn(self.eng._refresh_metadata,
+                                          stack, ['handle3']))
+            eventlet.sleep(0)
+            self.assertFalse(any(w.dead for w in waiters))
+            return []
+
+        stack.metadata_dependents.side_effect = concurrent_signals
+
+        with mock.patch.object(parser.Stack, 'load',
+                               return_value=reloaded) as mock_load:
+            self.eng._refresh_metadata(stack, ['handle1'])
+
+        # the deferred callers only return once their refresh is done
+        for waiter in waiters:
+            waiter.wait()
+        stack.metadata_dependents.assert_called_once_with(set(['handle1']))
+        mock_load.assert_called_once_with(stack.context, stack_id='stack-id')
+        reloaded.metadata_dependents.assert_called_once_with(
+            set(['handle2', 'handle3']))
+        dependent.metadata_update.assert_called_once_with()
+        self.assertEqual({}, self.eng._metadata_refresh)
+
+    def test_metadata_refresh_failed(self):
+        stack = mock.Mock(id='stack-id')
+        dependent = mock.Mock()
+        dependent.metadata_update.side_effect = [exception.Error('boom'),
+                                                 None]
+        stack.metadata_dependents.return_value = [dependent]
+
+        self.assertRaises(exception.Error, self.eng._refresh_metadata,
+                          stack, ['handle1'])
+        self.assertEqual(set(['handle1']),
+                         self.eng._metadata_refresh['stack-id'].pending)
+
+        # the names of the failed refresh are refreshed with the next ones
+        self.eng._refresh_metadata(stack, ['handle2'])
+        stack.metadata_dependents.assert_called_with(
+            set(['handle1', 'handle2']))
+        self.assertEqual({}, self.eng._metadata_refresh)
+
     @tools.stack_context('service_metadata_test_stack')
     def test_metadata(self):
         test_metadata = {'foo': 'bar', 'baz': 'quux', 'blarg': 'wibble'}
@@ -3373,7 +3627,7 @@ class StackServiceTest(common.HeatTestCase):
         self.assertIsNone(stack._dependencies)
 
         resources = stack.resources
-        self.assertIsInstance(resources, dict)
+        self.assertIsInstance(resources, collections.Mapping)
         self.assertEqual(2, len(resources))
         self.assertIsInstance(resources.get('foo'),
                               generic_rsrc.GenericResource)
@@ -3518,6 +3772,9 @@ class StackServiceTest(common.HeatTestCase):
         mock_admin_context.return_value = self.ctx
         srv = dict(id='mock_id')
         mock_service_create.return_value = srv
+        load_stats = {'active_stacks': 0, 'active_threads': 0,
+                      'db_pool_checkedout': None}
+        self.patchobject(self.eng, '_load_stats', return_value=load_stats)
         self.eng.service_manage_report()
         mock_admin_context.assert_called_once_with()
         mock_service_create.assert_called_once_with(
@@ -3527,7 +3784,8 @@ class StackServiceTest(common.HeatTestCase):
                  binary=self.eng.binary,
                  engine_id=self.eng.engine_id,
                  topic=self.eng.topic,
-                 report_interval=cfg.CONF.periodic_interval))
+                 report_interval=cfg.CONF.periodic_interval,
+                 load_stats=load_stats))
 
         self.assertEqual(self.eng.service_id, srv['id'])
 
@@ -3561,12 +3819,80 @@ class StackServiceTest(common.HeatTestCase):
             mock_service_update):
         self.eng.service_id = 'mock_id'
         mock_admin_context.return_value = self.ctx
+        self.patchobject(self.eng.thread_group_mgr, 'load_stats',
+                         return_value={'active_stacks': 2,
+                                       'active_threads': 5})
+        self.patchobject(service.db_api, 'db_pool_checkedout',
+                         return_value=3)
         self.eng.service_manage_report()
         mock_admin_context.assert_called_once_with()
         mock_service_update.assert_called_once_with(
             self.ctx,
             'mock_id',
-            dict(deleted_at=None))
+            dict(deleted_at=None,
+                 load_stats={'active_stacks': 2,
+                             'active_threads': 5,
+                             'db_pool_checkedout': 3}))
+
+    def test_check_engine_load_disabled(self):
+        cfg.CONF.set_override('max_active_stacks_per_engine', 0)
+        mock_stats = self.patchobject(self.eng.thread_group_mgr,
+                                      'load_stats')
+        self.eng._check_engine_load()
+        self.assertFalse(mock_stats.called)
+
+    def test_check_engine_load_below_limit(self):
+        cfg.CONF.set_override('max_active_stacks_per_engine', 3)
+        self.patchobject(self.eng.thread_group_mgr, 'load_stats',
+                         return_value={'active_stacks': 2,
+                                       'active_threads': 2})
+        self.eng._check_engine_load()
+
+    def test_check_engine_load_overloaded(self):
+        cfg.CONF.set_override('max_active_stacks_per_engine', 3)
+        self.patchobject(self.eng.thread_group_mgr, 'load_stats',
+                         return_value={'active_stacks': 3,
+                                       'active_threads': 7})
+        self.patchobject(self.eng, '_preferred_engine_host',
+                         return_value='host2')
+        ex = self.assertRaises(exception.EngineOverloaded,
+                               self.eng._check_engine_load)
+        self.assertIn('already processing 3 stacks', six.text_type(ex))
+        self.assertEqual('host2', ex.kwargs['preferred_host'])
+
+    def test_preferred_engine_host(self):
+        now = datetime.datetime.utcnow()
+
+        def srv(engine_id, host, stats, updated_at=now):
+            return mock.Mock(engine_id=engine_id, host=host,
+                             load_stats=stats, report_interval=60,
+                             updated_at=updated_at)
+
+        self.eng.engine_id = 'self'
+        self.patchobject(service.service_objects.Service, 'get_all',
+                         return_value=[
+                             srv('self', 'host1', {'active_stacks': 0}),
+                             srv('busy', 'host2', {'active_stacks': 3}),
+                             srv('down', 'host3', {'active_stacks': 0},
+                                 updated_at=now - datetime.timedelta(
+                                     seconds=600)),
+                             srv('new', 'host4', None),
+                             srv('idle', 'host5', {'active_stacks': 1}),
+                             srv('idler', 'host6', {'active_stacks': 0})])
+        self.assertEqual('host6', self.eng._preferred_engine_host(3))
+        self.assertIsNone(self.eng._preferred_engine_host(0))
+
+    def test_create_stack_rejected_when_overloaded(self):
+        self.patchobject(self.eng, '_check_engine_load',
+                         side_effect=exception.EngineOverloaded(
+                             engine_id='e', active=3))
+        mock_parse = self.patchobject(self.eng,
+                                      '_parse_template_and_validate_stack')
+        ex = self.assertRaises(dispatcher.ExpectedException,
+                               self.eng.create_stack, self.ctx, 'overloaded',
+                               {}, {}, None, {})
+        self.assertEqual(exception.EngineOverloaded, ex.exc_info[0])
+        self.assertFalse(mock_parse.called)
 
     def test_stop_rpc_server(self):
         with mock.patch.object(self.eng,
@@ -3587,6 +3913,8 @@ class StackServiceTest(common.HeatTestCase):
             rpc_server_method):
         self.patchobject(self.eng, 'service_manage_cleanup')
         self.patchobject(self.eng, 'reset_stack_status')
+        create_periodic_tasks = self.patchobject(self.eng,
+                                                 'create_periodic_tasks')
         self.eng.start()
 
         # engine id
@@ -3607,7 +3935,8 @@ class StackServiceTest(common.HeatTestCase):
         engine_listener_class.assert_called_once_with(
             self.eng.host,
             self.eng.engine_id,
-            self.eng.thread_group_mgr
+            self.eng.thread_group_mgr,
+            self.eng.software_config
         )
         engine_lister = engine_listener_class.return_value
         engine_lister.start.assert_called_once_with()
@@ -3651,10 +3980,16 @@ class StackServiceTest(common.HeatTestCase):
         # Manage Thread group
         thread_group_class.assert_called_once_with()
         manage_thread_group = thread_group_class.return_value
-        manage_thread_group.add_timer.assert_called_once_with(
-            cfg.CONF.periodic_interval,
-            self.eng.service_manage_report
-        )
+        self.assertEqual(
+            [mock.call(cfg.CONF.periodic_interval,
+                       self.eng.service_manage_report),
+             mock.call(cfg.CONF.watch_data_flush_interval,
+                       self.eng._flush_watch_data)],
+            manage_thread_group.add_timer.call_args_list)
+        self.assertIsNotNone(self.eng.watch_data_store)
+
+        # Watch rule evaluation
+        create_periodic_tasks.assert_called_once_with()
 
     @mock.patch('heat.engine.service.ThreadGroupManager',
                 return_value=mock.Mock())
@@ -3707,6 +4042,113 @@ class StackServiceTest(common.HeatTestCase):
             parser.Stack.FAILED, 'Engine went down during stack CREATE'
         )
 
+    @mock.patch.object(event_object.Event, 'create')
+    @mock.patch.object(stack_notification, 'send_failed')
+    @mock.patch.object(stack_object.Stack, 'status_set_all')
+    @mock.patch.object(stack_lock_object.StackLock, 'release_all')
+    @mock.patch.object(stack_lock_object.StackLock, 'steal_all')
+    @mock.patch.object(stack_lock.StackLock, 'engine_heartbeat_alive')
+    @mock.patch.object(stack_lock_object.StackLock, 'get_engine_ids')
+    def test_recover_stale_locks(self, mock_engine_ids, mock_alive,
+                                 mock_steal_all, mock_release_all,
+                                 mock_status_set_all, mock_send_failed,
+                                 mock_event_create):
+        self.eng.engine_id = 'new-engine'
+        cfg.CONF.set_override('stale_lock_recovery_batch_size', 2)
+        mock_engine_ids.return_value = ['new-engine', 'dead-engine',
+                                        'live-engine', 'unknown-engine']
+        liveness = {'dead-engine': False, 'live-engine': True,
+                    'unknown-engine': None}
+        mock_alive.side_effect = lambda ctx, eid: liveness[eid]
+        mock_steal_all.return_value = ['s1', 's2', 's3']
+        db_stacks = {'s1': mock.Mock(id='s1', action='CREATE'),
+                     's3': mock.Mock(id='s3', action='UPDATE')}
+        mock_status_set_all.side_effect = [[db_stacks['s1']],
+                                           [db_stacks['s3']]]
+        mock_load = self.patchobject(parser.Stack, 'load')
+
+        self.eng._recover_stale_locks(self.ctx)
+
+        mock_steal_all.assert_called_once_with(['dead-engine'], 'new-engine')
+        self.assertEqual(2, mock_status_set_all.call_count)
+        mock_status_set_all.assert_any_call(
+            self.ctx, ['s1', 's2'], parser.Stack.IN_PROGRESS,
+            parser.Stack.FAILED, mock.ANY)
+        mock_status_set_all.assert_any_call(
+            self.ctx, ['s3'], parser.Stack.IN_PROGRESS,
+            parser.Stack.FAILED, mock.ANY)
+        reasons = mock_status_set_all.call_args[0][4]
+        self.assertEqual('Engine went down during stack UPDATE',
+                         reasons['UPDATE'])
+        mock_send_failed.assert_has_calls(
+            [mock.call(self.ctx, db_stacks['s1'],
+                       'Engine went down during stack CREATE'),
+             mock.call(self.ctx, db_stacks['s3'],
+                       'Engine went down during stack UPDATE')],
+            any_order=True)
+        self.assertEqual(2, mock_event_create.call_count)
+        self.assertFalse(mock_load.called)
+        mock_release_all.assert_has_calls(
+            [mock.call(['s1', 's2'], 'new-engine'),
+             mock.call(['s3'], 'new-engine')], any_order=True)
+
+    @mock.patch.object(event_object.Event, 'create')
+    @mock.patch.object(stack_notification, 'send_failed')
+    @mock.patch.object(stack_object.Stack, 'status_set_all')
+    @mock.patch.object(stack_lock_object.StackLock, 'release_all')
+    def test_fail_stale_stacks_notify_error(self, mock_release_all,
+                                            mock_status_set_all,
+                                            mock_send_failed,
+                                            mock_event_create):
+        self.eng.engine_id = 'new-engine'
+        mock_status_set_all.return_value = [
+            mock.Mock(id='s1', action='CREATE'),
+            mock.Mock(id='s2', action='CREATE')]
+        mock_send_failed.side_effect = [Exception('boom'), None]
+
+        self.eng._fail_stale_stacks(self.ctx, ['s1', 's2'])
+
+        self.assertEqual(2, mock_send_failed.call_count)
+        mock_event_create.assert_called_once_with(self.ctx, mock.ANY)
+        self.assertEqual('s2',
+                         mock_event_create.call_args[0][1]['stack_id'])
+        mock_release_all.assert_called_once_with(['s1', 's2'], 'new-engine')
+
+    @mock.patch.object(notification, 'notify')
+    def test_fail_stale_stacks_stored(self, mock_notify):
+        stack = tools.get_stack('stale_stack', self.ctx)
+        stack.store()
+        stack.state_set(stack.CREATE, stack.IN_PROGRESS, 'creating')
+        mock_notify.reset_mock()
+
+        self.eng._fail_stale_stacks(self.ctx, [stack.id])
+
+        db_stack = stack_object.Stack.get_by_id(self.ctx, stack.id)
+        self.assertEqual(parser.Stack.FAILED, db_stack.status)
+        self.assertEqual('Engine went down during stack CREATE',
+                         db_stack.status_reason)
+        mock_notify.assert_called_once_with(
+            self.ctx, 'stack.create.error', notification.ERROR, mock.ANY)
+        body = mock_notify.call_args[0][3]
+        self.assertEqual('CREATE_FAILED', body['state'])
+        self.assertEqual(stack.identifier().arn(), body['stack_identity'])
+        self.assertEqual(self.ctx.tenant_id, body['tenant_id'])
+        self.assertEqual(self.ctx.username, body['user_id'])
+        events = event_object.Event.get_all_by_stack(self.ctx, stack.id)
+        self.assertIn((parser.Stack.CREATE, parser.Stack.FAILED),
+                      [(e.resource_action, e.resource_status)
+                       for e in events])
+
+    @mock.patch.object(stack_lock_object.StackLock, 'steal_all')
+    @mock.patch.object(stack_lock.StackLock, 'engine_heartbeat_alive',
+                       return_value=True)
+    @mock.patch.object(stack_lock_object.StackLock, 'get_engine_ids',
+                       return_value=['live-engine'])
+    def test_recover_stale_locks_no_dead_engines(self, mock_engine_ids,
+                                                 mock_alive, mock_steal_all):
+        self.eng._recover_stale_locks(self.ctx)
+        self.assertFalse(mock_steal_all.called)
+
     @mock.patch('heat.common.messaging.get_rpc_server',
                 return_value=mock.Mock())
     @mock.patch('oslo_messaging.Target',
@@ -3787,6 +4229,7 @@ class StackServiceTest(common.HeatTestCase):
         cfg.CONF.set_default('periodic_interval', 60)
         self.patchobject(self.eng, 'service_manage_cleanup')
         self.patchobject(self.eng, 'reset_stack_status')
+        self.patchobject(self.eng, 'create_periodic_tasks')
 
         self.eng.start()
         # Add dummy thread group to test thread_group_mgr.stop() is executed?
@@ -3820,8 +4263,9 @@ class StackServiceTest(common.HeatTestCase):
             # # Manage Thread group
             self.eng.manage_thread_grp.stop.assert_called_with(False)
 
-            # Service delete
-            admin_context_method.assert_called_once_with()
+            # Buffered watch data flush and service delete
+            self.assertEqual([mock.call(), mock.call()],
+                             admin_context_method.call_args_list)
             ctxt = admin_context_method.return_value
             service_delete_method.assert_called_once_with(
                 ctxt,
@@ -3956,6 +4400,28 @@ class ThreadGroupManagerTest(common.HeatTestCase):
         thm.add_event(stack_id, e2)
         thm.send(stack_id, 'test_message')
 
+    def test_tgm_load_stats(self):
+        thm = service.ThreadGroupManager()
+        busy, idle = mock.Mock(), mock.Mock()
+        busy.threads = ['t1', 't2']
+        idle.threads = []
+        thm.groups = {'busy': busy, 'idle': idle}
+        thm._thread_stats['busy'].update(active=1, queued=1, wait_time=0.5)
+        thm._thread_wait_time = 1.5
+        self.patchobject(service.resource.Resource, 'actions_in_progress',
+                         return_value=4)
+        self.assertEqual({'active_stacks': 1,
+                          'active_threads': 2,
+                          'active_resource_actions': 4,
+                          'queued_threads': 1,
+                          'max_threads': self.cfg_mock.CONF.
+                          max_engine_stack_threads,
+                          'thread_wait_time': 1.5,
+                          'stacks': {'busy': {'active': 1,
+                                              'queued': 1,
+                                              'wait_time': 0.5}}},
+                         thm.load_stats())
+
 
 class ThreadGroupManagerStopTest(common.HeatTestCase):
     def test_tgm_stop(self):
@@ -3981,3 +4447,124 @@ class ThreadGroupManagerStopTest(common.HeatTestCase):
         self.assertIn(thread, done)
         self.assertNotIn(stack_id, thm.groups)
         self.assertNotIn(stack_id, thm.events)
+
+
+class ThreadGroupManagerBudgetTest(common.HeatTestCase):
+    def setUp(self):
+        super(ThreadGroupManagerBudgetTest, self).setUp()
+        cfg.CONF.set_override('max_engine_stack_threads', 1)
+        self.thm = service.ThreadGroupManager()
+        self.release = grevent.Event()
+        self.stack_get = self.patchobject(
+            service.stack_object.Stack, 'get_by_id',
+            return_value=mock.Mock(action='CREATE', status='COMPLETE'))
+
+    def _wait_for_release(self):
+        self.release.wait()
+
+    def _start_operation(self, stack_id, owner_id=None, lock=None,
+                         func=None):
+        stack = mock.Mock(id=stack_id, owner_id=owner_id)
+        if lock is None:
+            lock = mock.Mock()
+            lock.try_acquire.return_value = None
+        return self.thm.start_with_acquired_lock(
+            stack, lock, func or self._wait_for_release)
+
+    def test_queued_operation_releases_lock(self):
+        first = self._start_operation('stack1')
+        lock = mock.Mock()
+        lock.try_acquire.return_value = None
+        func = mock.Mock(return_value='done')
+        second = self._start_operation('stack2', lock=lock, func=func)
+        eventlet.sleep()
+
+        # the lock is not held while waiting for the budget
+        lock.release.assert_called_once_with()
+        self.assertFalse(lock.try_acquire.called)
+
+        self.release.send()
+        first.wait()
+        self.assertEqual('done', second.wait())
+        lock.try_acquire.assert_called_once_with()
+        func.assert_called_once_with()
+        # and released again once the operation is done
+        self.assertEqual(2, lock.release.call_count)
+
+    def test_queued_operation_dropped_when_locked(self):
+        first = self._start_operation('stack1')
+        lock = mock.Mock()
+        lock.try_acquire.return_value = 'other-engine'
+        func = mock.Mock()
+        second = self._start_operation('stack2', lock=lock, func=func)
+        eventlet.sleep()
+
+        self.release.send()
+        first.wait()
+        self.assertIsNone(second.wait())
+        self.assertFalse(func.called)
+        # only released before the wait, it is the other engine's now
+        lock.release.assert_called_once_with()
+        self.assertEqual({}, self.thm.load_stats()['stacks'])
+
+    def test_queued_operation_dropped_when_stack_changed(self):
+        first = self._start_operation('stack1')
+        lock = mock.Mock()
+        lock.try_acquire.return_value = None
+        func = mock.Mock()
+        second = self._start_operation('stack2', lock=lock, func=func)
+        eventlet.sleep()
+
+        # e.g. deleted by another engine while this operation was queued
+        self.stack_get.return_value = mock.Mock(action='DELETE',
+                                                status='COMPLETE')
+        self.release.send()
+        first.wait()
+        self.assertIsNone(second.wait())
+        self.assertFalse(func.called)
+        lock.try_acquire.assert_called_once_with()
+        self.assertEqual(2, lock.release.call_count)
+
+    def test_operations_queue_beyond_budget(self):
+        first = self._start_operation('stack1')
+        second = self._start_operation('stack2')
+        eventlet.sleep()
+
+        stats = self.thm.load_stats()
+        self.assertEqual(1, stats['queued_threads'])
+        self.assertEqual({'active': 1, 'queued': 0, 'wait_time': mock.ANY},
+                         stats['stacks']['stack1'])
+        self.assertEqual({'active': 0, 'queued': 1, 'wait_time': mock.ANY},
+                         stats['stacks']['stack2'])
+
+        self.release.send()
+        first.wait()
+        second.wait()
+
+        stats = self.thm.load_stats()
+        self.assertEqual(0, stats['queued_threads'])
+        self.assertEqual({}, stats['stacks'])
+
+    def test_nested_stack_operations_bypass_budget(self):
+        self._start_operation('parent')
+        th = self._start_operation('nested', owner_id='parent')
+        eventlet.sleep()
+
+        stats = self.thm.load_stats()
+        self.assertEqual(0, stats['queued_threads'])
+        self.assertEqual(1, stats['stacks']['nested']['active'])
+
+        self.release.send()
+        th.wait()
+
+    def test_other_threads_bypass_budget(self):
+        # e.g. signals which the operation holding the slot is waiting for
+        self._start_operation('stack1')
+        th = self.thm.start('stack1', lambda: 'signalled')
+        self.assertEqual('signalled', th.wait())
+
+        stats = self.thm.load_stats()
+        self.assertEqual(0, stats['queued_threads'])
+        self.assertEqual(1, stats['stacks']['stack1']['active'])
+
+        self.release.send()
@@ -11,10 +11,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 import mock
+from oslo_utils import timeutils
 
 from heat.engine import service_stack_watch
-from heat.rpc import api as rpc_api
+from heat.engine import stack
+from heat.engine import template
+from heat.engine import watchrule
 from heat.tests import common
 from heat.tests import utils
 
@@ -24,91 +29,135 @@ class StackServiceWatcherTest(common.HeatTestCase):
     def setUp(self):
         super(StackServiceWatcherTest, self).setUp()
         self.ctx = utils.dummy_context(tenant_id='stack_service_test_tenant')
+        self.tg = mock.Mock()
+        self.sw = service_stack_watch.StackWatch(self.tg, 'engine-b')
 
-    @mock.patch.object(service_stack_watch.stack_object.Stack,
-                       'get_all_by_owner_id')
-    @mock.patch.object(service_stack_watch.watch_rule_object.WatchRule,
-                       'get_all_by_stack')
+    def _service(self, engine_id, age=0, deleted=False):
+        now = timeutils.utcnow()
+        return mock.Mock(host='host', engine_id=engine_id, report_interval=60,
+                         created_at=now,
+                         updated_at=now - datetime.timedelta(seconds=age),
+                         deleted_at=now if deleted else None)
+
+    @mock.patch.object(service_stack_watch.threadgroup, 'ThreadGroup')
     @mock.patch.object(service_stack_watch.watch_rule_object.WatchRule,
-                       'update_by_id')
-    def test_periodic_watch_task_not_created(self, watch_rule_update,
-                                             watch_rule_get_all_by_stack,
-                                             stack_get_all_by_owner_id):
-        """If there is no cloud watch lite alarm, then don't create
-        a periodic task for it.
-        """
-        stack_id = 83
-        watch_rule_get_all_by_stack.return_value = []
-        stack_get_all_by_owner_id.return_value = []
-        tg = mock.Mock()
-        sw = service_stack_watch.StackWatch(tg)
-        sw.start_watch_task(stack_id, self.ctx)
-
-        # assert that add_timer is NOT called.
-        self.assertEqual([], tg.add_timer.call_args_list)
-
-    @mock.patch.object(service_stack_watch.stack_object.Stack,
-                       'get_all_by_owner_id')
+                       'update_all_by_id')
     @mock.patch.object(service_stack_watch.watch_rule_object.WatchRule,
-                       'get_all_by_stack')
+                       'get_all_evaluable')
+    @mock.patch.object(service_stack_watch.StackWatch, '_get_shard')
+    def test_start(self, get_shard, get_all_evaluable, update_all_by_id,
+                   mock_tg):
+        now = timeutils.utcnow()
+        self.patchobject(service_stack_watch.timeutils, 'utcnow',
+                         return_value=now)
+        get_shard.return_value = (2, 1)
+        wr = mock.Mock(id=3, rule={'Period': '300'}, state='NORMAL',
+                       last_evaluated=now - datetime.timedelta(days=1))
+        wr.name = 'rule3'
+        get_all_evaluable.return_value = [wr]
+
+        self.sw.start(self.ctx)
+
+        # only the rules of this engine's shard are reset
+        get_all_evaluable.assert_called_once_with(
+            self.ctx, shard_count=2, shard_index=1, due_only=False)
+        update_all_by_id.assert_called_once_with(
+            self.ctx, {3: {'last_evaluated': now,
+                           'next_evaluation':
+                           now + datetime.timedelta(seconds=300)}})
+        mock_tg.return_value.add_timer.assert_called_once_with(
+            60, self.sw.periodic_watcher_task, initial_delay=60)
+
+        self.sw.stop()
+        mock_tg.return_value.stop.assert_called_once_with()
+        self.assertIsNone(self.sw.tg)
+
+    @mock.patch.object(service_stack_watch.service_object.Service, 'get_all')
+    def test_get_shard(self, service_get_all):
+        service_get_all.return_value = [self._service('engine-c'),
+                                        self._service('engine-a'),
+                                        self._service('engine-c'),
+                                        self._service(None),
+                                        self._service('engine-d', age=600),
+                                        self._service('engine-e',
+                                                      deleted=True)]
+        self.assertEqual((3, 1), self.sw._get_shard(self.ctx))
+
+    @mock.patch.object(service_stack_watch.service_object.Service, 'get_all')
+    def test_get_shard_no_services(self, service_get_all):
+        service_get_all.return_value = []
+        self.assertEqual((1, 0), self.sw._get_shard(self.ctx))
+
+    @mock.patch.object(service_stack_watch.watchrule.WatchRule, 'load')
     @mock.patch.object(service_stack_watch.watch_rule_object.WatchRule,
-                       'update_by_id')
-    def test_periodic_watch_task_created(self, watch_rule_update,
-                                         watch_rule_get_all_by_stack,
-                                         stack_get_all_by_owner_id):
-        """If there is no cloud watch lite alarm, then DO create
-        a periodic task for it.
-        """
-        stack_id = 86
+                       'get_all_evaluable')
+    @mock.patch.object(service_stack_watch.StackWatch, '_get_shard')
+    def test_check_watches(self, get_shard, get_all_evaluable, rule_load):
+        get_shard.return_value = (2, 1)
         wr1 = mock.Mock()
-        wr1.id = 4
-        wr1.state = rpc_api.WATCH_STATE_NODATA
-
-        watch_rule_get_all_by_stack.return_value = [wr1]
-        stack_get_all_by_owner_id.return_value = []
-        tg = mock.Mock()
-        sw = service_stack_watch.StackWatch(tg)
-        sw.start_watch_task(stack_id, self.ctx)
-
-        # assert that add_timer IS called.
-        self.assertEqual([mock.call(stack_id, sw.periodic_watcher_task,
-                                    sid=stack_id)],
-                         tg.add_timer.call_args_list)
-
-    @mock.patch.object(service_stack_watch.stack_object.Stack,
-                       'get_all_by_owner_id')
-    @mock.patch.object(service_stack_watch.watch_rule_object.WatchRule,
-                       'get_all_by_stack')
+        wr2 = mock.Mock()
+        get_all_evaluable.return_value = [wr1, wr2]
+
+        idle_rule = mock.Mock()
+        idle_rule.evaluate.return_value = []
+        alarm_rule = mock.Mock(stack_id='stack-2')
+        alarm_rule.evaluate.return_value = ['action']
+        rule_load.side_effect = [idle_rule, alarm_rule]
+
+        self.sw.check_watches(self.ctx)
+
+        get_all_evaluable.assert_called_once_with(self.ctx, shard_count=2,
+                                                  shard_index=1)
+        self.assertEqual([mock.call(self.ctx, watch=wr1,
+                                    use_stored_context=True),
+                          mock.call(self.ctx, watch=wr2,
+                                    use_stored_context=True)],
+                         rule_load.call_args_list)
+        # the stack is only loaded for the rule with an action to run
+        self.assertFalse(idle_rule.load_stack.called)
+        self.tg.start.assert_called_once_with(
+            'stack-2', mock.ANY, alarm_rule.load_stack.return_value,
+            ['action'], alarm_rule.get_details.return_value)
+
+    @mock.patch.object(service_stack_watch.watchrule.WatchRule, 'load')
     @mock.patch.object(service_stack_watch.watch_rule_object.WatchRule,
-                       'update_by_id')
-    def test_periodic_watch_task_created_nested(self, watch_rule_update,
-                                                watch_rule_get_all_by_stack,
-                                                stack_get_all_by_owner_id):
-        stack_id = 90
-
-        def my_wr_get(cnxt, sid):
-            if sid == stack_id:
-                return []
-            wr1 = mock.Mock()
-            wr1.id = 4
-            wr1.state = rpc_api.WATCH_STATE_NODATA
-            return [wr1]
-
-        watch_rule_get_all_by_stack.side_effect = my_wr_get
-
-        def my_nested_get(cnxt, sid):
-            if sid == stack_id:
-                nested_stack = mock.Mock()
-                nested_stack.id = 55
-                return [nested_stack]
-            return []
-
-        stack_get_all_by_owner_id.side_effect = my_nested_get
-        tg = mock.Mock()
-        sw = service_stack_watch.StackWatch(tg)
-        sw.start_watch_task(stack_id, self.ctx)
-
-        # assert that add_timer IS called.
-        self.assertEqual([mock.call(stack_id, sw.periodic_watcher_task,
-                                    sid=stack_id)],
-                         tg.add_timer.call_args_list)
+                       'get_all_evaluable')
+    @mock.patch.object(service_stack_watch.StackWatch, '_get_shard')
+    def test_check_watches_rule_error(self, get_shard, get_all_evaluable,
+                                      rule_load):
+        get_shard.return_value = (1, 0)
+        get_all_evaluable.return_value = [mock.Mock(), mock.Mock()]
+        ok_rule = mock.Mock()
+        ok_rule.evaluate.return_value = []
+        rule_load.side_effect = [Exception('boom'), ok_rule]
+
+        self.sw.check_watches(self.ctx)
+
+        ok_rule.evaluate.assert_called_once_with()
+        self.assertFalse(self.tg.start.called)
+
+    def test_check_watches_live_stack(self):
+        tmpl = template.Template({'HeatTemplateFormatVersion': '2012-12-12'})
+        stk = stack.Stack(self.ctx, 'watched_stack', tmpl)
+        stk.state_set(stk.CREATE, stk.COMPLETE, 'Testing')
+        stk.store()
+        rule = {'EvaluationPeriods': '1',
+                'MetricName': 'test_metric',
+                'Period': '300',
+                'Statistic': 'Maximum',
+                'ComparisonOperator': 'GreaterThanOrEqualToThreshold',
+                'Threshold': '30'}
+        last_evaluated = timeutils.utcnow() - datetime.timedelta(days=1)
+        for name, state in (('watched', watchrule.WatchRule.NODATA),
+                            ('suspended', watchrule.WatchRule.SUSPENDED)):
+            watchrule.WatchRule(context=self.ctx, watch_name=name,
+                                rule=rule, stack_id=stk.id, state=state,
+                                last_evaluated=last_evaluated).store()
+        evaluate = self.patchobject(watchrule.WatchRule, 'evaluate',
+                                    autospec=True, return_value=[])
+
+        self.sw.check_watches(self.ctx)
+
+        self.assertEqual(['watched'],
+                         [c[0][0].name for c in evaluate.call_args_list])
+        self.assertFalse(self.tg.start.called)
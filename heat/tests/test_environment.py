@@ -11,6 +11,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import fnmatch
 import os.path
 import sys
 
@@ -707,6 +708,69 @@ class ChildEnvTest(common.HeatTestCase):
         self.assertEqual(u'carrots.yaml', resources[u'OS::Fruit'])
         self.assertEqual('pre-update', resources[u'hooks'])
 
+    def test_child_registry_layered(self):
+        env = {u'resource_registry': {u'OS::Food': u'fruity.yaml',
+                                      u'OS::Fruit': u'OS::Food'}}
+        penv = environment.Environment(env)
+        cenv = environment.get_child_environment(penv, None)
+        # nothing is copied until the child changes something
+        self.assertEqual({}, cenv.registry._registry)
+        self.assertEqual(penv.user_env_as_dict()['resource_registry'],
+                         cenv.user_env_as_dict()['resource_registry'])
+
+        cenv.load({u'resource_registry': {u'OS::Food': u'nutty.yaml'}})
+        # mappings inherited from the parent resolve through the child
+        self.assertEqual('nutty.yaml',
+                         cenv.get_resource_info('OS::Fruit').value)
+        self.assertEqual('fruity.yaml',
+                         penv.get_resource_info('OS::Fruit').value)
+
+    def test_child_registry_remove_glob(self):
+        env = {u'resource_registry': {u'OS::Food::*': u'Test::*',
+                                      u'Test::Cake': u'cake.yaml'}}
+        penv = environment.Environment(env)
+        cenv = environment.get_child_environment(penv, None)
+        self.assertEqual('cake.yaml',
+                         cenv.get_resource_info('OS::Food::Cake').value)
+
+        cenv.load({u'resource_registry': {u'OS::Food::*': None}})
+        self.assertIsNone(cenv.get_resource_info('OS::Food::Cake'))
+        self.assertNotIn('OS::Food::*',
+                         cenv.user_env_as_dict()['resource_registry'])
+        self.assertEqual('cake.yaml',
+                         penv.get_resource_info('OS::Food::Cake').value)
+
+    def test_child_registry_sees_parent_hooks(self):
+        env = {u'resource_registry': {u'resources': {
+            u'res*': {u'hooks': u'pre-create'}}}}
+        penv = environment.Environment(env)
+        cenv = environment.get_child_environment(penv, None)
+        self.assertTrue(cenv.registry.matches_hook(
+            'res1', environment.HOOK_PRE_CREATE))
+
+        cenv.load({u'resource_registry': {u'resources': {
+            u'other': {u'hooks': u'pre-update'}}}})
+        self.assertTrue(cenv.registry.matches_hook(
+            'other', environment.HOOK_PRE_UPDATE))
+        self.assertTrue(cenv.registry.matches_hook(
+            'res1', environment.HOOK_PRE_CREATE))
+        self.assertFalse(penv.registry.matches_hook(
+            'other', environment.HOOK_PRE_UPDATE))
+
+    def test_grandchild_registry(self):
+        env = {u'resource_registry': {u'OS::Food': u'fruity.yaml'}}
+        penv = environment.Environment(env)
+        cenv = environment.get_child_environment(
+            penv, {u'resource_registry': {u'OS::Fruit': u'apples.yaml'}})
+        gcenv = environment.get_child_environment(cenv, None)
+        self.assertEqual('fruity.yaml',
+                         gcenv.get_resource_info('OS::Food').value)
+        self.assertEqual('apples.yaml',
+                         gcenv.get_resource_info('OS::Fruit').value)
+        self.assertIs(gcenv,
+                      gcenv.get_resource_info('OS::Fruit').registry.
+                      environment)
+
 
 class ResourceRegistryTest(common.HeatTestCase):
 
@@ -747,6 +811,37 @@ class ResourceRegistryTest(common.HeatTestCase):
         self.assertEqual('pre-create',
                          resources['nested']['res']['hooks'])
 
+    def test_glob_lookup(self):
+        registry = environment.ResourceRegistry(None, {})
+        registry.load({u'OS::*': u'Generic::*',
+                       u'OS::Nova::*': u'Test::Nova::*',
+                       u'Test::Nova::Server': u'server.yaml',
+                       u'Generic::Thing': u'thing.yaml'})
+
+        info = registry.get_resource_info('OS::Thing')
+        self.assertEqual('thing.yaml', info.value)
+        self.assertIsNone(registry.get_resource_info('Other::Thing'))
+
+        globs = registry.iterable_by('OS::Nova::Server')
+        self.assertEqual(set(['OS::*', 'OS::Nova::*']),
+                         set(info.name for info in globs))
+
+    def test_index_invalidated(self):
+        registry = environment.ResourceRegistry(None, {})
+        registry.load({u'OS::*': u'Generic::*'})
+        self.assertEqual(1, len(list(registry.iterable_by('OS::Thing'))))
+        self.assertFalse(registry.matches_hook('res',
+                                               environment.HOOK_PRE_CREATE))
+
+        registry.load({u'OS::*': None,
+                       u'resources': {u'res': {u'hooks': u'pre-create'}}})
+        self.assertEqual([], list(registry.iterable_by('OS::Thing')))
+        self.assertTrue(registry.matches_hook('res',
+                                              environment.HOOK_PRE_CREATE))
+
+        registry.register_class('OS::Thing', generic_resource.GenericResource)
+        self.assertEqual(1, len(list(registry.iterable_by('OS::Thing'))))
+
 
 class HookMatchTest(common.HeatTestCase):
 
@@ -815,6 +910,19 @@ class HookMatchTest(common.HeatTestCase):
         self.assertTrue(registry.matches_hook(
             '_suffix_blah', environment.HOOK_PRE_UPDATE))
 
+    def test_matches_like_fnmatch(self):
+        patterns = [u'a', u'a*', u'*b', u'a?c', u'[xy]z', u'web.*', u'*']
+        names = [u'a', u'ab', u'abc', u'b', u'xz', u'yz', u'zz', u'web.1',
+                 u'webx1', u'']
+        for pattern in patterns:
+            registry = environment.ResourceRegistry(None, {})
+            registry.load({'resources': {pattern: {u'hooks': 'pre-create'}}})
+            for name in names:
+                self.assertEqual(fnmatch.fnmatchcase(name, pattern),
+                                 registry.matches_hook(
+                                     name, environment.HOOK_PRE_CREATE),
+                                 '%s %s' % (pattern, name))
+
     def test_hook_types(self):
         resources = {
             u'pre_create': {
@@ -26,6 +26,8 @@ from heat.tests import utils
 
 cfg.CONF.import_opt('event_purge_batch_size', 'heat.common.config')
 cfg.CONF.import_opt('max_events_per_stack', 'heat.common.config')
+cfg.CONF.import_opt('event_property_max_length', 'heat.common.config')
+cfg.CONF.import_opt('event_properties_max_size', 'heat.common.config')
 
 tmpl = {
     'HeatTemplateFormatVersion': '2012-12-12',
@@ -157,3 +159,46 @@ class EventTest(common.HeatTestCase):
         e = event.Event(self.ctx, self.stack, 'TEST', 'IN_PROGRESS', 'Testing',
                         'wibble', res.properties, res.name, res.type())
         self.assertIn('Error', e.resource_properties)
+
+    def test_store_truncates_long_property(self):
+        cfg.CONF.set_override('event_property_max_length', 10)
+        e = event.Event(self.ctx, self.stack, 'TEST', 'IN_PROGRESS', 'Testing',
+                        'wibble', {'Foo': 'x' * 100, 'Bar': [1] * 20},
+                        self.resource.name, self.resource.type())
+        e.store()
+
+        ev = event_object.Event.get_by_id(self.ctx, e.id)
+        self.assertEqual('x' * 10 + '...', ev.resource_properties['Foo'])
+        self.assertEqual('[1, 1, 1, ...', ev.resource_properties['Bar'])
+        # the in-memory event keeps the full properties
+        self.assertEqual('x' * 100, e.resource_properties['Foo'])
+
+    def test_store_truncates_largest_properties(self):
+        cfg.CONF.set_override('event_property_max_length', 0)
+        cfg.CONF.set_override('event_properties_max_size', 100)
+        e = event.Event(self.ctx, self.stack, 'TEST', 'IN_PROGRESS', 'Testing',
+                        'wibble', {'Foo': 'x' * 80, 'Bar': 'y' * 50,
+                                   'Baz': 'z'},
+                        self.resource.name, self.resource.type())
+        e.store()
+
+        ev = event_object.Event.get_by_id(self.ctx, e.id)
+        self.assertEqual({'Foo': '...', 'Bar': 'y' * 50, 'Baz': 'z'},
+                         ev.resource_properties)
+
+    def test_load_without_properties(self):
+        e = event.Event(self.ctx, self.stack, 'TEST', 'IN_PROGRESS', 'Testing',
+                        'wibble', self.resource.properties,
+                        self.resource.name, self.resource.type())
+        e.store()
+
+        evs = event_object.Event.get_all_by_stack(self.ctx, self.stack.id,
+                                                  include_properties=False)
+        self.assertEqual(1, len(evs))
+        self.assertFalse(hasattr(evs[0], 'resource_properties'))
+
+        loaded_e = event.Event.load(self.ctx, evs[0].id, event=evs[0],
+                                    stack=self.stack,
+                                    include_properties=False)
+        self.assertIsNone(loaded_e.resource_properties)
+        self.assertEqual('wibble', loaded_e.physical_resource_id)
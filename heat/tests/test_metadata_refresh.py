@@ -213,6 +213,7 @@ class WaitCondMetadataUpdateTest(common.HeatTestCase):
         super(WaitCondMetadataUpdateTest, self).setUp()
         self.man = service.EngineService('a-host', 'a-topic')
         self.man.create_periodic_tasks()
+        self.addCleanup(self.man.stack_watch.stop)
         cfg.CONF.set_default('heat_waitcondition_server_url',
                              'http://server.test:8000/v1/waitcondition')
 
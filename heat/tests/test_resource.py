@@ -183,6 +183,22 @@ class ResourceTest(common.HeatTestCase):
         self.assertEqual((res.CREATE, res.COMPLETE), res.state)
         self.assertEqual('wibble', res.status_reason)
 
+    def test_actions_in_progress(self):
+        tmpl = rsrc_defn.ResourceDefinition('test_resource', 'Foo')
+        res = generic_rsrc.GenericResource('test_resource', tmpl, self.stack)
+        before = resource.Resource.actions_in_progress()
+        counts = []
+
+        def handle_create():
+            counts.append(resource.Resource.actions_in_progress())
+            raise ValueError('boom')
+
+        self.patchobject(res, 'handle_create', side_effect=handle_create)
+        self.assertRaises(exception.ResourceFailure,
+                          scheduler.TaskRunner(res.create))
+        self.assertEqual([before + 1], counts)
+        self.assertEqual(before, resource.Resource.actions_in_progress())
+
     def test_physical_resource_name_or_FnGetRefId(self):
         tmpl = rsrc_defn.ResourceDefinition('test_resource', 'Foo')
         res = generic_rsrc.GenericResource('test_resource', tmpl, self.stack)
@@ -939,6 +955,30 @@ class ResourceTest(common.HeatTestCase):
         scheduler.TaskRunner(res.resume)()
         self.assertEqual((res.RESUME, res.COMPLETE), res.state)
 
+    def test_state_writes_coalesced_without_handler(self):
+        tmpl = rsrc_defn.ResourceDefinition('test_resource', 'Foo')
+        res = generic_rsrc.GenericResource('test_resource', tmpl, self.stack)
+        scheduler.TaskRunner(res.create)()
+        self.assertEqual((res.CREATE, res.COMPLETE), res.state)
+
+        # GenericResource has no handle_snapshot() method
+        with mock.patch.object(resource_objects.Resource,
+                               'update_by_id') as mock_update:
+            scheduler.TaskRunner(res.snapshot)()
+        self.assertEqual((res.SNAPSHOT, res.COMPLETE), res.state)
+        self.assertEqual(1, mock_update.call_count)
+        values = mock_update.call_args[0][2]
+        self.assertEqual((res.SNAPSHOT, res.COMPLETE),
+                         (values['action'], values['status']))
+        self.assertIsNone(res._pending_state)
+
+        # but it has a handle_suspend() method
+        with mock.patch.object(resource_objects.Resource,
+                               'update_by_id') as mock_update:
+            scheduler.TaskRunner(res.suspend)()
+        self.assertEqual((res.SUSPEND, res.COMPLETE), res.state)
+        self.assertEqual(2, mock_update.call_count)
+
     def test_suspend_fail_inprogress(self):
         tmpl = rsrc_defn.ResourceDefinition('test_resource',
                                             'GenericResourceType',
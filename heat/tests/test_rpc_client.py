@@ -74,6 +74,28 @@ class EngineRpcAPITestCase(common.HeatTestCase):
             exr,
             'NotSupported')
 
+    def test_call_balanced_retries_on_preferred_host(self):
+        ctxt = utils.dummy_context()
+        msg = self.rpcapi.make_msg('update_stack')
+        exr = self._to_remote_error(exception.EngineOverloaded(
+            engine_id='e1', active=3, preferred_host='host2'))
+        with mock.patch.object(self.rpcapi._client, 'prepare') as prepare:
+            prepare.return_value.call.side_effect = [exr, 'foo']
+            self.assertEqual('foo', self.rpcapi._call_balanced(ctxt, msg))
+        prepare.assert_called_with(version=None, server='host2')
+        self.assertEqual(2, prepare.return_value.call.call_count)
+
+    def test_call_balanced_no_preferred_host(self):
+        ctxt = utils.dummy_context()
+        msg = self.rpcapi.make_msg('update_stack')
+        exr = self._to_remote_error(exception.EngineOverloaded(
+            engine_id='e1', active=3, preferred_host=None))
+        with mock.patch.object(self.rpcapi, 'call',
+                               side_effect=exr) as call:
+            self.assertRaises(exception.EngineOverloaded,
+                              self.rpcapi._call_balanced, ctxt, msg)
+        self.assertEqual(1, call.call_count)
+
     def _test_engine_api(self, method, rpc_method, **kwargs):
         ctxt = utils.dummy_context()
         expected_retval = 'foo' if method == 'call' else None
@@ -209,7 +231,8 @@ class EngineRpcAPITestCase(common.HeatTestCase):
                   'marker': None,
                   'sort_keys': None,
                   'sort_dir': None,
-                  'filters': None}
+                  'filters': None,
+                  'include_properties': True}
         self._test_engine_api('list_events', 'call', **kwargs)
 
     def test_describe_stack_resource(self):
@@ -218,6 +241,13 @@ class EngineRpcAPITestCase(common.HeatTestCase):
                               resource_name='LogicalResourceId',
                               with_attr=None)
 
+    def test_describe_resource_metadata(self):
+        self._test_engine_api('describe_resource_metadata', 'call',
+                              stack_identity=self.identity,
+                              resource_name='LogicalResourceId',
+                              etag='abc123',
+                              version='1.11')
+
     def test_find_physical_resource(self):
         self._test_engine_api('find_physical_resource', 'call',
                               physical_resource_id=u'404d-a85b-5315293e67de')
@@ -297,6 +327,13 @@ class EngineRpcAPITestCase(common.HeatTestCase):
         self._test_engine_api('list_software_deployments', 'call',
                               server_id='9dc13236-d342-451f-a885-1c82420ba5ed')
 
+    def test_poll_metadata_software_deployments(self):
+        self._test_engine_api('poll_metadata_software_deployments', 'call',
+                              server_id='9dc13236-d342-451f-a885-1c82420ba5ed',
+                              etag='abc123',
+                              timeout=30,
+                              version='1.12')
+
     def test_show_software_deployment(self):
         deployment_id = '86729f02-4648-44d8-af44-d0ec65b6abc9'
         self._test_engine_api('show_software_deployment', 'call',
@@ -313,6 +350,19 @@ class EngineRpcAPITestCase(common.HeatTestCase):
             status='COMPLETE',
             status_reason=None)
 
+    def test_create_software_deployments(self):
+        self._test_engine_api(
+            'create_software_deployments', 'call',
+            config_id='48e8ade1-9196-42d5-89a2-f709fde42632',
+            deployments=[{
+                'server_id': '9f1f0e00-05d2-4ca5-8602-95021f19c9d0',
+                'input_values': {}}],
+            action='INIT',
+            status='COMPLETE',
+            status_reason=None,
+            stack_user_project_id=None,
+            version='1.13')
+
     def test_update_software_deployment(self):
         deployment_id = '86729f02-4648-44d8-af44-d0ec65b6abc9'
         self._test_engine_api('update_software_deployment', 'call',
@@ -214,6 +214,122 @@ class StackTest(common.HeatTestCase):
         all_resources = list(self.stack.iter_resources(1))
         self.assertEqual(5, len(all_resources))
 
+    def test_resources_instantiated_lazily(self):
+        tpl = {'HeatTemplateFormatVersion': '2012-12-12',
+               'Resources':
+               {'A': {'Type': 'GenericResourceType'},
+                'B': {'Type': 'GenericResourceType'},
+                'C': {'Type': 'GenericResourceType'}}}
+        self.stack = stack.Stack(self.ctx, 'test_stack',
+                                 template.Template(tpl))
+
+        self.assertEqual(3, len(self.stack))
+        self.assertIn('B', self.stack)
+        self.assertNotIn('D', self.stack)
+        self.assertEqual([], self.stack.resources.loaded())
+
+        res_a = self.stack['A']
+        self.assertIs(res_a, self.stack['A'])
+        self.assertEqual([res_a], self.stack.resources.loaded())
+        self.assertRaises(KeyError, self.stack.__getitem__, 'D')
+
+        self.stack.resources.load_all()
+        self.assertEqual(3, len(self.stack.resources.loaded()))
+        self.assertIs(res_a, self.stack['A'])
+
+        self.assertEqual(set(['A', 'B', 'C']),
+                         set(r.name for r in six.itervalues(self.stack)))
+        self.assertEqual(3, len(self.stack.resources.loaded()))
+
+    def test_access_allowed_instantiates_resources(self):
+        tpl = {'HeatTemplateFormatVersion': '2012-12-12',
+               'Resources':
+               {'A': {'Type': 'GenericResourceType'},
+                'B': {'Type': 'GenericResourceType'}}}
+        self.stack = stack.Stack(self.ctx, 'test_stack',
+                                 template.Template(tpl))
+        res_init = generic_rsrc.GenericResource.__init__
+
+        def register_on_init(res, name, definition, stack):
+            res_init(res, name, definition, stack)
+            if name == 'B':
+                stack.register_access_allowed_handler(
+                    'cred', lambda resource_name: resource_name == 'A')
+
+        with mock.patch.object(generic_rsrc.GenericResource, '__init__',
+                               register_on_init):
+            self.assertTrue(self.stack.access_allowed('cred', 'A'))
+            self.assertFalse(self.stack.access_allowed('cred', 'B'))
+            self.assertFalse(self.stack.access_allowed('other', 'A'))
+
+    def test_reset_resource_attributes_dependents(self):
+        tpl = {'HeatTemplateFormatVersion': '2012-12-12',
+               'Resources':
+               {'A': {'Type': 'GenericResourceType'},
+                'B': {'Type': 'GenericResourceType',
+                      'DependsOn': 'A'},
+                'C': {'Type': 'GenericResourceType',
+                      'DependsOn': 'B'},
+                'D': {'Type': 'GenericResourceType'}}}
+        self.stack = stack.Stack(self.ctx, 'test_stack',
+                                 template.Template(tpl))
+        for res in six.itervalues(self.stack):
+            res.attributes._resolved_values['attr'] = res.name
+        self.stack.dependencies
+
+        self.stack.reset_resource_attributes(self.stack['B'])
+
+        self.assertEqual({'attr': 'A'},
+                         self.stack['A'].attributes._resolved_values)
+        self.assertEqual({}, self.stack['B'].attributes._resolved_values)
+        self.assertEqual({}, self.stack['C'].attributes._resolved_values)
+        self.assertEqual({'attr': 'D'},
+                         self.stack['D'].attributes._resolved_values)
+
+    def test_reset_resource_attributes_no_dependencies(self):
+        tpl = {'HeatTemplateFormatVersion': '2012-12-12',
+               'Resources':
+               {'A': {'Type': 'GenericResourceType'},
+                'B': {'Type': 'GenericResourceType'},
+                'C': {'Type': 'GenericResourceType'}}}
+        self.stack = stack.Stack(self.ctx, 'test_stack',
+                                 template.Template(tpl))
+        for name in ('A', 'B'):
+            self.stack[name].attributes._resolved_values['attr'] = name
+
+        # Without a dependency graph all instantiated resources are reset,
+        # and the others are not instantiated to do it
+        self.stack.reset_resource_attributes(self.stack['A'])
+
+        self.assertEqual({}, self.stack['A'].attributes._resolved_values)
+        self.assertEqual({}, self.stack['B'].attributes._resolved_values)
+        self.assertEqual(2, len(self.stack.resources.loaded()))
+
+    def test_metadata_dependents(self):
+        tpl = {'heat_template_version': '2013-05-23',
+               'resources': {
+                   'handle': {'type': 'GenericResourceType'},
+                   'wait': {'type': 'GenericResourceType',
+                            'depends_on': 'handle'},
+                   'server': {'type': 'GenericResourceType',
+                              'metadata': {'data': {
+                                  'get_attr': ['wait', 'foo']}}},
+                   'other': {'type': 'GenericResourceType',
+                             'metadata': {'data': 'static'}}}}
+        self.stack = stack.Stack(self.ctx, 'metadata_dependents',
+                                 template.Template(tpl))
+        self.stack.store()
+        self.stack.create()
+        self.assertEqual((stack.Stack.CREATE, stack.Stack.COMPLETE),
+                         self.stack.state)
+
+        self.assertEqual([self.stack['server']],
+                         self.stack.metadata_dependents(['handle']))
+        self.assertEqual([self.stack['server']],
+                         self.stack.metadata_dependents(['wait']))
+        self.assertEqual([], self.stack.metadata_dependents(['server']))
+        self.assertEqual([], self.stack.metadata_dependents(['other']))
+
     @mock.patch.object(stack.Stack, 'db_resource_get')
     def test_iter_resources_cached(self, mock_drg):
         tpl = {'HeatTemplateFormatVersion': '2012-12-12',
@@ -245,6 +361,28 @@ class StackTest(common.HeatTestCase):
         # A cache supplied means we should never query the database.
         self.assertFalse(mock_drg.called)
 
+    def test_stack_object_loads_template_lazily(self):
+        self.stack = stack.Stack(self.ctx, 'lazy_template', self.tmpl)
+        self.stack.store()
+
+        with mock.patch.object(stack_object.raw_template.RawTemplate,
+                               'get_by_id',
+                               wraps=stack_object.raw_template.RawTemplate.
+                               get_by_id) as mock_get:
+            stk = stack_object.Stack.get_by_id(self.ctx, self.stack.id)
+            self.assertFalse(mock_get.called)
+
+            self.assertEqual(self.tmpl.t, stk.raw_template.template)
+            mock_get.assert_called_once_with(self.ctx, stk.raw_template_id)
+
+            # an eagerly loaded template is not queried again
+            mock_get.reset_mock()
+            stk = stack_object.Stack.get_by_id(utils.dummy_context(),
+                                               self.stack.id,
+                                               eager_load=True)
+            self.assertEqual(self.tmpl.t, stk.raw_template.template)
+            self.assertFalse(mock_get.called)
+
     def test_load_parent_resource(self):
         self.stack = stack.Stack(self.ctx, 'load_parent_resource', self.tmpl,
                                  parent_resource='parent')
@@ -11,11 +11,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 import mock
 import oslo_messaging as messaging
+from oslo_utils import timeutils
 
 from heat.common import exception
 from heat.engine import stack_lock
+from heat.objects import service as service_objects
 from heat.objects import stack as stack_object
 from heat.objects import stack_lock as stack_lock_object
 from heat.tests import common
@@ -242,3 +246,69 @@ class StackLockTest(common.HeatTestCase):
         self.assertIs(False, ret)
         mclient.prepare.assert_called_once_with(timeout=2)
         mclient_ctx.call.assert_called_once_with(self.context, 'listening')
+
+    def _mock_service(self, updated_ago=None, deleted=False):
+        srv = mock.Mock()
+        srv.report_interval = 60
+        srv.created_at = timeutils.utcnow() - datetime.timedelta(
+            seconds=3600)
+        srv.updated_at = None
+        if updated_ago is not None:
+            srv.updated_at = timeutils.utcnow() - datetime.timedelta(
+                seconds=updated_ago)
+        srv.deleted_at = timeutils.utcnow() if deleted else None
+        return self.patchobject(service_objects.Service, 'get_by_engine_id',
+                                return_value=srv)
+
+    def test_engine_heartbeat_alive_recent_report(self):
+        mock_get = self._mock_service(updated_ago=30)
+        self.assertIs(True, stack_lock.StackLock.engine_heartbeat_alive(
+            self.context, 'fake-engine-id'))
+        mock_get.assert_called_once_with(self.context, 'fake-engine-id')
+
+    def test_engine_heartbeat_alive_stale_report(self):
+        self._mock_service(updated_ago=121)
+        self.assertIs(False, stack_lock.StackLock.engine_heartbeat_alive(
+            self.context, 'fake-engine-id'))
+
+    def test_engine_heartbeat_alive_never_reported(self):
+        self._mock_service()
+        self.assertIs(False, stack_lock.StackLock.engine_heartbeat_alive(
+            self.context, 'fake-engine-id'))
+
+    def test_engine_heartbeat_alive_service_stopped(self):
+        self._mock_service(updated_ago=1, deleted=True)
+        self.assertIs(False, stack_lock.StackLock.engine_heartbeat_alive(
+            self.context, 'fake-engine-id'))
+
+    def test_engine_heartbeat_alive_no_service(self):
+        self.patchobject(service_objects.Service, 'get_by_engine_id',
+                         return_value=None)
+        self.assertIsNone(stack_lock.StackLock.engine_heartbeat_alive(
+            self.context, 'fake-engine-id'))
+
+    def test_engine_alive_stale_heartbeat_skips_rpc(self):
+        self._mock_service(updated_ago=600)
+        mget_client = self.patchobject(stack_lock.rpc_messaging,
+                                       'get_rpc_client')
+        self.assertIs(False, stack_lock.StackLock.engine_alive(
+            self.context, 'fake-engine-id'))
+        self.assertFalse(mget_client.called)
+
+    def test_successful_acquire_existing_lock_stale_heartbeat(self):
+        self.patchobject(stack_lock_object.StackLock, 'create',
+                         return_value='fake-engine-id')
+        mock_steal = self.patchobject(stack_lock_object.StackLock,
+                                      'steal',
+                                      return_value=None)
+        self._mock_service(updated_ago=600)
+        mget_client = self.patchobject(stack_lock.rpc_messaging,
+                                       'get_rpc_client')
+
+        slock = stack_lock.StackLock(self.context, self.stack_id,
+                                     self.engine_id)
+        slock.acquire()
+
+        mock_steal.assert_called_once_with(self.stack_id, 'fake-engine-id',
+                                           self.engine_id)
+        self.assertFalse(mget_client.called)
@@ -11,18 +11,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
+import fixtures
 from oslo_config import cfg
-import requests
 from requests import exceptions
 import six
+from six.moves import BaseHTTPServer
 
 from heat.common import urlfetch
 from heat.tests import common
 
 
 class Response(object):
+    status_code = 200
+
     def __init__(self, buf=''):
         self.buf = buf
+        self.headers = {}
 
     def iter_content(self, chunk_size=1):
         while self.buf:
@@ -32,11 +38,17 @@ class Response(object):
     def raise_for_status(self):
         pass
 
+    def close(self):
+        pass
+
 
 class UrlFetchTest(common.HeatTestCase):
     def setUp(self):
         super(UrlFetchTest, self).setUp()
-        self.m.StubOutWithMock(requests, 'get')
+        self.session = urlfetch._session()
+        self.m.StubOutWithMock(self.session, 'get')
+        urlfetch.fetch_cache.clear()
+        self.addCleanup(urlfetch.fetch_cache.clear)
 
     def test_file_scheme_default_behaviour(self):
         self.m.ReplayAll()
@@ -72,7 +84,7 @@ class UrlFetchTest(common.HeatTestCase):
         url = 'http://example.com/template'
         data = '{ "foo": "bar" }'
         response = Response(data)
-        requests.get(url, stream=True).AndReturn(response)
+        self.session.get(url, stream=True, headers={}).AndReturn(response)
         self.m.ReplayAll()
         self.assertEqual(data, urlfetch.get(url))
         self.m.VerifyAll()
@@ -81,7 +93,7 @@ class UrlFetchTest(common.HeatTestCase):
         url = 'https://example.com/template'
         data = '{ "foo": "bar" }'
         response = Response(data)
-        requests.get(url, stream=True).AndReturn(response)
+        self.session.get(url, stream=True, headers={}).AndReturn(response)
         self.m.ReplayAll()
         self.assertEqual(data, urlfetch.get(url))
         self.m.VerifyAll()
@@ -89,7 +101,8 @@ class UrlFetchTest(common.HeatTestCase):
     def test_http_error(self):
         url = 'http://example.com/template'
 
-        requests.get(url, stream=True).AndRaise(exceptions.HTTPError())
+        self.session.get(url, stream=True,
+                         headers={}).AndRaise(exceptions.HTTPError())
         self.m.ReplayAll()
 
         self.assertRaises(urlfetch.URLFetchError, urlfetch.get, url)
@@ -98,7 +111,8 @@ class UrlFetchTest(common.HeatTestCase):
     def test_non_exist_url(self):
         url = 'http://non-exist.com/template'
 
-        requests.get(url, stream=True).AndRaise(exceptions.Timeout())
+        self.session.get(url, stream=True,
+                         headers={}).AndRaise(exceptions.Timeout())
         self.m.ReplayAll()
 
         self.assertRaises(urlfetch.URLFetchError, urlfetch.get, url)
@@ -114,7 +128,7 @@ class UrlFetchTest(common.HeatTestCase):
         data = '{ "foo": "bar" }'
         response = Response(data)
         cfg.CONF.set_override('max_template_size', 500)
-        requests.get(url, stream=True).AndReturn(response)
+        self.session.get(url, stream=True, headers={}).AndReturn(response)
         self.m.ReplayAll()
         urlfetch.get(url)
         self.m.VerifyAll()
@@ -124,9 +138,142 @@ class UrlFetchTest(common.HeatTestCase):
         data = '{ "foo": "bar" }'
         response = Response(data)
         cfg.CONF.set_override('max_template_size', 5)
-        requests.get(url, stream=True).AndReturn(response)
+        self.session.get(url, stream=True, headers={}).AndReturn(response)
         self.m.ReplayAll()
         exception = self.assertRaises(urlfetch.URLFetchError,
                                       urlfetch.get, url)
         self.assertIn("Template exceeds", six.text_type(exception))
         self.m.VerifyAll()
+
+
+class TemplateHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers)
+        if (server.etag is not None and
+                self.headers.get('If-None-Match') == server.etag):
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        if server.etag is not None:
+            self.send_header('ETag', server.etag)
+        if server.cache_control is not None:
+            self.send_header('Cache-Control', server.cache_control)
+        self.send_header('Set-Cookie', 'session=tenant1')
+        self.send_header('Content-Length', str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class UrlFetchCacheTest(common.HeatTestCase):
+    def setUp(self):
+        super(UrlFetchCacheTest, self).setUp()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                TemplateHandler)
+        self.server.requests = []
+        self.server.body = b'{ "foo": "bar" }'
+        self.server.etag = '"v1"'
+        self.server.cache_control = None
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:%d/template' % self.server.server_port
+
+        urlfetch.fetch_cache.clear()
+        self.addCleanup(urlfetch.fetch_cache.clear)
+
+    def test_etag_revalidated(self):
+        self.assertEqual(self.server.body, urlfetch.get(self.url))
+        self.assertEqual(self.server.body, urlfetch.get(self.url))
+
+        self.assertEqual(2, len(self.server.requests))
+        self.assertIsNone(self.server.requests[0].get('If-None-Match'))
+        self.assertEqual('"v1"', self.server.requests[1].get('If-None-Match'))
+
+    def test_changed_document_refetched(self):
+        urlfetch.get(self.url)
+        self.server.body = b'{ "foo": "baz" }'
+        self.server.etag = '"v2"'
+
+        self.assertEqual(b'{ "foo": "baz" }', urlfetch.get(self.url))
+        self.assertEqual(b'{ "foo": "baz" }', urlfetch.get(self.url))
+        self.assertEqual('"v2"', self.server.requests[2].get('If-None-Match'))
+
+    def test_no_validator_not_cached(self):
+        self.server.etag = None
+        urlfetch.get(self.url)
+        urlfetch.get(self.url)
+
+        self.assertEqual(0, len(urlfetch.fetch_cache))
+        self.assertIsNone(self.server.requests[1].get('If-None-Match'))
+
+    def test_fresh_document_not_refetched(self):
+        self.server.cache_control = 'max-age=3600'
+        urlfetch.get(self.url)
+        self.assertEqual(self.server.body, urlfetch.get(self.url))
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_no_store_not_cached(self):
+        self.server.cache_control = 'no-store'
+        urlfetch.get(self.url)
+        self.assertEqual(0, len(urlfetch.fetch_cache))
+
+    def test_cache_disabled(self):
+        cfg.CONF.set_override('template_fetch_cache_size', 0)
+        urlfetch.get(self.url)
+        urlfetch.get(self.url)
+        self.assertIsNone(self.server.requests[1].get('If-None-Match'))
+
+    def test_cookies_not_kept(self):
+        self.server.etag = None
+        urlfetch.get(self.url)
+        urlfetch.get(self.url)
+        self.assertIsNone(self.server.requests[1].get('Cookie'))
+        self.assertEqual(0, len(urlfetch._session().cookies))
+
+    def test_disk_cache(self):
+        cache_dir = self.useFixture(fixtures.TempDir()).path
+        cfg.CONF.set_override('template_fetch_cache_dir', cache_dir)
+        urlfetch.get(self.url)
+
+        # as after a restart, only the copy on disk is left
+        urlfetch.fetch_cache.clear()
+        self.assertEqual(self.server.body, urlfetch.get(self.url))
+        self.assertEqual('"v1"', self.server.requests[1].get('If-None-Match'))
+
+
+class FetchCacheTest(common.HeatTestCase):
+    def setUp(self):
+        super(FetchCacheTest, self).setUp()
+        cfg.CONF.set_override('template_fetch_cache_size', 10)
+        self.cache = urlfetch.FetchCache()
+
+    def _doc(self, data):
+        return urlfetch.CachedDocument(data, '"x"', None, 0)
+
+    def test_lru_eviction(self):
+        self.cache.set('a', self._doc('aaaa'))
+        self.cache.set('b', self._doc('bbbb'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.cache.set('c', self._doc('cccc'))
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual('aaaa', self.cache.get('a').data)
+        self.assertEqual('cccc', self.cache.get('c').data)
+
+    def test_too_large_not_cached(self):
+        self.cache.set('a', self._doc('a' * 11))
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_replace(self):
+        self.cache.set('a', self._doc('aaaa'))
+        self.cache.set('a', self._doc('aaaaaaaa'))
+        self.cache.set('b', self._doc('bb'))
+        self.assertEqual(2, len(self.cache))
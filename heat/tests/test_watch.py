@@ -14,13 +14,16 @@
 
 import datetime
 
+import mock
 import mox
+from oslo_config import cfg
 from oslo_utils import timeutils
 
 from heat.common import exception
 from heat.engine import stack
 from heat.engine import template
 from heat.engine import watchrule
+from heat.objects import watch_data
 from heat.objects import watch_rule
 from heat.tests import common
 from heat.tests import utils
@@ -367,6 +370,11 @@ class WatchRuleTest(common.HeatTestCase):
         self.assertEqual('NORMAL', self.wr.state)
         self.assertEqual(now, self.wr.last_evaluated)
         self.assertEqual([], actions)
+        # the time of the next evaluation is stored
+        db_wr = watch_rule.WatchRule.get_by_id(self.ctx, self.wr.id)
+        self.assertEqual(now, db_wr.last_evaluated)
+        self.assertEqual(now + datetime.timedelta(seconds=300),
+                         db_wr.next_evaluation)
 
         # Now data breaches Threshold, so should set ALARM
         last = now - datetime.timedelta(seconds=300)
@@ -625,7 +633,7 @@ class WatchRuleTest(common.HeatTestCase):
         self.wr.create_watch_data(data)
 
         obj_wr = watch_rule.WatchRule.get_by_name(self.ctx, 'create_data_test')
-        obj_wds = [wd for wd in obj_wr.watch_data]
+        obj_wds = obj_wr.get_watch_data()
         self.assertEqual(data, obj_wds[0].data)
 
         # Note, would be good to write another datapoint and check it
@@ -635,6 +643,66 @@ class WatchRuleTest(common.HeatTestCase):
         # correctly get a list of all datapoints where watch_rule_id ==
         # watch_rule.id, so leave it as a single-datapoint test for now.
 
+    def _store_aged_watch_data(self, rule, ages):
+        self.wr = watchrule.WatchRule(context=self.ctx,
+                                      watch_name='aged_data_test',
+                                      stack_id=self.stack_id, rule=rule)
+        self.wr.store()
+        now = timeutils.utcnow()
+        for value, age in ages:
+            watch_data.WatchData.create(self.ctx, {
+                'data': {'test_metric': {'Value': value, 'Unit': 'Count'}},
+                'watch_rule_id': self.wr.id,
+                'created_at': now - datetime.timedelta(seconds=age)})
+        return now
+
+    def test_load_only_samples_in_period(self):
+        rule = {'EvaluationPeriods': '1',
+                'MetricName': 'test_metric',
+                'Period': '300',
+                'Statistic': 'Maximum',
+                'ComparisonOperator': 'GreaterThanOrEqualToThreshold',
+                'Threshold': '30'}
+        now = self._store_aged_watch_data(rule, [(7, 100), (23, 150),
+                                                 (99, 1000)])
+        self._action_set_stubs(now, action_expected=False)
+
+        wr = watchrule.WatchRule.load(self.ctx, 'aged_data_test')
+        self.assertEqual([7, 23],
+                         sorted(d.data['test_metric']['Value']
+                                for d in wr.watch_data))
+        self.assertEqual('NORMAL', wr.get_alarm_state())
+
+    def test_get_watch_data_since(self):
+        rule = {'MetricName': 'test_metric', 'Period': '300'}
+        now = self._store_aged_watch_data(rule, [(7, 100), (99, 1000)])
+
+        obj_wr = watch_rule.WatchRule.get_by_name(self.ctx, 'aged_data_test')
+        since = now - datetime.timedelta(seconds=300)
+        self.assertEqual([7], [d.data['test_metric']['Value']
+                               for d in obj_wr.get_watch_data(since)])
+        self.assertEqual(2, len(obj_wr.get_watch_data()))
+
+    def test_run_rule_prunes_old_samples(self):
+        rule = {'EvaluationPeriods': '1',
+                'MetricName': 'test_metric',
+                'Period': '300',
+                'Statistic': 'SampleCount',
+                'ComparisonOperator': 'GreaterThanThreshold',
+                'Threshold': '2'}
+        cfg.CONF.set_override('watch_data_max_age', 600)
+        now = self._store_aged_watch_data(rule, [(1, 100), (1, 500),
+                                                 (1, 1000)])
+        self._action_set_stubs(now, action_expected=False)
+
+        wr = watchrule.WatchRule.load(self.ctx, 'aged_data_test')
+        wr.run_rule()
+        self.assertEqual('NORMAL', wr.state)
+
+        wds = list(watch_data.WatchData.get_all_by_watch_rule_id(self.ctx,
+                                                                 self.wr.id))
+        self.assertEqual(2, len(wds))
+
     def test_create_watch_data_suspended(self):
         rule = {u'EvaluationPeriods': u'1',
                 u'AlarmDescription': u'test alarm',
@@ -656,7 +724,7 @@ class WatchRuleTest(common.HeatTestCase):
         self.wr.create_watch_data(data)
 
         obj_wr = watch_rule.WatchRule.get_by_name(self.ctx, 'create_data_test')
-        obj_wds = [wd for wd in obj_wr.watch_data]
+        obj_wds = obj_wr.get_watch_data()
         self.assertEqual([], obj_wds)
 
     def test_create_watch_data_match(self):
@@ -893,3 +961,112 @@ class WatchRuleTest(common.HeatTestCase):
         self.assertRaises(ValueError, self.wr.set_watch_state, None)
 
         self.assertRaises(ValueError, self.wr.set_watch_state, "BADSTATE")
+
+    def _store_rule(self, name, metric, state='NORMAL', dims=None):
+        rule = {u'EvaluationPeriods': u'1',
+                u'Period': u'300',
+                u'ComparisonOperator': u'GreaterThanThreshold',
+                u'Statistic': u'SampleCount',
+                u'Threshold': u'2',
+                u'MetricName': metric}
+        if dims:
+            rule[u'Dimensions'] = [{u'Name': k, u'Value': v}
+                                   for k, v in dims.items()]
+        wr = watchrule.WatchRule(context=self.ctx, watch_name=name,
+                                 stack_id=self.stack_id, rule=rule,
+                                 state=state)
+        wr.store()
+        return wr
+
+    def test_watch_rule_index_match(self):
+        wr1 = self._store_rule('index_1', 'CpuMetric')
+        self._store_rule('index_2', 'CpuMetric', dims={'InstanceId': 'i-2'})
+        self._store_rule('index_3', 'CpuMetric', state='SUSPENDED')
+        wr4 = self._store_rule('index_4', 'MemMetric')
+
+        index = watchrule.WatchRuleIndex()
+        data = {u'Namespace': u'system/linux',
+                u'CpuMetric': {"Unit": "Percent", "Value": "9",
+                               "Dimensions": [{u'InstanceId': u'i-1'}]}}
+        self.assertEqual([wr1.id], [wr.id for wr in index.match(self.ctx,
+                                                                data)])
+
+        data = {u'MemMetric': {"Unit": "Percent", "Value": "9"}}
+        self.assertEqual([wr4.id], [wr.id for wr in index.match(self.ctx,
+                                                                data)])
+
+        # rules created after the index was built are found straight away
+        wr5 = self._store_rule('index_5', 'MemMetric')
+        self.assertEqual(sorted([wr4.id, wr5.id]),
+                         sorted(wr.id for wr in index.match(self.ctx, data)))
+
+        # and so are the changes to the rules stored by this engine
+        wr5.rule = dict(wr5.rule, MetricName=u'CpuMetric')
+        wr5.store()
+        self.assertEqual([wr4.id], [wr.id for wr in index.match(self.ctx,
+                                                                data)])
+        wr4 = watchrule.WatchRule.load(self.ctx, 'index_4')
+        wr4.state_set(wr4.SUSPENDED)
+        self.assertEqual([], index.match(self.ctx, data))
+
+    def test_index_not_rebuilt(self):
+        self._store_rule('index_1', 'CpuMetric')
+        wr = self._store_rule('index_2', 'MemMetric')
+        index = watchrule.WatchRuleIndex()
+        data = {u'MemMetric': {"Unit": "Percent", "Value": "9"}}
+        index.match(self.ctx, data)
+
+        with mock.patch.object(watch_rule.WatchRule,
+                               'get_all') as mock_get_all:
+            # changing the state of a rule does not change the index
+            rule = watchrule.WatchRule.load(self.ctx, watch=wr)
+            rule.state_set(rule.ALARM)
+            self.assertEqual([wr.id], [r.id for r in index.match(self.ctx,
+                                                                 data)])
+        self.assertFalse(mock_get_all.called)
+
+    def test_create_watch_data_store(self):
+        self.wr = self._store_rule('store_test', 'CreateDataMetric')
+        store = watchrule.WatchDataStore(size=2)
+
+        for value in ('1', '2', '3'):
+            data = {u'CreateDataMetric': {"Unit": "Counter",
+                                          "Value": value,
+                                          "Dimensions": []}}
+            self.wr.create_watch_data(data, store=store)
+
+        # only the latest samples are kept until the store is flushed
+        self.assertEqual(2, len(store))
+        self.assertEqual([], watch_data.WatchData.get_all(self.ctx))
+
+        store.flush(self.ctx)
+        self.assertEqual(0, len(store))
+        wds = watch_data.WatchData.get_all(self.ctx)
+        self.assertEqual(['2', '3'],
+                         sorted(wd.data['CreateDataMetric']['Value']
+                                for wd in wds))
+
+    def test_watch_data_store_flush_error(self):
+        store = watchrule.WatchDataStore(size=2)
+        store.add({'data': {'m': 1}, 'watch_rule_id': 1})
+        store.add({'data': {'m': 2}, 'watch_rule_id': 2})
+
+        def create_all(cnxt, values_list):
+            if any(v['watch_rule_id'] == 1 for v in values_list):
+                raise Exception('boom')
+
+        create = self.patchobject(watch_data.WatchData, 'create_all',
+                                  side_effect=create_all)
+
+        # the samples of the rule which can't be stored are dropped
+        store.flush(self.ctx)
+        self.assertEqual(0, len(store))
+        stored = [[v['data'] for v in call[0][1]]
+                  for call in create.call_args_list]
+        self.assertEqual(3, len(stored))
+        self.assertIn([{'m': 2}], stored[1:])
+
+        create.reset_mock()
+        store.add({'data': {'m': 3}, 'watch_rule_id': 2})
+        store.flush(self.ctx)
+        self.assertEqual(1, create.call_count)
@@ -11,6 +11,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import random
 import string
 import uuid
@@ -20,6 +21,7 @@ from oslo_db import options
 import sqlalchemy
 
 from heat.common import context
+from heat.common import query_stats
 from heat.db import api as db_api
 from heat.db.sqlalchemy import models
 from heat.engine import environment
@@ -43,6 +45,17 @@ class UUIDStub(object):
         uuid.uuid4 = self.uuid4
 
 
+@contextlib.contextmanager
+def query_budget(test_case, max_statements):
+    """Fail the test if the block issues more than max_statements."""
+    with query_stats.collect(test_case.id()) as stats:
+        yield stats
+    test_case.assertLessEqual(
+        stats.count, max_statements,
+        'Issued %d database statements, the budget is %d. Slowest: %s' % (
+            stats.count, max_statements, stats.slowest))
+
+
 def random_name():
     return ''.join(random.choice(string.ascii_uppercase)
                    for x in range(10))